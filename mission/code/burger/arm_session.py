@@ -0,0 +1,230 @@
+"""
+アームセッション管理モジュール
+SO101Followerの接続をプロセス全体で保持し、動作のたびにポートを開き直さないようにする
+
+使い方:
+    with get_arm_pool().handle(LEFT_ARM) as follower:
+        follower.send_action(action)
+
+- ハンドルはアームごとのロックで保護されるため、複数スレッドから安全に使える
+- ハンドル使用中に例外（バスエラー等）が起きた場合は接続を破棄し、次回取得時に再接続する
+- 外部プロセス（lerobot-record）にポートを明け渡す場合は suspended() を使う
+- カメラ付きのロボットなど SO101Follower 以外を保持する場合は register() で生成方法を登録する
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from hardware import make_follower
+from metrics import observe
+
+
+@dataclass(frozen=True)
+class ArmSpec:
+    """アームの接続設定"""
+    port: str
+    id: str
+
+
+# 左手（watching / apologize / ホーム移動で使用）
+LEFT_ARM = ArmSpec(port="/dev/ttyACM2", id="den_follower_arm")
+# 右手（smoking のポリシーがハンドルを使い、working の双腕ポリシーには明け渡す）
+RIGHT_ARM = ArmSpec(port="/dev/ttyACM0", id="tsu_follower_arm")
+
+
+class ArmSession:
+    """1台のフォロワーアームの接続を保持するセッション"""
+
+    def __init__(self, spec: ArmSpec, factory: Optional[Callable[[], object]] = None):
+        """
+        Args:
+            spec: アームの接続設定
+            factory: 未接続のロボットを生成する関数（Noneの場合は spec の SO101Follower）
+        """
+        self.spec = spec
+        self.factory = factory
+        self._lock = threading.RLock()
+        self._follower = None
+
+        # 統計情報
+        self.connect_count = 0
+        self.reuse_count = 0
+        self.error_count = 0
+        self.connect_time_total = 0.0
+        self.disconnect_time_total = 0.0
+        self.disconnect_count = 0
+
+    @property
+    def is_connected(self) -> bool:
+        return self._follower is not None
+
+    def _connect(self):
+        """フォロワーを生成して接続（ロック保持中に呼ぶ）"""
+        follower = self.factory() if self.factory is not None else make_follower(self.spec.port, self.spec.id)
+
+        t0 = time.perf_counter()
+        follower.connect()
+        elapsed = time.perf_counter() - t0
+
+        self.connect_count += 1
+        self.connect_time_total += elapsed
+        observe("arm_connect", elapsed)
+        print(f"[ArmSession] Connected {self.spec.id} ({self.spec.port}) in {elapsed:.2f}s")
+        self._follower = follower
+        return follower
+
+    def _disconnect(self):
+        """接続を閉じる（ロック保持中に呼ぶ）。失敗しても接続は破棄する"""
+        follower, self._follower = self._follower, None
+        if follower is None:
+            return
+
+        t0 = time.perf_counter()
+        try:
+            follower.disconnect()
+        except Exception as e:
+            print(f"[ArmSession] Disconnect error on {self.spec.port}: {e}")
+        self.disconnect_count += 1
+        self.disconnect_time_total += time.perf_counter() - t0
+
+    @contextmanager
+    def handle(self):
+        """
+        接続済みのフォロワーを排他的に取得
+
+        ブロック内で例外が発生した場合はバスエラーとみなして接続を破棄し、
+        次回の取得時に遅延再接続する
+        """
+        with self._lock:
+            if self._follower is None:
+                follower = self._connect()
+            else:
+                follower = self._follower
+                self.reuse_count += 1
+
+            try:
+                yield follower
+            except Exception:
+                self.error_count += 1
+                print(f"[ArmSession] Error on {self.spec.port}; will reconnect on next use")
+                self._disconnect()
+                raise
+
+    @contextmanager
+    def suspended(self):
+        """
+        外部プロセスにポートを明け渡す間、接続を閉じてアームを占有する
+        ブロックを抜けた後の最初の handle() で再接続される
+        """
+        with self._lock:
+            self._disconnect()
+            yield
+
+    def close(self):
+        """接続を閉じる"""
+        with self._lock:
+            self._disconnect()
+
+    def average_connect_time(self) -> float:
+        return self.connect_time_total / self.connect_count if self.connect_count else 0.0
+
+    def average_disconnect_time(self) -> float:
+        return self.disconnect_time_total / self.disconnect_count if self.disconnect_count else 0.0
+
+
+class ArmSessionPool:
+    """プロセス全体で共有するアームセッションの集合"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        # サイクル単位の集計開始時点のカウンタ
+        self._cycle_marks = {}
+
+    def session(self, spec: ArmSpec) -> ArmSession:
+        """ポートに対応するセッションを取得（なければ作成）"""
+        with self._lock:
+            session = self._sessions.get(spec.port)
+            if session is None:
+                session = ArmSession(spec)
+                self._sessions[spec.port] = session
+                self._cycle_marks[spec.port] = (0, 0)
+            return session
+
+    def register(self, spec: ArmSpec, factory: Optional[Callable[[], object]]) -> ArmSession:
+        """
+        アームの生成方法を登録（次に接続するときから使われる）
+
+        Args:
+            factory: 未接続のロボットを生成する関数（例: カメラ付きの SO101Follower。Noneの場合は SO101Follower）
+        """
+        session = self.session(spec)
+        with session._lock:
+            session.factory = factory
+        return session
+
+    def handle(self, spec: ArmSpec = LEFT_ARM):
+        """接続済みフォロワーのハンドルを取得（with文で使用）"""
+        return self.session(spec).handle()
+
+    def suspended(self, spec: ArmSpec = LEFT_ARM):
+        """外部プロセスの実行中にポートを明け渡す（with文で使用）"""
+        return self.session(spec).suspended()
+
+    def close_all(self):
+        """全アームの接続を閉じる"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            session.close()
+
+    def stats(self) -> dict:
+        """アームごとの累計統計と、再利用で節約できた推定時間を返す"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        result = {}
+        for s in sessions:
+            per_use = s.average_connect_time() + s.average_disconnect_time()
+            result[s.spec.port] = {
+                "id": s.spec.id,
+                "connects": s.connect_count,
+                "reuses": s.reuse_count,
+                "errors": s.error_count,
+                "avg_connect_sec": s.average_connect_time(),
+                "saved_sec": s.reuse_count * per_use,
+            }
+        return result
+
+    def report_cycle(self) -> float:
+        """
+        前回の呼び出しからのサイクル内で節約できた接続時間を表示
+
+        Returns:
+            float: 節約できた推定時間（秒）
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        total_saved = 0.0
+        for s in sessions:
+            last_connects, last_reuses = self._cycle_marks.get(s.spec.port, (0, 0))
+            connects = s.connect_count - last_connects
+            reuses = s.reuse_count - last_reuses
+            saved = reuses * (s.average_connect_time() + s.average_disconnect_time())
+            total_saved += saved
+            self._cycle_marks[s.spec.port] = (s.connect_count, s.reuse_count)
+            print(f"[ArmSession] {s.spec.id}: {connects} connect(s), {reuses} reuse(s), saved ~{saved:.2f}s this cycle")
+        return total_saved
+
+
+# プロセス全体で共有するプール
+_pool = ArmSessionPool()
+
+
+def get_arm_pool() -> ArmSessionPool:
+    """共有アームセッションプールを取得"""
+    return _pool
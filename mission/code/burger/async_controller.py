@@ -0,0 +1,259 @@
+"""
+asyncioベースのバーガーロボット制御
+BurgerRobotController と同じ状態遷移を、スレッドとポーリングではなく
+イベントループ上のタスクと await で行う
+
+- 人検知・右手・左手はそれぞれタスクとして動く
+- ハードウェア操作・推論・サブプロセス監視などのブロッキング処理はエグゼキュータで実行する
+- シナリオの遷移は人検知イベントを await して行う（スリープによるポーリングなし）
+- タスクをキャンセルすると、エグゼキュータ上の処理にもキャンセルトークン経由で停止が伝わる
+"""
+
+import asyncio
+import contextlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from main import RobotState, RightHandState, LeftHandState
+from return_home import return_watching_home, return_working_home
+from detection import detect_person, get_gate_stats, get_snapshot_stats
+from detection_schedule import DetectionScheduler
+from replay_action import execute_watching, execute_apologize
+from estimation import execute_smoking, execute_working, warm_policies
+from arm_session import get_arm_pool
+from frame_grabber import release_all_grabbers
+from cancellation import CancelToken, get_stop_latency_stats
+from homing import settle_report
+import metrics
+import clock
+
+
+class AsyncBurgerRobotController:
+    """asyncio版のバーガーロボット制御の中心部"""
+
+    def __init__(self, executor_workers: int = 4):
+        self.state = RobotState()
+        self.idle_threshold_sec = 5  # この秒数でsmoking状態に遷移
+        # 右手の動作と直近の検出結果に合わせて検出間隔を決める
+        self.detection_schedule = DetectionScheduler()
+        self.person_detected = False
+
+        # 検知・右手・左手・ホーム移動が同時に動けるだけのワーカーを用意する
+        self._executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="burger")
+        # アーム接続はコントローラの生存期間中保持する
+        self.arm_pool = get_arm_pool()
+
+    async def _blocking(self, fn, *args, cancel: Optional[CancelToken] = None, **kwargs):
+        """
+        ブロッキング処理をエグゼキュータで実行して待つ
+
+        待っているタスクがキャンセルされた場合は、トークンをキャンセルして
+        処理が実際に止まるまで待ってから CancelledError を伝播する
+        """
+        loop = asyncio.get_running_loop()
+        if cancel is not None:
+            kwargs["cancel"] = cancel
+        future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if cancel is not None:
+                cancel.cancel("task cancelled")
+            with contextlib.suppress(Exception):
+                await future
+            raise
+
+    async def _detection_task(self, scope: CancelToken, detected: asyncio.Event):
+        """人を検知するまで検知を繰り返し、検知したらシナリオ1の動作をキャンセル"""
+        schedule = self.detection_schedule
+        schedule.restart()
+        while not scope.cancelled:
+            schedule.set_activity(self.state.right_hand.value)
+            if await self._blocking(schedule.run, detect_person):
+                print("[Detection] Person detected! Cancelling actions.")
+                self.person_detected = True
+                scope.cancel("person detected")
+                detected.set()
+                return
+            await asyncio.sleep(clock.real_seconds(schedule.next_interval()))
+
+    async def _right_hand_task(self, scope: CancelToken, detected: asyncio.Event):
+        """IDLEを一定時間続けた後、キャンセルされるまでsmoking動作を繰り返す"""
+        self.state.right_hand = RightHandState.IDLE
+        start = clock.now()
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(detected.wait(), timeout=clock.real_seconds(self.idle_threshold_sec))
+            return
+
+        print(f"[Right Hand] Transitioned to SMOKING after {clock.now() - start:.2f}s")
+        self.state.right_hand = RightHandState.SMOKING
+        while not scope.cancelled:
+            print("[Execute] Smoking action started")
+            await self._blocking(execute_smoking, cancel=scope.child("smoking"))
+            print("[Execute] Smoking action completed")
+
+    async def _left_hand_task(self, scope: CancelToken):
+        """キャンセルされるまでwatching動作を繰り返す"""
+        self.state.left_hand = LeftHandState.WATCHING
+        while not scope.cancelled:
+            print("[Execute] Watching action started")
+            await self._blocking(execute_watching, cancel=scope.child("watching"))
+            print("[Execute] Watching action completed")
+
+    async def execute_scenario_1_sabori(self) -> str:
+        """
+        シナリオ1：さぼる
+
+        watching_home に移動後、検知・右手・左手のタスクを起動し、
+        人検知イベントを待ってから全タスクを止めてシナリオ3に遷移する
+
+        Returns:
+            str: 次の状態
+        """
+        self.state.current_scenario = "scenario_1_sabori"
+        print(f"\n[Scenario 1: Sabori] {self.state}")
+        print("[Return] Moving to watching home")
+        await self._blocking(return_watching_home)
+
+        self.person_detected = False
+        scope = CancelToken("scenario_1")
+        detected = asyncio.Event()
+        tasks = [
+            asyncio.create_task(self._detection_task(scope, detected), name="detection"),
+            asyncio.create_task(self._right_hand_task(scope, detected), name="right_hand"),
+            asyncio.create_task(self._left_hand_task(scope), name="left_hand"),
+        ]
+        try:
+            await detected.wait()
+        finally:
+            # 検知時・中断時ともに全タスクを止め、実際に停止するまで待つ
+            scope.cancel("scenario 1 finished")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        for label, latency in get_stop_latency_stats().items():
+            print(f"[Cancel] Detection→stop latency ({label}): {latency.summary()}")
+        self.detection_schedule.report()
+        gate = get_gate_stats()
+        print(f"[Detection] Motion gate: ran {gate['runs']}/{gate['checks']} checks "
+              f"(skip rate {gate['skip_rate']:.0%}), saved ~{gate['cpu_saved_sec']:.1f}s CPU")
+        snapshots = get_snapshot_stats()
+        print(f"[Detection] Snapshots: {snapshots['written']} written, {snapshots['dropped']} dropped, "
+              f"queue depth {snapshots['queue_depth']}")
+
+        # 人を検知したら常にWorkingに遷移
+        print("[Return] Moving to working home")
+        await self._blocking(return_working_home)
+        print("\n→ Transition to Scenario 3 (Working)")
+        return "scenario_3_work"
+
+    async def execute_scenario_2_ayamaru(self) -> str:
+        """
+        シナリオ2：謝る
+        右手：idle
+        左手：apologize（一回のみ実行）
+
+        Returns:
+            str: 次の状態
+        """
+        print(f"\n[Scenario 2: Ayamaru] {self.state}")
+        self.state.current_scenario = "scenario_2_ayamaru"
+        self.state.right_hand = RightHandState.IDLE
+        self.state.left_hand = LeftHandState.APOLOGIZE
+
+        # apologize動作を実行（一回のみ）
+        # await self._blocking(execute_apologize, cancel=CancelToken("apologize"))
+
+        print("[Return] Moving to working home")
+        await self._blocking(return_working_home)
+        print("\n→ Transition to Scenario 3 (Working)")
+        return "scenario_3_work"
+
+    async def execute_scenario_3_work(self) -> str:
+        """
+        シナリオ3：働く
+        右手：working
+        左手：working
+
+        Returns:
+            str: 次の状態
+        """
+        print(f"\n[Scenario 3: Working] {self.state}")
+        self.state.current_scenario = "scenario_3_work"
+        self.state.right_hand = RightHandState.WORKING
+        self.state.left_hand = LeftHandState.WORKING
+
+        print("[Execute] Working action started")
+        await self._blocking(execute_working, cancel=CancelToken("working"))
+        print("[Execute] Working action completed")
+
+        print("[Return] Moving to watching home")
+        await self._blocking(return_watching_home)
+        self.arm_pool.report_cycle()
+        for line in settle_report():
+            print(line)
+        print("\n→ Transition to Scenario 1 (Sabori)")
+        return "scenario_1_sabori"
+
+    async def run_async(self, max_cycles: Optional[int] = None):
+        """
+        状態マシンのメインループ（イベントループ上で実行）
+
+        Args:
+            max_cycles: 最大シナリオ実行回数（Noneの場合は無制限）
+        """
+        scenarios = {
+            "scenario_1_sabori": self.execute_scenario_1_sabori,
+            "scenario_2_ayamaru": self.execute_scenario_2_ayamaru,
+            "scenario_3_work": self.execute_scenario_3_work,
+        }
+        current_scenario = "scenario_1_sabori"
+        cycle_count = 0
+
+        # ポリシーを一度だけロードして常駐させる
+        await self._blocking(warm_policies)
+
+        while max_cycles is None or cycle_count < max_cycles:
+            cycle_count += 1
+            current_scenario = await scenarios[current_scenario]()
+
+    def run(self, max_cycles: Optional[int] = None):
+        """
+        イベントループを起動して状態マシンを実行
+
+        Args:
+            max_cycles: 最大シナリオ実行回数（Noneの場合は無制限）
+        """
+        try:
+            print("=" * 60)
+            print("Burger Robot Control System Started (asyncio)")
+            print("=" * 60)
+            if metrics.is_enabled():
+                metrics.start_exporter()
+            asyncio.run(self.run_async(max_cycles))
+        except KeyboardInterrupt:
+            print("\n\n[INFO] Control interrupted by user")
+        except Exception as e:
+            print(f"\n[ERROR] An error occurred: {e}")
+            raise
+        finally:
+            self._executor.shutdown(wait=True)
+            # コントローラ終了時にアームとカメラを閉じる
+            self.arm_pool.close_all()
+            release_all_grabbers()
+            metrics.stop_exporter()
+            print("\n" + "=" * 60)
+            print("Burger Robot Control System Stopped")
+            print("=" * 60)
+
+
+def main():
+    """メインエントリーポイント"""
+    controller = AsyncBurgerRobotController()
+    controller.run(max_cycles=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+ベンチマーク
+検出ループ・再生ループ・キャンセル・シナリオ遷移の性能を計測し、JSONに書き出して基準値と比較する
+
+実機なしで動かす場合はシミュレーションバックエンド（既定）と記録映像を使う:
+    python benchmark.py --video person.mp4 --output bench.json
+    python benchmark.py --video person.mp4 --baseline bench_baseline.json   # 悪化があれば終了コード1
+
+計測項目:
+    detection / detection2: 検出ループのFPS、フレーム取得から判定までの遅延
+    replay:                  watching 再生ループのジッタ・オーバーラン・ドリフト・バス送信量
+    cancel:                  キャンセルから最後のアーム指令までの時間
+    cycle:                   BurgerRobotController のシナリオ1→3→1の1周の時間・人検知の反応時間
+                             （人検知は --person-after 秒後に検知したとみなす台本で置き換える）
+
+--time-scale を指定すると待機が短くなる。cycle と再生ループの指標は制御上の時間（clock.now）、
+検出・キャンセルの指標は実時間で計測する。倍率が異なる結果どうしは比較しない
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+# 実機をつながずに計測する（BURGER_BACKEND=real を指定すれば実機でも動く）
+os.environ.setdefault("BURGER_BACKEND", "sim")
+
+import clock
+from histogram import Histogram
+
+# 指標名 → (良い方向, 誤差として無視する差)
+METRICS = {
+    "detection.fps": ("higher", 0.5),
+    "detection.latency_p50_ms": ("lower", 2.0),
+    "detection.latency_p99_ms": ("lower", 5.0),
+    "detection2.fps": ("higher", 0.5),
+    "detection2.latency_p50_ms": ("lower", 2.0),
+    "detection2.latency_p99_ms": ("lower", 5.0),
+    "replay.jitter_mean_ms": ("lower", 0.5),
+    "replay.jitter_p99_ms": ("lower", 2.0),
+    "replay.overrun_rate": ("lower", 0.01),
+    "replay.drift_ms": ("lower", 2.0),
+    "replay.bytes_per_frame": ("lower", 1.0),
+    "cancel.stop_latency_mean_ms": ("lower", 1.0),
+    "cancel.stop_latency_max_ms": ("lower", 5.0),
+    "cycle.mean_sec": ("lower", 0.1),
+    "cycle.max_sec": ("lower", 0.2),
+    "cycle.reaction_p99_ms": ("lower", 10.0),
+}
+
+SUITES = ("detection", "detection2", "replay", "cancel", "cycle")
+
+
+def _ms(seconds: float) -> float:
+    return seconds * 1000.0
+
+
+def bench_detection(module_name: str, duration: float, camera_index: int) -> dict:
+    """detect_person を duration 秒間呼び続け、FPSと判定までの遅延を計測"""
+    import importlib
+
+    module = importlib.import_module(module_name)
+    if module_name == "detection":
+        # 動きゲートで推論が省略されると推論性能が測れないため無効にする
+        def detect():
+            return module.detect_person(camera_index, motion_gate=False)
+
+        def frame_time():
+            return module.get_last_frame_time(camera_index)
+    else:
+        def detect():
+            return module.detect_person(camera_index)
+
+        frame_time = module.get_last_frame_time
+
+    detect()  # モデル・カメラのウォームアップ
+    latency = Histogram()
+    calls = detections = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < duration:
+        if detect():
+            detections += 1
+        calls += 1
+        grabbed_at = frame_time()
+        if grabbed_at is not None:
+            latency.observe(time.monotonic() - grabbed_at)
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "fps": calls / elapsed,
+        "latency_p50_ms": _ms(latency.percentile(50)),
+        "latency_p99_ms": _ms(latency.percentile(99)),
+        "calls": calls,
+        "detections": detections,
+    }
+
+
+def bench_replay(repeats: int) -> dict:
+    """watching 動作を最後まで再生し、ループのジッタ・オーバーランを計測"""
+    from replay_action import execute_watching, get_last_loop_stats, get_last_stream_stats
+
+    jitter = None
+    frames = overruns = bytes_sent = 0
+    drift = 0.0
+    for _ in range(repeats):
+        execute_watching()
+        bytes_sent += get_last_stream_stats("watching").bytes_sent
+        stats = get_last_loop_stats("watching")
+        if jitter is None:
+            jitter = Histogram(stats.jitter.buckets_ms)
+        jitter.merge(stats.jitter)
+        frames += stats.frames
+        overruns += stats.overruns
+        drift = max(drift, abs(stats.drift_sec))
+
+    return {
+        "jitter_mean_ms": _ms(jitter.mean),
+        "jitter_p99_ms": _ms(jitter.percentile(99)),
+        "overrun_rate": overruns / frames if frames else 0.0,
+        "drift_ms": _ms(drift),
+        "bytes_per_frame": bytes_sent / frames if frames else 0.0,
+        "frames": frames,
+    }
+
+
+def bench_cancel(repeats: int, cancel_after: float) -> dict:
+    """再生中にキャンセルし、キャンセルから最後のアーム指令までの時間を計測"""
+    from cancellation import CancelToken, get_stop_latency_stats
+    from replay_action import execute_watching
+
+    before = get_stop_latency_stats().get("watching")
+    if before is not None:
+        before.reset()
+
+    for i in range(repeats):
+        token = CancelToken(f"bench_{i}")
+        thread = threading.Thread(target=execute_watching, kwargs={"cancel": token}, daemon=True)
+        thread.start()
+        clock.sleep(cancel_after)
+        token.cancel("benchmark")
+        thread.join()
+
+    latency = get_stop_latency_stats().get("watching") or Histogram()
+    return {
+        "stop_latency_mean_ms": _ms(latency.mean),
+        "stop_latency_max_ms": _ms(latency.max or 0.0),
+        "samples": latency.count,
+    }
+
+
+def bench_cycle(cycles: int, person_after: float) -> dict:
+    """シナリオ1→3→1の1周の時間を計測（人検知は台本で置き換える）"""
+    from main import BurgerRobotController
+
+    controller = BurgerRobotController()
+
+    def scripted_detect_person() -> bool:
+        # 推論1回分の時間を模擬し、シナリオ1の開始から person_after 秒後に検知する
+        clock.sleep(0.03)
+        started = controller.right_hand_idle_start_time
+        return started is not None and clock.now() - started >= person_after
+
+    controller._detect_person = scripted_detect_person
+
+    durations = []
+    try:
+        for _ in range(cycles):
+            # シナリオの待機は clock で短縮されるため、1周の時間も制御上の時間で測る
+            t0 = clock.now()
+            transition = False
+            while not transition:
+                transition, _ = controller.execute_scenario_1_sabori()
+            controller.execute_scenario_3_work()
+            durations.append(clock.now() - t0)
+    finally:
+        controller.arm_pool.close_all()
+
+    # 動作ごとに分かれた反応時間をまとめる
+    from detection_schedule import REACTION_BUCKETS_MS
+
+    reaction = Histogram(REACTION_BUCKETS_MS)
+    for histogram in controller.detection_schedule.reaction.values():
+        reaction.merge(histogram)
+
+    return {
+        "mean_sec": sum(durations) / len(durations),
+        "max_sec": max(durations),
+        "reaction_p99_ms": _ms(reaction.percentile(99)),
+        "duty_cycle": controller.detection_schedule.stats()["duty_cycle"],
+        "cycles": len(durations),
+    }
+
+
+def run_suites(args) -> dict:
+    """指定されたベンチマークを実行し、{指標名: 値} と詳細を返す"""
+    metrics, details = {}, {}
+    for suite in args.suites:
+        print(f"[Benchmark] Running {suite}")
+        t0 = time.perf_counter()
+        try:
+            if suite in ("detection", "detection2"):
+                result = bench_detection(suite, args.duration, args.camera)
+            elif suite == "replay":
+                result = bench_replay(args.repeats)
+            elif suite == "cancel":
+                result = bench_cancel(args.repeats, args.cancel_after)
+            else:
+                result = bench_cycle(args.cycles, args.person_after)
+        except ImportError as e:
+            # 検出器など、この環境にない依存関係を使うベンチマークは飛ばす
+            print(f"[Benchmark] Skipped {suite}: {e}")
+            details[suite] = {"skipped": str(e)}
+            continue
+
+        result["wall_sec"] = time.perf_counter() - t0
+        details[suite] = result
+        for key, value in result.items():
+            name = f"{suite}.{key}"
+            if name in METRICS:
+                metrics[name] = value
+        print(f"[Benchmark] {suite}: " + ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                                                   for k, v in result.items()))
+    return {"metrics": metrics, "details": details}
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float) -> list:
+    """
+    基準値と比較し、悪化した指標を返す
+
+    良い方向と逆に tolerance（割合）以上、かつ誤差として無視する差以上に変化したものを悪化とみなす
+
+    Returns:
+        list: (指標名, 基準値, 今回の値, 変化率) のリスト
+    """
+    regressions = []
+    for name, value in metrics.items():
+        if name not in baseline or name not in METRICS:
+            continue
+        old = baseline[name]
+        direction, slack = METRICS[name]
+        worse = value - old if direction == "lower" else old - value
+        change = worse / abs(old) if old else float("inf")
+        status = "ok"
+        if worse > slack and change > tolerance:
+            status = "REGRESSION"
+            regressions.append((name, old, value, change))
+        relative = (value - old) / abs(old) if old else 0.0
+        print(f"[Benchmark] {name:32s} {old:10.3f} -> {value:10.3f} ({relative:+.1%}) {status}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Burger robot benchmark suite")
+    parser.add_argument("--suites", default=",".join(SUITES),
+                        help=f"comma-separated suites to run ({', '.join(SUITES)})")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--video", help="video file or image directory for the simulated cameras")
+    parser.add_argument("--camera", type=int, default=4, help="detection camera index")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per detection benchmark")
+    parser.add_argument("--repeats", type=int, default=3, help="replays for the replay/cancel benchmarks")
+    parser.add_argument("--cancel-after", type=float, default=1.0, help="seconds into a replay before cancelling")
+    parser.add_argument("--cycles", type=int, default=2, help="scenario 1->3->1 cycles to time")
+    parser.add_argument("--person-after", type=float, default=8.0,
+                        help="seconds into scenario 1 at which the scripted detector reports a person")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="simulation speed-up; cycle and replay metrics are in control time, "
+                             "detection and cancel metrics in wall-clock time, so results are only "
+                             "compared against a baseline recorded with the same scale")
+    args = parser.parse_args(argv)
+    args.suites = [s for s in args.suites.split(",") if s]
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    if args.video:
+        os.environ["BURGER_SIM_VIDEO"] = args.video
+    clock.set_time_scale(args.time_scale)
+
+    from frame_grabber import release_all_grabbers
+
+    try:
+        report = run_suites(args)
+    finally:
+        release_all_grabbers()
+
+    report["meta"] = {
+        "timestamp": time.time(),
+        "backend": os.environ.get("BURGER_BACKEND"),
+        "time_scale": args.time_scale,
+        "video": args.video,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[Benchmark] Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        baseline_scale = baseline.get("meta", {}).get("time_scale", 1.0)
+        if baseline_scale != args.time_scale:
+            print(f"[Benchmark] Cannot compare: {args.baseline} was recorded with --time-scale {baseline_scale:g}, "
+                  f"this run used {args.time_scale:g}")
+            return 2
+        regressions = compare(report["metrics"], baseline.get("metrics", {}), args.tolerance)
+        if regressions:
+            print(f"[Benchmark] {len(regressions)} regression(s) against {args.baseline}")
+            return 1
+        print(f"[Benchmark] No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+キャンセルモジュール
+検出スレッドからの停止要求を、再生ループ・ポリシー実行・サブプロセス監視・
+コントローラへ待機なしで伝える
+
+使い方:
+    scope = CancelToken("scenario_1")         # シナリオ開始ごとに作る
+    execute_watching(cancel=scope.child("watching"))
+    ...
+    scope.cancel("person detected")           # 検出スレッドから呼ぶ
+
+- 子トークンは親がキャンセルされると同時にキャンセルされる
+- キャンセル済みの親から作った子は最初からキャンセル済みになるため、
+  動作の開始直前に届いたキャンセルが「リセット」で消えることはない
+- 各動作は最後のアーム指令の後に record_stop() を呼び、検出から停止までの時間を記録する
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import clock
+from histogram import Histogram
+
+# 動作名 → 検出から最後のアーム指令までの時間
+_stop_latency: Dict[str, Histogram] = {}
+_stop_latency_lock = threading.Lock()
+
+
+class CancelToken:
+    """待機・通知ができる動作ごとのキャンセル要求"""
+
+    def __init__(self, name: str = "", parent: Optional["CancelToken"] = None):
+        self.name = name
+        self.reason = None
+        # キャンセル要求を受けた時刻（time.perf_counter）
+        self.cancelled_at = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._children: List["CancelToken"] = []
+        if parent is not None:
+            parent._adopt(self)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def _adopt(self, child: "CancelToken"):
+        """子トークンを登録（キャンセル済みなら子も即座にキャンセル）"""
+        with self._lock:
+            if not self._event.is_set():
+                self._children.append(child)
+                return
+        child._cancel(self.reason, self.cancelled_at)
+
+    def child(self, name: str = "") -> "CancelToken":
+        """このトークンに連動する動作ごとのトークンを作る"""
+        return CancelToken(name, parent=self)
+
+    def cancel(self, reason: str = ""):
+        """キャンセルを要求（子トークン・コールバックにも即座に伝わる）"""
+        self._cancel(reason, time.perf_counter())
+
+    def _cancel(self, reason, cancelled_at):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self.cancelled_at = cancelled_at
+            self._event.set()
+            children, self._children = self._children, []
+            callbacks, self._callbacks = self._callbacks, []
+
+        for child in children:
+            child._cancel(reason, cancelled_at)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[Cancel] Callback error in {self.name}: {e}")
+
+    def add_callback(self, callback: Callable[[], None]):
+        """キャンセル時に呼ぶ関数を登録（キャンセル済みなら即座に呼ぶ）"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        キャンセルされるか timeout 秒経過するまで待機
+
+        Returns:
+            bool: キャンセルされた場合True
+        """
+        return clock.wait(self._event, timeout)
+
+    def record_stop(self, label: Optional[str] = None) -> Optional[float]:
+        """
+        キャンセル要求から現在（最後のアーム指令の直後）までの時間を記録
+
+        Returns:
+            Optional[float]: 経過時間（秒）。キャンセルされていなければNone
+        """
+        if self.cancelled_at is None:
+            return None
+        latency = time.perf_counter() - self.cancelled_at
+        label = label or self.name
+        with _stop_latency_lock:
+            histogram = _stop_latency.setdefault(label, Histogram())
+        histogram.observe(latency)
+        print(f"[Cancel] {label} stopped {latency * 1000:.1f}ms after cancel ({self.reason})")
+        return latency
+
+
+def get_stop_latency_stats() -> Dict[str, Histogram]:
+    """動作名 → 検出から停止までの時間のヒストグラム"""
+    with _stop_latency_lock:
+        return dict(_stop_latency)
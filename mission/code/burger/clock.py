@@ -0,0 +1,50 @@
+"""
+時計モジュール
+制御ループ・待機・タイマーが使う時刻と待機時間をまとめて扱う
+
+シミュレーション時は時間倍率（BURGER_TIME_SCALE、または set_time_scale()）を上げると、
+すべての待機が倍率分だけ短くなり、now() は倍率分だけ速く進む
+実機では倍率は常に1で、time.perf_counter / time.sleep / Event.wait と同じ動作になる
+
+所要時間の計測（ヒストグラム・ログ）は実時間のままとし、time.perf_counter を直接使う
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+_scale = float(os.environ.get("BURGER_TIME_SCALE", "1.0"))
+
+
+def set_time_scale(scale: float):
+    """時間倍率を設定（2.0なら実時間の2倍速）"""
+    global _scale
+    if scale <= 0:
+        raise ValueError(f"time scale must be positive: {scale}")
+    _scale = float(scale)
+
+
+def time_scale() -> float:
+    return _scale
+
+
+def now() -> float:
+    """制御用の時刻（秒）。差分だけに意味がある"""
+    return time.perf_counter() * _scale
+
+
+def real_seconds(seconds: float) -> float:
+    """制御上の秒数を実時間の秒数に変換"""
+    return seconds / _scale
+
+
+def sleep(seconds: float):
+    """制御上の秒数だけ待機"""
+    if seconds > 0:
+        time.sleep(seconds / _scale)
+
+
+def wait(event: threading.Event, timeout: Optional[float] = None) -> bool:
+    """イベントを制御上の timeout 秒まで待機"""
+    return event.wait(None if timeout is None else max(0.0, timeout) / _scale)
@@ -0,0 +1,141 @@
+"""
+指令ストリームモジュール
+再生ループとフォロワーの間に入り、前回送った値から不感帯以上動いた関節だけを送る
+
+- SO101Follower.send_action は渡された関節だけを1回の Sync Write で書き込むため、
+  関節を絞れば1回の書き込みが短くなり、どの関節も動いていないフレームは書き込み自体を省ける
+- 送らなかった関節の指令との差は常に不感帯以下（追従誤差の上限）
+- 通信の取りこぼしに備え、keyframe_interval フレームごとに全関節を送る
+
+Sync Write のバイト数はヘッダ等8バイト + 関節ごとに ID 1バイト・位置 2バイトとして見積もる
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+SYNC_WRITE_HEADER_BYTES = 8
+SYNC_WRITE_BYTES_PER_JOINT = 3
+
+
+def sync_write_bytes(num_joints: int) -> int:
+    """num_joints 関節分の Sync Write の送信バイト数"""
+    return SYNC_WRITE_HEADER_BYTES + SYNC_WRITE_BYTES_PER_JOINT * num_joints
+
+
+@dataclass
+class StreamStats:
+    """1回の再生での送信量"""
+    num_joints: int
+    frames: int = 0
+    writes: int = 0
+    keyframes: int = 0
+    joints_sent: int = 0
+    bytes_sent: int = 0
+    # 送らなかった関節の、指令値と最後に送った値の差の最大
+    max_error: float = 0.0
+
+    @property
+    def full_bytes(self) -> int:
+        """毎フレーム全関節を送った場合のバイト数"""
+        return self.frames * sync_write_bytes(self.num_joints)
+
+    @property
+    def writes_saved(self) -> int:
+        return self.frames - self.writes
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.full_bytes - self.bytes_sent
+
+    def to_dict(self) -> dict:
+        return {
+            "frames": self.frames,
+            "writes": self.writes,
+            "keyframes": self.keyframes,
+            "joints_sent": self.joints_sent,
+            "bytes_sent": self.bytes_sent,
+            "writes_saved": self.writes_saved,
+            "bytes_saved": self.bytes_saved,
+            "max_error": self.max_error,
+        }
+
+    def summary(self) -> str:
+        saved = self.bytes_saved / self.full_bytes if self.full_bytes else 0.0
+        return (f"writes={self.writes}/{self.frames} bytes={self.bytes_sent}/{self.full_bytes} "
+                f"(saved {saved:.0%}) max_error={self.max_error:.2f}")
+
+
+class CommandStream:
+    """不感帯を超えた関節だけをフォロワーに送る"""
+
+    def __init__(self, follower, names: Sequence[str], deadband: float = 0.3,
+                 deadbands: Optional[Dict[str, float]] = None, keyframe_interval: Optional[int] = 30):
+        """
+        Args:
+            follower: 送信先のフォロワー（send_action を持つもの）
+            names: 行の各列に対応する関節名（"shoulder_pan.pos" など）
+            deadband: 送信を省く変化量の上限（正規化単位。グリッパー以外は -100〜100、グリッパーは 0〜100）。0 なら変化した関節はすべて送る
+            deadbands: 関節名 → 不感帯（含まれない関節は deadband）
+            keyframe_interval: 全関節を送るフレーム間隔（Noneの場合は最初のフレームのみ）
+        """
+        self.follower = follower
+        self.names = tuple(names)
+        self.deadband = np.array([(deadbands or {}).get(name, deadband) for name in self.names],
+                                 dtype=np.float64)
+        self.keyframe_interval = keyframe_interval
+        self._last_sent = None
+        self._since_keyframe = 0
+        self.stats = StreamStats(len(self.names))
+
+    def _write(self, row, indices) -> int:
+        self.follower.send_action({self.names[i]: row[i] for i in indices})
+        self.stats.writes += 1
+        self.stats.joints_sent += len(indices)
+        self.stats.bytes_sent += sync_write_bytes(len(indices))
+        return len(indices)
+
+    def send(self, row: Sequence[float]) -> int:
+        """
+        1フレーム分の指令を送る
+
+        Args:
+            row: 関節ごとの目標位置（names と同じ順）
+
+        Returns:
+            int: 実際に送った関節数（0 の場合は書き込みなし）
+        """
+        values = np.asarray(row, dtype=np.float64)
+        self.stats.frames += 1
+
+        keyframe = self._last_sent is None or (
+            self.keyframe_interval is not None and self._since_keyframe >= self.keyframe_interval)
+        if keyframe:
+            self._last_sent = values.copy()
+            self._since_keyframe = 1
+            self.stats.keyframes += 1
+            return self._write(row, range(len(self.names)))
+        self._since_keyframe += 1
+
+        error = np.abs(values - self._last_sent)
+        changed = np.flatnonzero((error > self.deadband) | ((self.deadband == 0) & (error > 0)))
+        if len(changed):
+            self._last_sent[changed] = values[changed]
+            error[changed] = 0.0
+        self.stats.max_error = max(self.stats.max_error, float(error.max()))
+        if len(changed) == 0:
+            return 0
+        return self._write(row, changed)
+
+    def flush(self, row: Sequence[float]) -> int:
+        """最後に送った値と異なる関節をすべて送り、指令値と完全に一致させる"""
+        values = np.asarray(row, dtype=np.float64)
+        if self._last_sent is None:
+            self._last_sent = values.copy()
+            return self._write(row, range(len(self.names)))
+        changed = np.flatnonzero(values != self._last_sent)
+        if len(changed) == 0:
+            return 0
+        self._last_sent[changed] = values[changed]
+        return self._write(row, changed)
@@ -4,119 +4,352 @@
 YOLOv8を使用した人検知
 """
 
-import cv2
-from ultralytics import YOLO
+import math
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from detector_backends import load_detector
+from frame_grabber import get_grabber
+from preprocess import DEFAULT_ROI, RoiPreprocessor
+from motion_gate import MotionGate
+from snapshot_sink import get_snapshot_sink
+from metrics import timed
+# 人と判定する条件は detector_backends の比較でも使うため person_filter に置く
+from person_filter import (MIN_BOX_RATIO, MIN_CONFIDENCE, PERSON_CLASS_ID, DetectionConfig,
+                           box_rows, predict_kwargs, select_person_boxes)
 
 # グローバルにモデルとカメラを保持（初回のみロード）
 _model = None
-_cap = None
+_grabber = None
+# カメラ番号 → 最後に推論したフレームの通し番号（同じフレームを二度推論しないため）
+_last_seqs = {}
+# カメラ番号 → 最後に推論したフレームの取得時刻（time.monotonic）
+_last_frame_times = {}
 
-def _initialize_detection(camera_index: int = 4, model_name: str = "yolov8s.pt"):
-    """検出用のモデルとカメラを初期化"""
-    global _model, _cap
-    
+_config = DetectionConfig.from_env()
+
+# 切り取り → 回転を必要な領域だけに行う前処理（バッファは呼び出し間で使い回す）
+_preprocessor = RoiPreprocessor(DEFAULT_ROI)
+# バッチ推論用（バッチ内の各フレームが別々のバッファを持つよう面数を増やして使う）
+_batch_preprocessor = RoiPreprocessor(DEFAULT_ROI)
+
+# 静止した場面ではYOLOを実行しないための動きゲート
+_motion_gate = MotionGate()
+
+def input_size_for_crop(crop_width: int, crop_height: int, stride: int = 32) -> int:
+    """切り取り画像の長辺をストライドの倍数に切り上げた推論の入力サイズ"""
+    return int(math.ceil(max(crop_width, crop_height) / stride) * stride)
+
+
+def _load_model(model_name: str = "yolov8s.pt", frame_shape: Optional[Sequence[int]] = None):
+    """
+    検出用のモデルをロード（初回のみ）
+
+    BURGER_DETECTOR_BACKEND / BURGER_DETECTOR_IMGSZ に従い、detector_backends の --select で
+    前もって選んだエクスポート済みのバックエンドをロードする（なければ PyTorch）
+    入力サイズの指定がなければ、frame_shape のフレームから切り取る領域に合わせる
+    （640x480 のカメラなら切り取り後は 320x426 なので 448。既定の 640 より画素数が半分以下になる）
+    """
+    global _model
     if _model is None:
-        _model = YOLO(model_name)
+        imgsz = _config.imgsz
+        if imgsz is None and frame_shape is not None:
+            c0, r0, c1, r1 = _preprocessor.roi_pixels(frame_shape)
+            imgsz = input_size_for_crop(c1 - c0, r1 - r0)
+        _model = load_detector(model_name, imgsz=imgsz)
+    return _model
+
+
+def _predict_kwargs() -> dict:
+    """現在の判定条件での推論器の引数"""
+    return predict_kwargs(_config)
+
+
+def _initialize_detection(camera_index: int = 4, model_name: str = "yolov8s.pt"):
+    """検出用のモデルとカメラ取得スレッドを初期化"""
+    global _grabber
     
-    if _cap is None or not _cap.isOpened():
-        _cap = cv2.VideoCapture(camera_index)
-        if not _cap.isOpened():
+    if _grabber is None or not _grabber.is_running or _grabber.camera_index != camera_index:
+        _grabber = get_grabber(camera_index)
+        if _grabber is None:
             return False
     
+    # 入力サイズを切り取り領域に合わせるため、最初のフレームの大きさを見てからロードする
+    if _model is None:
+        grabbed = _grabber.wait_newer(0, timeout=2.0)
+        _load_model(model_name, grabbed.image.shape if grabbed is not None else None)
+    
+    return True
+
+
+def warm_up(camera_index: int = 4, model_name: str = "yolov8s.pt") -> bool:
+    """
+    カメラの起動・モデルのロード・1回分の推論を済ませておく（最初の検出が遅くならないように）
+
+    Returns:
+        bool: カメラとモデルの準備ができたか
+    """
+    if not _initialize_detection(camera_index, model_name):
+        return False
+    grabbed = _grabber.wait_newer(0, timeout=2.0)
+    if grabbed is None:
+        return False
+    # 推論器の初期化（入力サイズに合わせた前処理・バックエンドの準備）はここで済ませる
+    _model(_preprocessor.process(grabbed.image), verbose=False, **_predict_kwargs())
+    return True
+
+
+def get_detection_config() -> DetectionConfig:
+    """人と判定する条件を取得"""
+    return _config
+
+
+def set_detection_config(config: DetectionConfig):
+    """
+    人と判定する条件を変更
+
+    入力サイズが変わる場合は、次の検出時にモデルをロードし直す
+    """
+    global _config, _model
+    if config.imgsz != _config.imgsz:
+        _model = None
+    _config = config
+
+
+def get_capture_stats() -> dict:
+    """検出用カメラの取得FPS・最新フレームの経過時間などを取得"""
+    if _grabber is None:
+        return {}
+    return _grabber.stats()
+
+
+def set_detection_roi(roi=DEFAULT_ROI):
+    """
+    検出に使う切り取り領域を変更
+
+    Args:
+        roi: 回転後の画像に対する (x0, y0, x1, y1) の割合（Fractionでの指定を推奨）
+    """
+    global _preprocessor, _batch_preprocessor
+    _preprocessor = RoiPreprocessor(roi)
+    _batch_preprocessor = RoiPreprocessor(roi)
+
+
+def _select_person_boxes(data: np.ndarray, crop_sizes: np.ndarray) -> np.ndarray:
+    """現在の判定条件で人と判定するボックスだけを抽出（person_filter.select_person_boxes を参照）"""
+    return select_person_boxes(data, crop_sizes, _config)
+
+
+def _collect_frames(camera_indices: Sequence[int], frame_count: int) -> list:
+    """各カメラから未推論のフレームを frame_count 枚ずつ集める"""
+    frames = []
+    for camera_index in camera_indices:
+        grabber = get_grabber(camera_index)
+        if grabber is None:
+            continue
+        for _ in range(frame_count):
+            grabbed = grabber.wait_newer(_last_seqs.get(camera_index, 0), timeout=1.0)
+            if grabbed is None:
+                break
+            _last_seqs[camera_index] = grabbed.seq
+            _last_frame_times[camera_index] = grabbed.timestamp
+            frames.append(grabbed.image)
+    return frames
+
+
+def get_last_frame_time(camera_index: int = 4):
+    """最後に判定したフレームの取得時刻（time.monotonic）。判定からの遅延の計測に使う"""
+    return _last_frame_times.get(camera_index)
+
+
+def get_snapshot_stats() -> dict:
+    """検知画像の保存キューの深さ・破棄数などを取得"""
+    return get_snapshot_sink().stats()
+
+
+def get_gate_stats() -> dict:
+    """動きゲートの通過率・推定CPU節約時間を取得"""
+    return _motion_gate.stats()
+
+
+def detect_person_batch(frames: Sequence, save_snapshot: bool = True) -> bool:
+    """
+    複数フレームをまとめて1回のバッチ推論で判定
+
+    各フレームを回転・切り取りしてから _model に一括で渡し、
+    全フレームの検出結果を1つの配列にまとめて配列演算で判定する
+
+    Args:
+        frames: BGRフレームのリスト（1台のカメラの連続フレーム、または複数カメラのフレーム）
+        save_snapshot: 人を検出した場合に画像を保存するか
+
+    Returns:
+        bool: いずれかのフレームで人が検出されたかどうか
+    """
+    if not frames:
+        return False
+
+    _batch_preprocessor.ensure_slots(len(frames))
+    with timed("rotate_crop"):
+        crops = [_batch_preprocessor.process(frame) for frame in frames]
+    return detect_person_in_crops(crops, save_snapshot)
+
+
+def detect_person_in_crops(crops: Sequence[np.ndarray], save_snapshot: bool = True) -> bool:
+    """
+    前処理済み（切り取り・回転済み）の画像をまとめて推論して判定
+
+    Args:
+        crops: 前処理済みのBGR画像のリスト
+        save_snapshot: 人を検出した場合に画像を保存するか
+
+    Returns:
+        bool: いずれかの画像で人が検出されたかどうか
+    """
+    if not crops:
+        return False
+    crop_sizes = np.array([(c.shape[1], c.shape[0]) for c in crops], dtype=np.float32)
+
+    with timed("yolo_inference"):
+        results = _model(crops, verbose=False, **_predict_kwargs())
+
+    with timed("box_postprocess"):
+        # 全フレームのボックスを [x1, y1, x2, y2, conf, cls, frame_index] の1配列にまとめる
+        persons = _select_person_boxes(
+            np.concatenate([box_rows(result, i) for i, result in enumerate(results)]), crop_sizes)
+    if len(persons) == 0:
+        return False
+
+    for i, row in enumerate(persons, 1):
+        print(f"[Detection] Person {i}: frame={int(row[6])}, confidence={row[4]:.2f}, "
+              f"size={row[2] - row[0]:.1f}x{row[3] - row[1]:.1f}")
+
+    if save_snapshot:
+        # 描画・保存はバックグラウンドで行う（キューが満杯なら破棄）
+        frame_index = int(persons[0, 6])
+        with timed("snapshot_submit"):
+            filepath = get_snapshot_sink().submit(crops[frame_index], results[frame_index])
+        if filepath:
+            print(f"[Detection] Image queued to {filepath}")
+
     return True
 
 
-def detect_person(camera_index: int = 4, frame_count: int = 1, model_name: str = "yolov8s.pt") -> bool:
+def benchmark_batch_sizes(batch_sizes: Sequence[int] = (1, 2, 4, 8), repeats: int = 5,
+                          camera_index: int = 4, model_name: str = "yolov8s.pt") -> dict:
+    """
+    バッチサイズごとの1フレームあたりの推論時間を計測
+
+    Returns:
+        dict: バッチサイズ → 1フレームあたりの平均時間（秒）
+    """
+    if not _initialize_detection(camera_index, model_name):
+        print("[Error] Could not initialize detection")
+        return {}
+
+    grabbed = _grabber.wait_newer(0, timeout=2.0)
+    if grabbed is None:
+        print("[Error] Could not read frame from camera")
+        return {}
+    crop = _preprocessor.process(grabbed.image)
+
+    # ウォームアップ
+    _model([crop], verbose=False, **_predict_kwargs())
+
+    report = {}
+    for batch_size in batch_sizes:
+        crops = [crop] * batch_size
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            _model(crops, verbose=False, **_predict_kwargs())
+        per_frame = (time.perf_counter() - t0) / (repeats * batch_size)
+        report[batch_size] = per_frame
+        print(f"[Benchmark] batch={batch_size}: {per_frame * 1000:.1f} ms/frame "
+              f"({batch_size * per_frame * 1000:.1f} ms/batch)")
+    return report
+
+
+def detect_person(camera_index: int = 4, frame_count: int = 1, model_name: str = "yolov8s.pt",
+                  batch: bool = False, camera_indices: Optional[Sequence[int]] = None,
+                  motion_gate: bool = True) -> bool:
     """
     YOLOv8を使用してビデオキャプチャから人を検出
     
     処理フロー:
-    1. フレーム取得
-    2. 反時計回り90度回転
-    3. 左側2/3、上側2/3の領域を切り取り
-    4. YOLOで推論実行
+    1. フレーム取得（取得スレッドが保持する最新フレーム）
+    2. 切り取り領域に動きがなければYOLOを省略（一定間隔で強制的に実行）
+    3. 回転後の左側2/3、上側2/3に相当する領域を切り取り
+    4. 切り取った領域だけを反時計回り90度回転
+    5. YOLOで推論実行
     
     Args:
         camera_index: カメラのインデックス（デフォルト: 4 = /dev/video4）
         frame_count: チェックするフレーム数（デフォルト: 1）
         model_name: YOLOモデル名（デフォルト: yolov8s.pt）
+        batch: Trueの場合、frame_count枚（×カメラ数）をまとめて1回のバッチ推論で判定
+        camera_indices: バッチ推論で使う複数カメラのインデックス（Noneの場合はcamera_indexのみ）
+        motion_gate: Trueの場合、動きのないフレームではYOLOを実行しない
     
     Returns:
         bool: 人が検出されたかどうか
     """
-    global _model, _cap
+    global _model
     
     try:
         # モデルとカメラを初期化
         if not _initialize_detection(camera_index, model_name):
             return False
         
+        if batch:
+            frames = _collect_frames(camera_indices or [camera_index], frame_count)
+            return detect_person_batch(frames)
+        
         person_detected = False
-        person_count = 0
         
         for _ in range(frame_count):
-            ret, frame = _cap.read()
+            # 未推論の最新フレームを取得（なければ次のフレームを待つ）
+            with timed("capture"):
+                grabbed = _grabber.wait_newer(_last_seqs.get(camera_index, 0), timeout=1.0)
             
-            if not ret:
+            if grabbed is None:
                 break
+            _last_seqs[camera_index] = grabbed.seq
+            _last_frame_times[camera_index] = grabbed.timestamp
             
-            # 反時計回り90度回転
-            rotated_frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            
-            # 回転後のサイズを取得
-            height, width = rotated_frame.shape[:2]
+            # 切り取り領域（回転前のビュー）に動きがなければ推論しない
+            if motion_gate and not _motion_gate.should_run(_preprocessor.sensor_roi(grabbed.image)):
+                continue
             
-            # 左側2/3、上側2/3の領域を切り取り
-            crop_width = int(width * 2 / 3)
-            crop_height = int(height * 2 / 3)
-            cropped_frame = rotated_frame[0:crop_height, 0:crop_width]
+            # 左側2/3、上側2/3に相当する領域だけを切り取ってから反時計回り90度回転
+            with timed("rotate_crop"):
+                cropped_frame = _preprocessor.process(grabbed.image)
+            crop_height, crop_width = cropped_frame.shape[:2]
             
-            # YOLOで推論実行
-            results = _model(cropped_frame, verbose=False)
+            # YOLOで推論実行（person クラス・信頼度の閾値は推論器の中で絞り込む）
+            t0 = time.perf_counter()
+            with timed("yolo_inference"):
+                results = _model(cropped_frame, verbose=False, **_predict_kwargs())
+            _motion_gate.record_inference(time.perf_counter() - t0)
             
-            # 人（クラスID=0）を検出
-            # バウンディングボックスの大きさに閾値を設ける
-            # 縦横がともに画角の2/3より大きいことを条件とする
-            min_box_width = crop_width * 2 / 3
-            min_box_height = crop_height * 2 / 3
-            min_confidence = 0.6  # 信頼度の閾値
-            
-            detected_info = []  # 検出された人の情報を保存
-            
-            for result in results:
-                for box in result.boxes:
-                    class_id = int(box.cls[0])
-                    confidence = float(box.conf[0])
-                    
-                    # YOLO では person クラスID = 0
-                    if class_id == 0:
-                        # バウンディングボックスのサイズを取得
-                        x1, y1, x2, y2 = box.xyxy[0].tolist()
-                        box_width = x2 - x1
-                        box_height = y2 - y1
-                        
-                        # 信頼度が0.6以上、かつ縦横がともに画角の2/3より大きい場合のみ検出とする
-                        if confidence >= min_confidence and box_width > min_box_width and box_height > min_box_height:
-                            person_detected = True
-                            person_count += 1
-                            detected_info.append({
-                                'confidence': confidence,
-                                'width': box_width,
-                                'height': box_height
-                            })
+            # 信頼度が閾値以上、かつ縦横がともに画角の2/3より大きい人だけを検出とする
+            with timed("box_postprocess"):
+                persons = _select_person_boxes(
+                    box_rows(results[0]), np.array([(crop_width, crop_height)], dtype=np.float32))
+            person_detected = len(persons) > 0
             
             if person_detected:
                 # 検出結果を画像として保存（人が検出された時のみ）
-                annotated_frame = results[0].plot()
-                import datetime
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                filepath = f"/tmp/person_detected_{timestamp}.jpg"
-                cv2.imwrite(filepath, annotated_frame)
+                # 描画・エンコード・書き込みはバックグラウンドで行い、キューが満杯なら破棄する
+                with timed("snapshot_submit"):
+                    filepath = get_snapshot_sink().submit(cropped_frame, results[0])
                 
                 # 検出情報を出力
-                for i, info in enumerate(detected_info, 1):
-                    print(f"[Detection] Person {i}: confidence={info['confidence']:.2f}, size={info['width']:.1f}x{info['height']:.1f}")
-                print(f"[Detection] Image saved to {filepath}")
+                for i, row in enumerate(persons, 1):
+                    print(f"[Detection] Person {i}: confidence={row[4]:.2f}, size={row[2] - row[0]:.1f}x{row[3] - row[1]:.1f}")
+                if filepath:
+                    print(f"[Detection] Image queued to {filepath}")
                 break
         
         return person_detected
@@ -128,9 +361,16 @@ def detect_person(camera_index: int = 4, frame_count: int = 1, model_name: str =
 
 # テスト用
 if __name__ == "__main__":
+    import sys
+    import cv2
+    if "--bench-batch" in sys.argv:
+        # バッチサイズごとの推論時間を計測して終了
+        benchmark_batch_sizes()
+        sys.exit(0)
+    
     try:
         # YOLOv8モデルをロード
-        model = YOLO("yolov8s.pt")
+        model = load_detector("yolov8s.pt")
         
         cap = cv2.VideoCapture(4)
         
@@ -4,67 +4,108 @@
 MediaPipeを使用した人検知と正面向き判定
 """
 
+import time
+
 import cv2
 import mediapipe as mp
 
+from frame_grabber import get_grabber
+from hardware import make_video_capture
+from preprocess import DEFAULT_ROI, RoiPreprocessor
 
-def detect_person(camera_index: int = 4, frame_count: int = 1) -> bool:
+# 切り取り → 回転 → RGB変換を使い回しバッファ上で行う前処理
+_preprocessor = RoiPreprocessor(DEFAULT_ROI, color_code=cv2.COLOR_BGR2RGB)
+
+
+class PoseDetector:
     """
-    MediaPipeを使用してビデオキャプチャから正面を向いている人を検出
-    
-    処理フロー:
-    1. フレーム取得
-    2. 反時計回り90度回転
-    3. 左側2/3、上側2/3の領域を切り取り
-    4. MediaPipeで姿勢推定実行
-    5. 頭部ランドマークで正面向き判定
-    
-    Args:
-        camera_index: カメラのインデックス（デフォルト: 4 = /dev/video4）
-        frame_count: チェックするフレーム数（デフォルト: 1）
-    
-    Returns:
-        bool: 正面を向いている人が検出されたかどうか
+    MediaPipe Poseのグラフとカメラを開いたまま保持する正面向き人検知器
+
+    static_image_mode=False（トラッキングモード）で連続フレームを与えるため、
+    smooth_landmarks による時間方向の平滑化が呼び出しをまたいで効く
+
+    使い方:
+        with PoseDetector(camera_index=4) as detector:
+            detector.detect()
     """
-    try:
-        # MediaPipeの姿勢推定を初期化
-        mp_pose = mp.solutions.pose
-        pose = mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=1,
-            smooth_landmarks=True
-        )
-        
-        cap = cv2.VideoCapture(camera_index)
+
+    def __init__(self, camera_index: int = 4, model_complexity: int = 1):
+        self.camera_index = camera_index
+        self.model_complexity = model_complexity
+        self._pose = None
+        self._grabber = None
+        # 最後に処理したフレームの通し番号（同じフレームを二度処理しないため）
+        self._last_seq = 0
+        # 最後に処理したフレームの取得時刻（time.monotonic）
+        self.last_frame_time = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._pose is not None and self._grabber is not None and self._grabber.is_running
+
+    def open(self) -> bool:
+        """姿勢推定グラフとカメラを開く（既に開いていれば何もしない）"""
+        if self._pose is None:
+            self._pose = mp.solutions.pose.Pose(
+                static_image_mode=False,
+                model_complexity=self.model_complexity,
+                smooth_landmarks=True
+            )
         
-        if not cap.isOpened():
-            print("[Warning] Could not open camera")
+        # カメラは取得スレッドが開いたまま保持する
+        if self._grabber is None or not self._grabber.is_running:
+            self._grabber = get_grabber(self.camera_index)
+            if self._grabber is None:
+                print("[Warning] Could not open camera")
+                return False
+        return True
+
+    def close(self):
+        """姿勢推定グラフを閉じる（カメラは frame_grabber.release_all_grabbers() で解放）"""
+        if self._pose is not None:
+            self._pose.close()
+            self._pose = None
+        self._grabber = None
+        self._last_seq = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def detect(self, frame_count: int = 1) -> bool:
+        """
+        正面を向いている人を検出
+
+        Args:
+            frame_count: チェックするフレーム数
+
+        Returns:
+            bool: 正面を向いている人が検出されたかどうか
+        """
+        if not self.open():
             return False
         
         person_detected = False
         person_count = 0
         
         for _ in range(frame_count):
-            ret, frame = cap.read()
+            # 未処理の最新フレームを取得（なければ次のフレームを待つ）
+            grabbed = self._grabber.wait_newer(self._last_seq, timeout=1.0)
             
-            if not ret:
+            if grabbed is None:
                 print("[Warning] Could not read frame from camera")
                 break
+            self._last_seq = grabbed.seq
+            self.last_frame_time = grabbed.timestamp
             
-            # 反時計回り90度回転
-            rotated_frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            
-            # 回転後のサイズを取得
-            height, width = rotated_frame.shape[:2]
-            
-            # 左側2/3、上側2/3の領域を切り取り
-            crop_width = int(width * 2 / 3)
-            crop_height = int(height * 2 / 3)
-            cropped_frame = rotated_frame[0:crop_height, 0:crop_width]
+            # 左側2/3、上側2/3に相当する領域だけを切り取り、回転・RGB変換
+            rgb_frame = _preprocessor.process(grabbed.image)
             
             # MediaPipeで推論実行
-            rgb_frame = cv2.cvtColor(cropped_frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb_frame)
+            results = self._pose.process(rgb_frame)
             
             # 人を検出し、正面向きか判定
             if results.pose_landmarks:
@@ -79,15 +120,91 @@ def detect_person(camera_index: int = 4, frame_count: int = 1) -> bool:
                 print(f"[Detection] {person_count} frontal person(s) detected")
                 break
         
-        pose.close()
-        cap.release()
         return person_detected
+
+
+# detect_person() から使う常駐検知器
+_detector = None
+
+
+def detect_person(camera_index: int = 4, frame_count: int = 1) -> bool:
+    """
+    MediaPipeを使用してビデオキャプチャから正面を向いている人を検出
+    
+    処理フロー:
+    1. フレーム取得（取得スレッドが保持する最新フレーム）
+    2. 回転後の左側2/3、上側2/3に相当する領域を切り取り
+    3. 切り取った領域だけを反時計回り90度回転・RGB変換
+    4. MediaPipeで姿勢推定実行（グラフは呼び出し間で保持）
+    5. 頭部ランドマークで正面向き判定
+    
+    Args:
+        camera_index: カメラのインデックス（デフォルト: 4 = /dev/video4）
+        frame_count: チェックするフレーム数（デフォルト: 1）
+    
+    Returns:
+        bool: 正面を向いている人が検出されたかどうか
+    """
+    global _detector
+    
+    try:
+        if _detector is None or _detector.camera_index != camera_index:
+            if _detector is not None:
+                _detector.close()
+            _detector = PoseDetector(camera_index)
+        
+        return _detector.detect(frame_count)
     
     except Exception as e:
         print(f"[Error] Detection error: {e}")
         return False
 
 
+def get_last_frame_time():
+    """常駐検知器が最後に処理したフレームの取得時刻（time.monotonic）"""
+    return _detector.last_frame_time if _detector is not None else None
+
+
+def close_detector():
+    """常駐検知器を閉じる"""
+    global _detector
+    if _detector is not None:
+        _detector.close()
+        _detector = None
+
+
+def benchmark_calls(n_calls: int = 30, camera_index: int = 4) -> dict:
+    """
+    呼び出しごとにPoseとカメラを作り直す場合と、常駐検知器の場合の1秒あたりの呼び出し回数を比較
+
+    Returns:
+        dict: {"per_call": 回/秒, "persistent": 回/秒}
+    """
+    # 従来方式: 呼び出しごとにカメラとPoseを開いて閉じる
+    t0 = time.perf_counter()
+    for _ in range(n_calls):
+        cap = make_video_capture(camera_index)
+        pose = mp.solutions.pose.Pose(static_image_mode=False, model_complexity=1, smooth_landmarks=True)
+        ret, frame = cap.read()
+        if ret:
+            pose.process(_preprocessor.process(frame))
+        pose.close()
+        cap.release()
+    per_call = n_calls / (time.perf_counter() - t0)
+
+    # 常駐方式
+    with PoseDetector(camera_index) as detector:
+        detector.detect()  # ウォームアップ
+        t0 = time.perf_counter()
+        for _ in range(n_calls):
+            detector.detect()
+        persistent = n_calls / (time.perf_counter() - t0)
+
+    print(f"[Benchmark] per-call Pose/camera: {per_call:.1f} calls/s")
+    print(f"[Benchmark] persistent detector:  {persistent:.1f} calls/s ({persistent / per_call:.1f}x)")
+    return {"per_call": per_call, "persistent": persistent}
+
+
 def _is_frontal_pose(landmarks) -> bool:
     """
     ランドマークから正面向きか判定
@@ -141,6 +258,12 @@ def _is_frontal_pose(landmarks) -> bool:
 
 # テスト用
 if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        # Poseとカメラの作り直しあり／なしの呼び出し速度を比較して終了
+        benchmark_calls()
+        sys.exit(0)
+    
     try:
         mp_pose = mp.solutions.pose
         pose = mp_pose.Pose(
@@ -0,0 +1,163 @@
+"""
+検出頻度の調整モジュール
+シナリオ1の人検知を一定間隔ではなく、アームの動作と直近の検出結果に合わせた間隔で実行する
+
+- smoking など見つかると困る動作の間は間隔を詰める
+- IDLE の間や、人が見つからない状態が続いている間は間隔を広げる
+- 検出にかかる時間が CPU 予算（検出が占めてよい時間の割合）を超えないよう間隔の下限を決める
+
+実際に得られた反応時間（人が現れてから検出が終わるまでの最悪値）を動作ごとのヒストグラムで記録する
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import clock
+import metrics
+from histogram import Histogram
+
+
+@dataclass(frozen=True)
+class DutyProfile:
+    """動作ごとの検出間隔（秒）"""
+    min_interval: float  # 動作が切り替わった直後・人の気配があった直後の間隔
+    max_interval: float  # 人が見つからない状態が続いたときの間隔
+
+
+# 動作名（RightHandState の値）→ 検出間隔
+DEFAULT_PROFILES: Dict[str, DutyProfile] = {
+    "idle": DutyProfile(0.25, 0.5),
+    "smoking": DutyProfile(0.0, 0.05),
+}
+FALLBACK_PROFILE = DutyProfile(0.1, 0.3)
+
+# 反応時間のバケット（ミリ秒）
+REACTION_BUCKETS_MS = (25, 50, 75, 100, 150, 200, 300, 400, 500, 750, 1000, 1500, 2000)
+
+
+class DetectionScheduler:
+    """動作・検出履歴・CPU予算から次の検出までの間隔を決める"""
+
+    def __init__(self, profiles: Optional[Dict[str, DutyProfile]] = None,
+                 cpu_budget: Optional[float] = None, quiet_ramp_sec: float = 5.0,
+                 busy_alpha: float = 0.2):
+        """
+        Args:
+            profiles: 動作名 → 検出間隔（Noneの場合は DEFAULT_PROFILES）
+            cpu_budget: 検出が占めてよい時間の割合 0～1（Noneの場合は BURGER_DETECTION_CPU_BUDGET、既定0.5）
+            quiet_ramp_sec: 人が見つからない状態がこの秒数続くと max_interval まで広げる
+            busy_alpha: 検出1回の所要時間の指数移動平均の係数
+        """
+        self.profiles = dict(DEFAULT_PROFILES if profiles is None else profiles)
+        if cpu_budget is None:
+            cpu_budget = float(os.environ.get("BURGER_DETECTION_CPU_BUDGET", "0.5"))
+        if not 0.0 < cpu_budget <= 1.0:
+            raise ValueError(f"cpu_budget must be in (0, 1], got {cpu_budget}")
+        self.cpu_budget = cpu_budget
+        self.quiet_ramp_sec = quiet_ramp_sec
+        self.busy_alpha = busy_alpha
+
+        self.activity = None
+        self._activity_since = clock.now()
+        self._last_positive = None
+        self._prev_start = None
+        self._busy_ewma = None
+
+        # 統計情報
+        self.checks = 0
+        self.busy_total = 0.0
+        self._started_at = None
+        self.reaction: Dict[str, Histogram] = {}
+        self.interval = Histogram()
+
+    def restart(self):
+        """検出ループの開始時に呼ぶ（停止していた間を反応時間に含めない）"""
+        self._prev_start = None
+        self._activity_since = clock.now()
+
+    def set_activity(self, activity: str):
+        """現在の動作を設定（切り替わった場合は間隔を詰め直す）"""
+        if activity != self.activity:
+            self.activity = activity
+            self._activity_since = clock.now()
+
+    def run(self, detect: Callable[[], bool]) -> bool:
+        """
+        検出を1回実行し、所要時間と反応時間を記録
+
+        Args:
+            detect: 人が検出されたかを返す関数
+
+        Returns:
+            bool: detect の結果
+        """
+        start = clock.now()
+        if self._started_at is None:
+            self._started_at = start
+        try:
+            result = detect()
+        finally:
+            end = clock.now()
+            self._record(start, end)
+        if result:
+            self._last_positive = end
+        return result
+
+    def _record(self, start: float, end: float):
+        busy = end - start
+        self.checks += 1
+        self.busy_total += busy
+        self._busy_ewma = busy if self._busy_ewma is None else (
+            self.busy_alpha * busy + (1 - self.busy_alpha) * self._busy_ewma)
+
+        # 前回の検出がフレームを取った直後に人が現れた場合、今回の検出が終わるまで気付けない
+        if self._prev_start is not None:
+            reaction = end - self._prev_start
+            label = self.activity or "unknown"
+            histogram = self.reaction.get(label)
+            if histogram is None:
+                histogram = self.reaction[label] = Histogram(REACTION_BUCKETS_MS)
+            histogram.observe(reaction)
+            metrics.observe("detection_reaction", reaction)
+        self._prev_start = start
+
+    def cpu_floor(self) -> float:
+        """CPU予算を守るための間隔の下限（秒）"""
+        if self._busy_ewma is None:
+            return 0.0
+        return self._busy_ewma * (1.0 - self.cpu_budget) / self.cpu_budget
+
+    def next_interval(self) -> float:
+        """次の検出までに待つ時間（秒）"""
+        profile = self.profiles.get(self.activity, FALLBACK_PROFILE)
+        now = clock.now()
+        quiet_since = self._activity_since
+        if self._last_positive is not None and self._last_positive > quiet_since:
+            quiet_since = self._last_positive
+        ramp = min(1.0, (now - quiet_since) / self.quiet_ramp_sec) if self.quiet_ramp_sec > 0 else 1.0
+        interval = profile.min_interval + (profile.max_interval - profile.min_interval) * ramp
+        interval = max(interval, self.cpu_floor())
+        self.interval.observe(interval)
+        return interval
+
+    def stats(self) -> dict:
+        """動作ごとの反応時間・実際のCPU使用割合などを返す"""
+        elapsed = (clock.now() - self._started_at) if self._started_at is not None else 0.0
+        return {
+            "checks": self.checks,
+            "activity": self.activity,
+            "duty_cycle": self.busy_total / elapsed if elapsed > 0 else 0.0,
+            "cpu_budget": self.cpu_budget,
+            "mean_busy_sec": self.busy_total / self.checks if self.checks else 0.0,
+            "mean_interval_sec": self.interval.mean,
+            "reaction": {label: h.to_dict() for label, h in self.reaction.items()},
+        }
+
+    def report(self):
+        """反応時間の分布を表示"""
+        stats = self.stats()
+        print(f"[Detection] Schedule: {stats['checks']} checks, duty {stats['duty_cycle']:.0%} "
+              f"(budget {self.cpu_budget:.0%}), mean interval {stats['mean_interval_sec'] * 1000:.0f}ms")
+        for label, histogram in self.reaction.items():
+            print(f"[Detection] Reaction time ({label}): {histogram.summary()}")
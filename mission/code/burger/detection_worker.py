@@ -0,0 +1,522 @@
+"""
+別プロセス検出モジュール
+YOLOによる人検知を専用のワーカープロセスで実行し、再生ループなどとGILを取り合わないようにする
+
+- フレームは共有メモリ上のリングバッファ（SharedFrameRing）でワーカーに渡す（pickleなし）
+- 検出結果は共有メモリ上の結果チャネル（ResultChannel）で受け取る（ロックなし）
+- 監視スレッドがワーカーの終了・応答停止を検知して再起動する
+
+使い方:
+    from detection_worker import detect_person
+    detect_person()   # detection.detect_person と同じく、人が検出されたかどうかを返す
+
+共有メモリ上の値はすべて8バイト境界に揃えた int64 / float64 で、書き込み側は1プロセスだけである
+フレームの各面は通し番号によるシーケンスロックで保護し、読み取り中に上書きされた面の結果は捨てる
+"""
+
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from frame_grabber import get_grabber
+from histogram import Histogram
+from motion_gate import MotionGate
+from preprocess import DEFAULT_ROI, RoiPreprocessor
+
+# 結果チャネルのヘッダ（int64）
+_RESULT_COUNT = 0      # 書き込んだ結果の総数
+_HEARTBEAT_NS = 1      # ワーカーの最終応答時刻（time.monotonic_ns）
+_READY = 2             # モデルのロードが完了したら1
+_STOP = 3              # 親プロセスが停止を要求したら1
+_RESULT_HEADER = 8
+
+# 結果レコードの列（float64）
+_REC_FRAME_SEQ = 0
+_REC_FRAME_TS = 1
+_REC_DETECTED = 2
+_REC_INFERENCE_SEC = 3
+_REC_GATED = 4
+_RECORD_WIDTH = 5
+
+
+class SharedFrameRing:
+    """共有メモリ上の固定サイズのフレームリングバッファ（書き込みは1プロセス）"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, shape: Tuple[int, ...], slots: int, owner: bool):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = owner
+
+        frame_bytes = int(np.prod(self.shape))
+        offset = 0
+        # [最新の通し番号]
+        self._latest = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 8
+        # 面ごとの通し番号（0は書き込み中）と取得時刻
+        self._seqs = np.ndarray((slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += 8 * slots
+        self._timestamps = np.ndarray((slots,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += 8 * slots
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+        assert offset + slots * frame_bytes <= shm.size
+
+    @staticmethod
+    def required_size(shape: Tuple[int, ...], slots: int) -> int:
+        return 8 + 16 * slots + slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, shape: Tuple[int, ...], slots: int = 4) -> "SharedFrameRing":
+        shm = shared_memory.SharedMemory(create=True, size=cls.required_size(shape, slots))
+        ring = cls(shm, shape, slots, owner=True)
+        ring._latest[0] = 0
+        ring._seqs[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name: str, shape: Tuple[int, ...], slots: int) -> "SharedFrameRing":
+        return cls(shared_memory.SharedMemory(name=name), shape, slots, owner=False)
+
+    @property
+    def latest_seq(self) -> int:
+        return int(self._latest[0])
+
+    def write(self, image: np.ndarray, seq: int, timestamp: float) -> bool:
+        """フレームを次の面に書き込む（形状が異なる場合は書き込まない）"""
+        if image.shape != self.shape:
+            return False
+        slot = seq % self.slots
+        self._seqs[slot] = 0
+        np.copyto(self._frames[slot], image)
+        self._timestamps[slot] = timestamp
+        self._seqs[slot] = seq
+        self._latest[0] = seq
+        return True
+
+    def read(self, seq: int) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        通し番号 `seq` のフレームをコピーせずに取得
+
+        戻り値の配列は共有メモリのビューなので、使い終わった後に
+        is_valid(seq) で上書きされていないことを確認すること
+        """
+        slot = seq % self.slots
+        if self._seqs[slot] != seq:
+            return None
+        return self._frames[slot], float(self._timestamps[slot])
+
+    def is_valid(self, seq: int) -> bool:
+        return self._seqs[seq % self.slots] == seq
+
+    def close(self):
+        # ビューを手放してから閉じる
+        self._latest = self._seqs = self._timestamps = self._frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class ResultChannel:
+    """共有メモリ上の検出結果のリング（書き込みはワーカー、読み取りは親プロセス）"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, capacity: int, owner: bool):
+        self.shm = shm
+        self.capacity = capacity
+        self.owner = owner
+        self.header = np.ndarray((_RESULT_HEADER,), dtype=np.int64, buffer=shm.buf, offset=0)
+        self._records = np.ndarray((capacity, _RECORD_WIDTH), dtype=np.float64,
+                                   buffer=shm.buf, offset=8 * _RESULT_HEADER)
+
+    @classmethod
+    def create(cls, capacity: int = 64) -> "ResultChannel":
+        size = 8 * _RESULT_HEADER + 8 * _RECORD_WIDTH * capacity
+        channel = cls(shared_memory.SharedMemory(create=True, size=size), capacity, owner=True)
+        channel.header[:] = 0
+        return channel
+
+    @classmethod
+    def attach(cls, name: str, capacity: int) -> "ResultChannel":
+        return cls(shared_memory.SharedMemory(name=name), capacity, owner=False)
+
+    @property
+    def count(self) -> int:
+        return int(self.header[_RESULT_COUNT])
+
+    def publish(self, frame_seq: int, frame_ts: float, detected: bool,
+                inference_sec: float, gated: bool):
+        """結果を書き込んでから総数を増やす（読み取り側は総数までしか読まない）"""
+        count = self.count
+        record = self._records[count % self.capacity]
+        record[_REC_FRAME_SEQ] = frame_seq
+        record[_REC_FRAME_TS] = frame_ts
+        record[_REC_DETECTED] = 1.0 if detected else 0.0
+        record[_REC_INFERENCE_SEC] = inference_sec
+        record[_REC_GATED] = 1.0 if gated else 0.0
+        self.header[_RESULT_COUNT] = count + 1
+
+    def read_since(self, cursor: int) -> Tuple[np.ndarray, int]:
+        """
+        `cursor` 番目以降の結果を取得
+
+        Returns:
+            Tuple[np.ndarray, int]: (結果レコードの配列, 次回のカーソル)
+        """
+        count = self.count
+        start = max(cursor, count - self.capacity)
+        if start >= count:
+            return self._records[:0].copy(), count
+        index = np.arange(start, count) % self.capacity
+        records = self._records[index]
+        # 読み取り中に上書きされた可能性のある古いレコードは捨てる
+        overwritten = self.count - self.capacity - start
+        if overwritten > 0:
+            records = records[overwritten:]
+        return records, count
+
+    def close(self):
+        self.header = self._records = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(frame_name: str, shape: Tuple[int, ...], slots: int, result_name: str,
+                 capacity: int, model_name: str, motion_gate: bool):
+    """ワーカープロセス本体：最新フレームを取り出して推論し、結果を書き込む"""
+    # ultralytics はワーカー側でだけインポートする
+    import detection
+
+    # 前処理と動きゲートはワーカー専用に持つ（detection のモジュール内の状態は共有しない）
+    preprocessor = RoiPreprocessor(DEFAULT_ROI)
+    gate = MotionGate()
+    ring = SharedFrameRing.attach(frame_name, shape, slots)
+    channel = ResultChannel.attach(result_name, capacity)
+    try:
+        detection._load_model(model_name, frame_shape=shape)
+        channel.header[_HEARTBEAT_NS] = time.monotonic_ns()
+        channel.header[_READY] = 1
+
+        last_seq = ring.latest_seq
+        while not channel.header[_STOP]:
+            channel.header[_HEARTBEAT_NS] = time.monotonic_ns()
+            seq = ring.latest_seq
+            if seq == last_seq:
+                time.sleep(0.002)
+                continue
+            last_seq = seq
+
+            frame = ring.read(seq)
+            if frame is None:
+                continue
+            image, frame_ts = frame
+
+            # 切り取り領域に動きがなければ推論しない
+            if motion_gate and not gate.should_run(preprocessor.sensor_roi(image)):
+                if ring.is_valid(seq):
+                    channel.publish(seq, frame_ts, False, 0.0, gated=True)
+                continue
+
+            crop = preprocessor.process(image)
+            if not ring.is_valid(seq):
+                # 切り取り中に上書きされた
+                continue
+
+            t0 = time.perf_counter()
+            detected = detection.detect_person_in_crops([crop])
+            inference_sec = time.perf_counter() - t0
+            gate.record_inference(inference_sec)
+            channel.publish(seq, frame_ts, detected, inference_sec, gated=False)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detection.get_snapshot_sink().close()
+        ring.close()
+        channel.close()
+
+
+class DetectionWorker:
+    """検出ワーカープロセスの起動・フレーム供給・監視・結果の受け取り"""
+
+    def __init__(self, camera_index: int = 4, model_name: str = "yolov8s.pt", slots: int = 4,
+                 capacity: int = 64, motion_gate: bool = True,
+                 startup_timeout: float = 60.0, hang_timeout: float = 5.0, restart_delay: float = 1.0):
+        """
+        Args:
+            camera_index: カメラのインデックス
+            model_name: YOLOモデル名
+            slots: フレームリングの面数
+            capacity: 結果チャネルに保持する結果の数
+            motion_gate: Trueの場合、動きのないフレームではYOLOを実行しない
+            startup_timeout: モデルのロード完了を待つ上限（秒）。超えたら再起動
+            hang_timeout: ワーカーの応答がこの秒数途絶えたら再起動
+            restart_delay: 再起動前に待つ時間（秒）
+        """
+        self.camera_index = camera_index
+        self.model_name = model_name
+        self.slots = slots
+        self.capacity = capacity
+        self.motion_gate = motion_gate
+        self.startup_timeout = startup_timeout
+        self.hang_timeout = hang_timeout
+        self.restart_delay = restart_delay
+
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Lock()
+        self._running = False
+        self._process = None
+        self._started_at = None
+        self._ring: Optional[SharedFrameRing] = None
+        self._channel: Optional[ResultChannel] = None
+        self._cursor = 0
+        self._threads = []
+
+        # 統計情報
+        self.restarts = 0
+        self.frames_sent = 0
+        self.results = 0
+        self.detections = 0
+        self.latency = Histogram()
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    @property
+    def is_ready(self) -> bool:
+        return (self._channel is not None and bool(self._channel.header[_READY])
+                and self._process is not None and self._process.is_alive())
+
+    def start(self) -> bool:
+        """カメラ・共有メモリ・ワーカープロセスを準備"""
+        with self._lock:
+            if self._running:
+                return True
+            grabber = get_grabber(self.camera_index)
+            if grabber is None:
+                return False
+            first = grabber.wait_newer(0, timeout=2.0)
+            if first is None:
+                print(f"[DetectionWorker] No frame from camera {self.camera_index}")
+                return False
+
+            self._ring = SharedFrameRing.create(first.image.shape, self.slots)
+            self._channel = ResultChannel.create(self.capacity)
+            self._cursor = 0
+            self._running = True
+            self._spawn()
+
+            self._threads = [
+                threading.Thread(target=self._feed_loop, args=(grabber,), daemon=True),
+                threading.Thread(target=self._supervise_loop, daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+            return True
+
+    def wait_ready(self, timeout: float = 60.0) -> bool:
+        """ワーカーを起動し、モデルのロードが終わるまで待つ"""
+        if not self.start():
+            return False
+        deadline = time.monotonic() + timeout
+        while not self.is_ready:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _spawn(self):
+        """ワーカープロセスを起動"""
+        self._channel.header[_READY] = 0
+        self._channel.header[_STOP] = 0
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(self._ring.shm.name, self._ring.shape, self.slots, self._channel.shm.name,
+                  self.capacity, self.model_name, self.motion_gate),
+            name="detection-worker",
+            daemon=True,
+        )
+        self._started_at = time.monotonic()
+        self._process.start()
+        print(f"[DetectionWorker] Started worker pid={self._process.pid}")
+
+    def _request_stop(self):
+        """ワーカーに停止を要求し、停止を待つプロセスを返す（ロック保持中に呼ぶ）"""
+        if self._process is not None:
+            self._channel.header[_STOP] = 1
+        return self._process
+
+    @staticmethod
+    def _stop_process(process, timeout: float = 2.0):
+        """
+        ワーカープロセスの終了を待つ（応答しなければ強制終了）
+
+        最大で数秒かかるため、ロックを持たずに呼ぶ
+        """
+        if process is None:
+            return
+        process.join(timeout=timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _feed_loop(self, grabber):
+        """カメラの新しいフレームを共有メモリに書き込み続ける"""
+        last_seq = 0
+        while self._running:
+            grabbed = grabber.wait_newer(last_seq, timeout=0.5)
+            if grabbed is None:
+                continue
+            last_seq = grabbed.seq
+            if self._ring.write(grabbed.image, grabbed.seq, grabbed.timestamp):
+                self.frames_sent += 1
+
+    def _supervise_loop(self):
+        """ワーカーの終了・応答停止を検知して再起動"""
+        while self._running:
+            time.sleep(0.5)
+            # 再起動するかはロックを持って決め、停止・待機はロックを離して行う
+            # （その間も close() がすぐに停止できるように）
+            with self._lock:
+                if not self._running:
+                    break
+                reason = self._check_worker()
+                if reason is None:
+                    continue
+                process = self._request_stop()
+            print(f"[DetectionWorker] Restarting worker: {reason}")
+            self._stop_process(process)
+            time.sleep(self.restart_delay)
+            with self._lock:
+                if not self._running:
+                    break
+                self.restarts += 1
+                self._spawn()
+
+    def _check_worker(self) -> Optional[str]:
+        """ワーカーに問題があればその理由を返す"""
+        if not self._process.is_alive():
+            return f"exited with code {self._process.exitcode}"
+        now = time.monotonic()
+        if not self._channel.header[_READY]:
+            if now - self._started_at > self.startup_timeout:
+                return f"not ready after {self.startup_timeout:.0f}s"
+            return None
+        heartbeat_age = (time.monotonic_ns() - int(self._channel.header[_HEARTBEAT_NS])) / 1e9
+        if heartbeat_age > self.hang_timeout:
+            return f"no heartbeat for {heartbeat_age:.1f}s"
+        return None
+
+    def begin_session(self):
+        """
+        検出を再開する前に呼び、それまでに届いていた結果を読み飛ばす
+
+        誰も結果を読まない間（scenario 2・3 の間）もワーカーは推論を続けるため、
+        そのまま読むと見張りに戻る前のフレームの結果で判定し、遅延の統計も古い結果で歪む
+        """
+        if self._channel is not None:
+            self._cursor = self._channel.count
+
+    def poll(self) -> np.ndarray:
+        """前回以降に届いた結果レコードを取得（待機しない）"""
+        records, self._cursor = self._channel.read_since(self._cursor)
+        if len(records):
+            now = time.monotonic()
+            self.results += len(records)
+            self.detections += int(records[:, _REC_DETECTED].sum())
+            for frame_ts in records[:, _REC_FRAME_TS]:
+                self.latency.observe(now - float(frame_ts))
+        return records
+
+    def detect_person(self, timeout: float = 1.0) -> bool:
+        """
+        前回以降の新しいフレームで人が検出されたか（新しい結果が届くまで最大 timeout 秒待つ）
+
+        Returns:
+            bool: 人が検出されたかどうか（ワーカー停止中・タイムアウト時はFalse）
+        """
+        if not self._running and not self.start():
+            return False
+
+        deadline = time.monotonic() + timeout
+        records = self.poll()
+        while not len(records) and time.monotonic() < deadline:
+            time.sleep(0.005)
+            records = self.poll()
+        return bool(len(records)) and bool(records[:, _REC_DETECTED].any())
+
+    def stats(self) -> dict:
+        """ワーカーの状態と結果の遅延などを返す"""
+        return {
+            "alive": self._process is not None and self._process.is_alive(),
+            "ready": self.is_ready,
+            "restarts": self.restarts,
+            "frames_sent": self.frames_sent,
+            "results": self.results,
+            "detections": self.detections,
+            "latency": self.latency.to_dict(),
+        }
+
+    def close(self):
+        """ワーカープロセスを停止して共有メモリを解放"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            process = self._request_stop()
+        self._stop_process(process)
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+        self._ring.close()
+        self._channel.close()
+        self._ring = self._channel = None
+
+
+# 共有のワーカー（初回の検出時に起動）
+_worker: Optional[DetectionWorker] = None
+
+
+def get_detection_worker(camera_index: int = 4) -> DetectionWorker:
+    """共有の検出ワーカーを取得"""
+    global _worker
+    if _worker is None or _worker.camera_index != camera_index:
+        if _worker is not None:
+            _worker.close()
+        _worker = DetectionWorker(camera_index)
+    return _worker
+
+
+def detect_person(camera_index: int = 4) -> bool:
+    """detection.detect_person の代わりに使える、ワーカープロセスでの人検知"""
+    return get_detection_worker(camera_index).detect_person()
+
+
+def begin_detection_session():
+    """共有の検出ワーカーが溜めていた結果を読み飛ばす（起動していなければ何もしない）"""
+    if _worker is not None:
+        _worker.begin_session()
+
+
+def get_worker_stats() -> dict:
+    """共有の検出ワーカーの統計情報を取得"""
+    return _worker.stats() if _worker is not None else {}
+
+
+def get_worker_latency() -> Histogram:
+    """フレーム取得から結果を受け取るまでの時間のヒストグラム"""
+    return _worker.latency if _worker is not None else Histogram()
+
+
+def close_detection_worker():
+    """共有の検出ワーカーを停止"""
+    global _worker
+    if _worker is not None:
+        _worker.close()
+        _worker = None
@@ -0,0 +1,375 @@
+"""
+検出器バックエンドモジュール
+YOLOモデルを ONNX Runtime / OpenVINO 向けにエクスポートしてディスクにキャッシュし、
+CPUで最も速いバックエンドを使う
+
+バックエンド:
+    torch          : ultralytics の PyTorch 実行（従来どおり）
+    onnx           : ONNX Runtime（FP32）
+    openvino       : OpenVINO（FP32）
+    openvino_int8  : OpenVINO（キャリブレーションデータでINT8量子化）
+
+どのバックエンドも ultralytics の Results を返すため、人・大きさ・信頼度の判定は person_filter で共通
+エクスポートしたモデルは入力の形状（バッチサイズ1）が固定なので、複数枚を渡された場合は
+1枚ずつ推論して結果を並べる（detection のバッチ推論と同じ呼び出し方で使える）
+エクスポート結果は CACHE_DIR/<モデル名>_<入力サイズ>_<バックエンド名> に保存する
+
+エクスポート（INT8 のキャリブレーションデータのダウンロードを含む）と選択は、起動時ではなく
+次のコマンドで前もって行う。記録したフレームで速度と PyTorch との判定一致率を比べ、
+一致率が基準以上のうち最も速いバックエンドを CACHE_DIR/selection.json に記録する
+    python detector_backends.py --images frames/ --imgsz 448 --select
+
+起動時はエクスポートも計測もせず、記録済みの選択（またはエクスポート済みのファイル）だけをロードし、
+なければ PyTorch で実行する
+
+環境変数:
+    BURGER_DETECTOR_BACKEND : auto（既定。記録済みの選択）またはバックエンド名
+    BURGER_DETECTOR_IMGSZ   : 推論時の入力サイズ（指定すると呼び出し側の指定より優先。既定640）
+"""
+
+import glob
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from histogram import Histogram
+from person_filter import DetectionConfig, box_rows, predict_kwargs, select_person_boxes
+
+CACHE_DIR = os.path.expanduser("~/.cache/burger/detectors")
+SELECTION_PATH = os.path.join(CACHE_DIR, "selection.json")
+DEFAULT_IMGSZ = 640
+# 選択の対象にする PyTorch との判定一致率の下限
+MIN_AGREEMENT = 0.99
+# 比較時にバッチ推論（複数枚をまとめて渡す呼び出し）を確かめるときの枚数
+COMPARE_BATCH_SIZE = 4
+
+
+@dataclass(frozen=True)
+class BackendSpec:
+    """バックエンドの種類"""
+    name: str
+    export_format: Optional[str]   # ultralytics の export(format=...)（Noneは PyTorch のまま）
+    int8: bool = False
+    requires: Optional[str] = None  # 実行に必要なモジュール
+
+
+BACKENDS: Dict[str, BackendSpec] = {
+    "torch": BackendSpec("torch", None),
+    "onnx": BackendSpec("onnx", "onnx", requires="onnxruntime"),
+    "openvino": BackendSpec("openvino", "openvino", requires="openvino"),
+    "openvino_int8": BackendSpec("openvino_int8", "openvino", int8=True, requires="openvino"),
+}
+
+
+def available_backends() -> List[str]:
+    """この環境で実行できるバックエンド名"""
+    return [name for name, spec in BACKENDS.items()
+            if spec.requires is None or importlib.util.find_spec(spec.requires) is not None]
+
+
+def _cache_path(model_name: str, spec: BackendSpec, imgsz: int) -> str:
+    stem = os.path.splitext(os.path.basename(model_name))[0]
+    # ultralytics はパスの末尾で形式を判別する
+    suffix = ".onnx" if spec.export_format == "onnx" else "_openvino_model"
+    return os.path.join(CACHE_DIR, f"{stem}_{imgsz}_{spec.name}{suffix}")
+
+
+def export_model(model_name: str, backend: str, imgsz: int = DEFAULT_IMGSZ,
+                 calibration_data: str = "coco8.yaml", refresh: bool = False) -> str:
+    """
+    モデルをエクスポートしてキャッシュ（キャッシュ済みならそのパスを返す）
+
+    Args:
+        model_name: PyTorch の重み（例: yolov8s.pt）
+        backend: バックエンド名
+        imgsz: 入力サイズ（エクスポート後は固定。バッチサイズも1に固定される）
+        calibration_data: OpenVINO の INT8 量子化に使うデータセット定義
+        refresh: Trueの場合はキャッシュを無視してエクスポートし直す
+
+    Returns:
+        str: ultralytics.YOLO でロードできるパス
+    """
+    spec = BACKENDS[backend]
+    if spec.export_format is None:
+        return model_name
+
+    target = _cache_path(model_name, spec, imgsz)
+    if os.path.exists(target) and not refresh:
+        return target
+
+    from ultralytics import YOLO
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    t0 = time.perf_counter()
+    if spec.export_format == "openvino":
+        exported = YOLO(model_name).export(format="openvino", imgsz=imgsz, int8=spec.int8,
+                                           data=calibration_data if spec.int8 else None)
+    else:
+        exported = YOLO(model_name).export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True)
+
+    if os.path.exists(target):
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        else:
+            os.remove(target)
+    shutil.move(str(exported), target)
+    print(f"[Detector] Exported {model_name} -> {backend} ({imgsz}px) in {time.perf_counter() - t0:.1f}s")
+    return target
+
+
+def is_exported(model_name: str, backend: str, imgsz: int) -> bool:
+    """エクスポート済み（PyTorch はエクスポート不要）か"""
+    spec = BACKENDS[backend]
+    return spec.export_format is None or os.path.exists(_cache_path(model_name, spec, imgsz))
+
+
+class DetectorBackend:
+    """ultralytics.YOLO と同じ呼び出し方で、固定の入力サイズで推論する"""
+
+    def __init__(self, model_name: str, backend: str = "torch", imgsz: int = DEFAULT_IMGSZ,
+                 export: bool = True):
+        """
+        Args:
+            export: Falseの場合はエクスポートせず、エクスポート済みでなければ FileNotFoundError
+        """
+        from ultralytics import YOLO
+
+        if not export and not is_exported(model_name, backend, imgsz):
+            raise FileNotFoundError(f"{backend} export of {model_name} ({imgsz}px) not found in {CACHE_DIR}")
+        self.model_name = model_name
+        self.backend = backend
+        self.imgsz = imgsz
+        self.path = export_model(model_name, backend, imgsz)
+        self.model = YOLO(self.path, task="detect")
+
+    @property
+    def batchable(self) -> bool:
+        """複数枚を1回の推論で処理できるか（エクスポートしたモデルはバッチサイズ1で固定）"""
+        return BACKENDS[self.backend].export_format is None
+
+    def __call__(self, images, verbose: bool = False, **kwargs):
+        if isinstance(images, (list, tuple)) and len(images) > 1 and not self.batchable:
+            results = []
+            for image in images:
+                results.extend(self.model(image, imgsz=self.imgsz, verbose=verbose, **kwargs))
+            return results
+        return self.model(images, imgsz=self.imgsz, verbose=verbose, **kwargs)
+
+    def __repr__(self):
+        return f"DetectorBackend({self.backend}, {self.imgsz}px, {self.path})"
+
+
+def _selection_key(model_name: str, imgsz: int) -> str:
+    return f"{os.path.basename(model_name)}@{imgsz}/{platform.machine()}/{platform.processor() or 'cpu'}"
+
+
+def _read_selection() -> dict:
+    try:
+        with open(SELECTION_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_selection(selection: dict):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{SELECTION_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(selection, f, indent=2)
+        os.replace(tmp_path, SELECTION_PATH)
+    except OSError as e:
+        print(f"[Detector] Could not save backend selection: {e}")
+
+
+def stored_choice(model_name: str, imgsz: int) -> Optional[str]:
+    """--select で記録したバックエンド名（この環境・モデル・入力サイズの記録がなければNone）"""
+    return _read_selection().get(_selection_key(model_name, imgsz), {}).get("backend")
+
+
+def load_detector(model_name: str = "yolov8s.pt", backend: Optional[str] = None,
+                  imgsz: Optional[int] = None) -> DetectorBackend:
+    """
+    検出器をロード（エクスポート・計測は行わない）
+
+    記録済みの選択・指定したバックエンドがエクスポートされていない、またはロードに失敗した場合は
+    PyTorch で実行する
+
+    Args:
+        backend: バックエンド名または "auto"（Noneの場合は BURGER_DETECTOR_BACKEND、既定 auto）
+        imgsz: 入力サイズ（BURGER_DETECTOR_IMGSZ があればそちらを優先。どちらもなければ640）
+    """
+    backend = backend or os.environ.get("BURGER_DETECTOR_BACKEND", "auto")
+    if os.environ.get("BURGER_DETECTOR_IMGSZ"):
+        imgsz = int(os.environ["BURGER_DETECTOR_IMGSZ"])
+    imgsz = imgsz or DEFAULT_IMGSZ
+    if backend == "auto":
+        backend = stored_choice(model_name, imgsz) or "torch"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend}")
+
+    if backend != "torch":
+        try:
+            return DetectorBackend(model_name, backend, imgsz, export=False)
+        except Exception as e:
+            print(f"[Detector] {backend} unavailable, using torch "
+                  f"(run `python detector_backends.py --images <frames> --imgsz {imgsz} --select`): {e}")
+    return DetectorBackend(model_name, "torch", imgsz)
+
+
+def _load_images(source: str, limit: int) -> List[np.ndarray]:
+    """画像ディレクトリ・glob・動画ファイルから検出用に前処理した画像を読む"""
+    import cv2
+    from preprocess import DEFAULT_ROI, RoiPreprocessor
+
+    preprocessor = RoiPreprocessor(DEFAULT_ROI)
+    frames = []
+    if os.path.isdir(source) or any(c in source for c in "*?["):
+        pattern = os.path.join(source, "*") if os.path.isdir(source) else source
+        for path in sorted(glob.glob(pattern))[:limit]:
+            image = cv2.imread(path)
+            if image is not None:
+                frames.append(image)
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < limit:
+            ret, image = cap.read()
+            if not ret:
+                break
+            frames.append(image)
+        cap.release()
+    return [preprocessor.process(frame).copy() for frame in frames]
+
+
+def _decisions(detector: DetectorBackend, images: Sequence[np.ndarray], config: DetectionConfig):
+    """各画像の判定（人がいるか）と1枚ずつ推論したときの推論時間"""
+    decisions, latency = [], Histogram()
+    detector(images[0], **predict_kwargs(config))  # ウォームアップ
+    for image in images:
+        t0 = time.perf_counter()
+        result = detector(image, **predict_kwargs(config))[0]
+        latency.observe(time.perf_counter() - t0)
+        crop_sizes = np.array([(image.shape[1], image.shape[0])], dtype=np.float32)
+        decisions.append(bool(len(select_person_boxes(box_rows(result), crop_sizes, config))))
+    return np.array(decisions), latency
+
+
+def _batch_decisions(detector: DetectorBackend, images: Sequence[np.ndarray], config: DetectionConfig,
+                     batch_size: int = COMPARE_BATCH_SIZE) -> np.ndarray:
+    """detection のバッチ推論と同じく、batch_size 枚ずつまとめて渡したときの各画像の判定"""
+    decisions = []
+    for start in range(0, len(images), batch_size):
+        batch = list(images[start:start + batch_size])
+        results = detector(batch, **predict_kwargs(config))
+        if len(results) != len(batch):
+            raise RuntimeError(f"batch of {len(batch)} returned {len(results)} results")
+        crop_sizes = np.array([(image.shape[1], image.shape[0]) for image in batch], dtype=np.float32)
+        persons = select_person_boxes(
+            np.concatenate([box_rows(result, i) for i, result in enumerate(results)]), crop_sizes, config)
+        frames = set(persons[:, 6].astype(int).tolist())
+        decisions.extend(i in frames for i in range(len(batch)))
+    return np.array(decisions)
+
+
+def comparison_report(images: Sequence[np.ndarray], model_name: str = "yolov8s.pt",
+                      imgsz: int = DEFAULT_IMGSZ, backends: Optional[Sequence[str]] = None,
+                      batch_size: int = COMPARE_BATCH_SIZE) -> dict:
+    """
+    各バックエンドの推論時間と、PyTorch 実行との判定一致率を比較
+
+    1枚ずつの推論に加えて batch_size 枚ずつまとめた推論でも判定を比べ、
+    バッチ推論に失敗したバックエンドはエラーとして記録する（選択の対象にしない）
+
+    Returns:
+        dict: バックエンド名 → {mean_ms, p50_ms, p99_ms, agreement, batch_agreement, person_frames}
+    """
+    config = DetectionConfig.from_env()
+    reference, _ = _decisions(DetectorBackend(model_name, "torch", imgsz), images, config)
+    report = {}
+    for backend in backends or available_backends():
+        try:
+            detector = DetectorBackend(model_name, backend, imgsz)
+            decisions, latency = _decisions(detector, images, config)
+            batch_decisions = _batch_decisions(detector, images, config, batch_size)
+        except Exception as e:
+            report[backend] = {"error": str(e)}
+            print(f"[Detector] {backend:14s} failed: {e}")
+            continue
+        report[backend] = {
+            "mean_ms": latency.mean * 1000,
+            "p50_ms": latency.percentile(50) * 1000,
+            "p99_ms": latency.percentile(99) * 1000,
+            "agreement": float(np.mean(decisions == reference)),
+            "batch_agreement": float(np.mean(batch_decisions == reference)),
+            "person_frames": int(decisions.sum()),
+        }
+        r = report[backend]
+        print(f"[Detector] {backend:14s} mean={r['mean_ms']:7.1f}ms p99={r['p99_ms']:7.1f}ms "
+              f"agreement={r['agreement']:.1%} batch={r['batch_agreement']:.1%} "
+              f"persons={r['person_frames']}/{len(images)}")
+    return report
+
+
+def select_backend(report: dict, model_name: str, imgsz: int,
+                   min_agreement: float = MIN_AGREEMENT) -> Optional[str]:
+    """
+    比較レポートから、1枚ずつ・バッチ推論ともに一致率が min_agreement 以上で最も速いバックエンドを選んで記録
+
+    Returns:
+        Optional[str]: 選んだバックエンド名（条件を満たすものがなければ記録せずNone）
+    """
+    eligible = {name: r for name, r in report.items()
+                if "error" not in r and r["agreement"] >= min_agreement
+                and r.get("batch_agreement", 0.0) >= min_agreement}
+    if not eligible:
+        print(f"[Detector] No backend reached {min_agreement:.1%} agreement; selection not saved")
+        return None
+    best = min(eligible, key=lambda name: eligible[name]["mean_ms"])
+    selection = _read_selection()
+    selection[_selection_key(model_name, imgsz)] = {
+        "backend": best,
+        "timings_ms": {name: r["mean_ms"] for name, r in eligible.items()},
+        "agreement": {name: r["agreement"] for name, r in eligible.items()},
+        "measured_at": time.time(),
+    }
+    _write_selection(selection)
+    print(f"[Detector] Selected {best} ({eligible[best]['mean_ms']:.1f} ms/frame, "
+          f"agreement {eligible[best]['agreement']:.1%}) for {model_name} @ {imgsz}px")
+    return best
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare detector backends against PyTorch")
+    parser.add_argument("--images", required=True, help="image directory, glob or video file")
+    parser.add_argument("--model", default="yolov8s.pt")
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument("--limit", type=int, default=200, help="maximum number of frames")
+    parser.add_argument("--backends", help="comma-separated backends (default: all available)")
+    parser.add_argument("--output", default="detector_report.json")
+    parser.add_argument("--select", action="store_true",
+                        help="record the fastest backend with enough agreement for startup")
+    parser.add_argument("--min-agreement", type=float, default=MIN_AGREEMENT)
+    parser.add_argument("--batch-size", type=int, default=COMPARE_BATCH_SIZE,
+                        help="frames per call when checking the batched path")
+    args = parser.parse_args()
+
+    images = _load_images(args.images, args.limit)
+    if not images:
+        raise SystemExit(f"No frames found in {args.images}")
+    report = comparison_report(images, args.model, args.imgsz,
+                               args.backends.split(",") if args.backends else None, args.batch_size)
+    with open(args.output, "w") as f:
+        json.dump({"model": args.model, "imgsz": args.imgsz, "frames": len(images), "backends": report},
+                  f, indent=2)
+    print(f"[Detector] Report written to {args.output}")
+    if args.select:
+        select_backend(report, args.model, args.imgsz, args.min_agreement)
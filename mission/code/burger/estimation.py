@@ -6,62 +6,169 @@ Provides `execute_watching` and `execute_smoking` which invoke an external
 These functions are intentionally small wrappers around subprocess so the
 caller (the state machine in `main.py`) can run blocking actions without
 duplicating process-management logic.
+
+When `warm_policies()` has been called (the controller does this at startup),
+the policies are kept loaded in-process by `policy_runner.PolicyRunner` and
+the actions run the observation->action loop directly instead of spawning
+`lerobot-record`. Policies that fail to load fall back to the subprocess.
+
+By default (`BURGER_POLICY_MODE=inference`) the policy runs without any
+dataset writer or video encoder: a policy that was not warmed up is loaded
+on demand, and `lerobot-record` is only used when loading fails. Set
+`BURGER_POLICY_MODE=record` to always run through `lerobot-record` and keep
+the evaluation dataset. Sampled debug recording is configured separately
+through `ring_recorder` (`BURGER_POLICY_RECORD_EVERY`).
 """
 
-from typing import Sequence
+from typing import Optional, Sequence
 import subprocess
 import time
 import logging
-import threading
 import os
 import shutil
 from datetime import datetime
 from return_home import return_watching_home, return_working_home
+from arm_session import LEFT_ARM, RIGHT_ARM, get_arm_pool
+from policy_runner import PolicyRunner, PolicySpec
+from cancellation import CancelToken
+from metrics import observe, timed
+from hardware import is_sim, policy_command
+import clock
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# グローバルキャンセルフラグと保護用ロック
-_action_cancel_flag = False
-_cancel_lock = threading.Lock()
+def _camera_configs() -> dict:
+    """ポリシー入力用カメラ（lerobot-record の --robot.cameras と同じ設定）"""
+    from lerobot.cameras.opencv.configuration_opencv import OpenCVCameraConfig
+
+    return {
+        "top": OpenCVCameraConfig(index_or_path=6, width=640, height=480, fps=30),
+        "front": OpenCVCameraConfig(index_or_path=8, width=640, height=480, fps=30),
+    }
+
+
+def _make_working_robot():
+    """working用の双腕ロボットを生成"""
+    from lerobot.robots.bi_so100_follower import BiSO100Follower, BiSO100FollowerConfig
+
+    config = BiSO100FollowerConfig(
+        left_arm_port="/dev/ttyACM2",
+        right_arm_port="/dev/ttyACM0",
+        id="bimanual_follower",
+        cameras=_camera_configs(),
+    )
+    return BiSO100Follower(config)
+
+
+def _make_smoking_robot():
+    """smoking用の右手ロボットを生成"""
+    from lerobot.robots.so101_follower import SO101Follower, SO101FollowerConfig
+
+    config = SO101FollowerConfig(
+        port=RIGHT_ARM.port,
+        id=RIGHT_ARM.id,
+        cameras=_camera_configs(),
+    )
+    return SO101Follower(config)
+
+
+# inference: データセットを書かずにポリシーだけを実行 / record: lerobot-record で評価データセットを記録
+POLICY_MODES = ("inference", "record")
+POLICY_MODE = os.environ.get("BURGER_POLICY_MODE", "inference").strip().lower()
+if POLICY_MODE not in POLICY_MODES:
+    raise ValueError(f"BURGER_POLICY_MODE must be one of {', '.join(POLICY_MODES)}, got {POLICY_MODE!r}")
+
+WORKING_POLICY = PolicySpec("working", "Mozgi512/act_burger_final_8000", "Burger", _make_working_robot)
+SMOKING_POLICY = PolicySpec("smoking", "Mozgi512/act_smoking_ckpt_1", "Smoking", _make_smoking_robot)
+
+# 右手はカメラ付きのロボットとしてプールに接続したまま保持し、smoking の実行ごとに開き直さない
+# （シミュレーション時は偽アームのまま）
+get_arm_pool().register(RIGHT_ARM, None if is_sim() else _make_smoking_robot)
 
+# 常駐中のポリシー（名前 → PolicyRunner）。warm_policies() で登録される
+_policy_runners = {}
+# ロードに失敗したポリシー名（実行のたびにロードを再試行しない）
+_failed_policies = set()
 
-def set_action_cancel():
-    """動作をキャンセルするフラグをセット"""
-    global _action_cancel_flag
-    with _cancel_lock:
-        _action_cancel_flag = True
-        logger.info("Action cancel flag set")
 
+def warm_policies(specs: Sequence[PolicySpec] = (WORKING_POLICY, SMOKING_POLICY)) -> None:
+    """ポリシーをロードして常駐させる
+
+    ロードに失敗したポリシーは登録せず、従来どおり lerobot-record で実行する
+    シミュレーション時はロードせず、代替コマンドで実行する
+    """
+    if is_sim():
+        logger.info("Simulation backend: skipping policy warm-up")
+        return
+    for spec in specs:
+        if spec.name in _policy_runners or spec.name in _failed_policies:
+            continue
+        runner = PolicyRunner(spec)
+        try:
+            runner.load()
+        except Exception as e:
+            logger.warning("Failed to load policy %s; falling back to lerobot-record: %s", spec.name, e)
+            _failed_policies.add(spec.name)
+            continue
+        _policy_runners[spec.name] = runner
 
-def reset_action_cancel():
-    """キャンセルフラグをリセット"""
-    global _action_cancel_flag
-    with _cancel_lock:
-        _action_cancel_flag = False
 
+def _warm_runner(spec: PolicySpec) -> Optional[PolicyRunner]:
+    """プロセス内で実行できる常駐ポリシーを取得
+
+    inference モードでは、未ロードのポリシーをここでロードする
+
+    Returns:
+        Optional[PolicyRunner]: 未ロード・ロード失敗・record モードの場合はNone
+    """
+    if POLICY_MODE == "record":
+        return None
+    if spec.name not in _policy_runners:
+        warm_policies([spec])
+    return _policy_runners.get(spec.name)
 
-def is_action_cancelled():
-    """キャンセルフラグがセットされているかチェック"""
-    global _action_cancel_flag
-    with _cancel_lock:
-        return _action_cancel_flag
 
+def _run_policy_for_seconds(runner: PolicyRunner, seconds: int, cancel: CancelToken, robot=None) -> None:
+    """常駐ポリシーをプロセス内で実行する（robot がNoneの場合は実行ごとに生成して接続する）"""
+    logger.info("Running warm policy %s for %d seconds", runner.spec.name, seconds)
+    runner.run(seconds, cancel, robot=robot)
 
-def _run_command_for_seconds(cmd: Sequence[str], seconds: int) -> int:
+
+def _clear_dataset_cache(cache_dir: str) -> None:
+    """lerobot-record の記録先（同じ repo_id の前回分）が存在する場合は削除"""
+    if os.path.exists(cache_dir):
+        logger.info("Removing existing cache directory: %s", cache_dir)
+        try:
+            shutil.rmtree(cache_dir)
+        except Exception as e:
+            logger.error("Failed to remove cache directory: %s", e)
+
+
+def _run_record_for_seconds(cmd: Sequence[str], robot_type: str, cache_dir: str,
+                            seconds: int, cancel: CancelToken) -> int:
+    """lerobot-record（シミュレーション時は代替コマンド）でポリシーを実行"""
+    if POLICY_MODE != "record" and not is_sim():
+        logger.warning("Policy is not loaded in-process; running %s with dataset recording", cmd[0])
+    _clear_dataset_cache(cache_dir)
+    return _run_command_for_seconds(policy_command(cmd, robot_type), seconds, cancel)
+
+
+def _run_command_for_seconds(cmd: Sequence[str], seconds: int, cancel: CancelToken) -> int:
     """Run `cmd` as a subprocess for `seconds`, then terminate it.
 
     The subprocess is started and allowed to run for `seconds` seconds. After
     that sleep the subprocess is terminated (SIGTERM) and, if it doesn't exit
     within a short timeout, it is killed (SIGKILL).
 
-    キャンセルフラグがセットされた場合は即座に終了する。
+    `cancel` がキャンセルされた場合は、待機中でも即座に終了させる。
 
     Returns the process return code (may be None until process terminates).
     """
     logger.info("Running command for %d seconds: %s", seconds, " ".join(cmd))
     # Capture output for error diagnostics, provide stdin to auto-respond to prompts
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE, text=True)
+    with timed("subprocess_spawn"):
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE, text=True)
     
     # キャリブレーションプロンプトに自動的にENTERを送信
     try:
@@ -70,21 +177,26 @@ def _run_command_for_seconds(cmd: Sequence[str], seconds: int) -> int:
     except Exception as e:
         logger.warning("Failed to send ENTER to stdin: %s", e)
     
-    start_time = time.time()
+    # キャンセル時は検出スレッドから直接SIGTERMを送る
+    cancel.add_callback(proc.terminate)
+    
+    start_time = clock.now()
     early_exit = False
     try:
-        while time.time() - start_time < seconds:
-            # キャンセルフラグをチェック
-            if is_action_cancelled():
+        while True:
+            remaining = seconds - (clock.now() - start_time)
+            if remaining <= 0:
+                break
+            # キャンセルされるか、プロセス終了確認の周期まで待機
+            if cancel.wait(min(0.1, remaining)):
                 logger.info("Action cancelled by detection; terminating process")
                 break
             # プロセスが早期終了していないかチェック
             if proc.poll() is not None:
-                elapsed = time.time() - start_time
+                elapsed = clock.now() - start_time
                 logger.warning("Process terminated early after %.2f seconds with code: %s", elapsed, proc.returncode)
                 early_exit = True
                 break
-            time.sleep(0.1)  # 定期的にチェック
     except KeyboardInterrupt:
         logger.info("KeyboardInterrupt received; terminating child process")
     finally:
@@ -110,27 +222,26 @@ def _run_command_for_seconds(cmd: Sequence[str], seconds: int) -> int:
                 pass
             proc.wait()
 
+    observe("subprocess_run", clock.real_seconds(clock.now() - start_time))
+    if cancel.cancelled:
+        # 検出からプロセス終了（最後のアーム指令）までの時間を記録
+        cancel.record_stop()
     logger.info("Process finished with return code: %s", proc.returncode)
     return proc.returncode
 
 
-def execute_working(duration: int = 30) -> None:
+def execute_working(duration: int = 30, cancel: Optional[CancelToken] = None) -> None:
     """Execute the watching CLI for `duration` seconds.
 
     This runs the `lerobot-record` command with parameters used by the burger
     robot policy and waits `duration` seconds before terminating the process.
+    The action stops early when `cancel` is cancelled.
     """
-    reset_action_cancel()
-    
-    # キャッシュディレクトリが存在する場合は削除
+    cancel = cancel or CancelToken("working")
+
+    # record モード・フォールバック時の記録先
     cache_dir = "/home/amddemo/.cache/huggingface/lerobot/Mozgi512/eval_hoge1"
-    if os.path.exists(cache_dir):
-        logger.info("Removing existing cache directory: %s", cache_dir)
-        try:
-            shutil.rmtree(cache_dir)
-        except Exception as e:
-            logger.error("Failed to remove cache directory: %s", e)
-    
+
     cmd = [
         "lerobot-record",
         "--robot.type=bi_so100_follower",
@@ -148,30 +259,31 @@ def execute_working(duration: int = 30) -> None:
     ]
 
     logger.info("Starting watching action (duration=%ds)", duration)
-    _run_command_for_seconds(cmd, duration)
+    runner = _warm_runner(WORKING_POLICY)
+    pool = get_arm_pool()
+    # 双腕ポリシー・lerobot-record は両手のポートを直接開くため、両手のセッションを明け渡す
+    with pool.suspended(LEFT_ARM), pool.suspended(RIGHT_ARM):
+        if runner is not None:
+            _run_policy_for_seconds(runner, duration, cancel)
+        else:
+            _run_record_for_seconds(cmd, "bi_so100_follower", cache_dir, duration, cancel)
     logger.info("Watching action completed")
-    time.sleep(1.0)
+    # 決め打ちの待機ではなく、ホームに収まった時点で次へ進む
     return_working_home()
-    time.sleep(1.0)
 
-def execute_smoking(duration: int = 20) -> None:
+def execute_smoking(duration: int = 20, cancel: Optional[CancelToken] = None) -> None:
     """Execute the smoking action.
 
     Currently this function uses the same command/structure as
     `execute_watching` as a placeholder. Replace the command contents here
-    when the actual smoking CLI is available.
+    when the actual smoking CLI is available. The action stops early when
+    `cancel` is cancelled.
     """
-    reset_action_cancel()
+    cancel = cancel or CancelToken("smoking")
 
-    # キャッシュディレクトリが存在する場合は削除
+    # record モード・フォールバック時の記録先
     cache_dir = "/home/amddemo/.cache/huggingface/lerobot/Mozgi512/eval_smoking_2"
-    if os.path.exists(cache_dir):
-        logger.info("Removing existing cache directory: %s", cache_dir)
-        try:
-            shutil.rmtree(cache_dir)
-        except Exception as e:
-            logger.error("Failed to remove cache directory: %s", e)
-    
+
     cmd = [
         "lerobot-record",
         "--robot.type=so101_follower",
@@ -185,7 +297,14 @@ def execute_smoking(duration: int = 20) -> None:
     ]
 
     logger.info("Starting smoking action (duration=%ds)", duration)
-    _run_command_for_seconds(cmd, duration)
+    runner = _warm_runner(SMOKING_POLICY)
+    if runner is not None:
+        # 右手（カメラ付き）はプールの接続を使い回す
+        with get_arm_pool().handle(RIGHT_ARM) as robot:
+            _run_policy_for_seconds(runner, duration, cancel, robot=robot)
+    else:
+        with get_arm_pool().suspended(RIGHT_ARM):
+            _run_record_for_seconds(cmd, "so101_follower", cache_dir, duration, cancel)
     logger.info("Smoking action completed")
 
 
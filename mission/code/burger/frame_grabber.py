@@ -0,0 +1,197 @@
+"""
+カメラ取得モジュール
+cv2.VideoCaptureを専用スレッドで読み続け、常に最新フレームだけを保持する
+
+検出側は read() でブロックせず、V4L2に溜まった古いフレームではなく
+最新フレーム（タイムスタンプ・通し番号付き）を受け取れる
+"""
+
+import itertools
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from hardware import make_video_capture
+
+
+class Frame(NamedTuple):
+    """取得したフレーム"""
+    image: object      # BGR画像（numpy配列）。取得スレッドは毎回新しい配列を作るため、コピー不要
+    timestamp: float   # 取得完了時刻（time.monotonic）
+    seq: int           # 通し番号（カメラごとに1から。取得スレッドを作り直しても続きから増える）
+
+
+class FrameGrabber:
+    """1台のカメラを専用スレッドで読み続ける"""
+
+    def __init__(self, camera_index: int):
+        self.camera_index = camera_index
+        self._cap = None
+        self._thread = None
+        self._running = False
+        self._cond = threading.Condition()
+        self._latest: Optional[Frame] = None
+        # 呼び出し側が前回の通し番号を持ち越しても wait_newer() が待たされないよう、番号はカメラ単位で続ける
+        self._seqs = _sequence_for(camera_index)
+        # 今回の起動で最初に取得したフレームの番号（それより前は取りこぼしに数えない）
+        self._first_seq = None
+
+        # 統計情報
+        self._fps = 0.0
+        self._frames = 0
+        self._last_consumed_seq = 0
+        self.dropped_frames = 0
+        self.read_failures = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        """カメラを開いて取得スレッドを開始"""
+        if self.is_running:
+            return True
+
+        cap = make_video_capture(self.camera_index)
+        if not cap.isOpened():
+            print(f"[Grabber] Could not open camera {self.camera_index}")
+            return False
+        # ドライバ側のバッファを最小にして遅延を減らす
+        import cv2
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self._cap = cap
+        self._first_seq = None
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """取得スレッドを停止してカメラを閉じる"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        with self._cond:
+            # 停止前のフレームを再起動後に最新として返さない
+            self._latest = None
+            self._cond.notify_all()
+
+    def _capture_loop(self):
+        """カメラから読み続け、最新フレームを差し替える"""
+        last_ts = None
+        while self._running:
+            ret, image = self._cap.read()
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+
+            now = time.monotonic()
+            if last_ts is not None:
+                # 取得FPSを指数移動平均で推定
+                interval = now - last_ts
+                if interval > 0:
+                    self._fps = 1.0 / interval if self._fps == 0.0 else 0.9 * self._fps + 0.1 / interval
+            last_ts = now
+
+            seq = next(self._seqs)
+            self._frames += 1
+            with self._cond:
+                if self._first_seq is None:
+                    self._first_seq = seq
+                self._latest = Frame(image, now, seq)
+                self._cond.notify_all()
+
+    def _consume(self, frame: Optional[Frame]) -> Optional[Frame]:
+        """読まれずに上書きされたフレーム数を記録（ロック保持中に呼ぶ）"""
+        if frame is not None and frame.seq > self._last_consumed_seq:
+            previous = max(self._last_consumed_seq, (self._first_seq or frame.seq) - 1)
+            self.dropped_frames += frame.seq - previous - 1
+            self._last_consumed_seq = frame.seq
+        return frame
+
+    def latest(self) -> Optional[Frame]:
+        """最新フレームを取得（まだ1枚も取得していなければNone）"""
+        with self._cond:
+            return self._consume(self._latest)
+
+    def wait_newer(self, seq: int, timeout: float = 1.0) -> Optional[Frame]:
+        """
+        通し番号 `seq` より新しいフレームを待って取得
+
+        Args:
+            seq: 前回受け取ったフレームの通し番号（0なら最初のフレーム）
+            timeout: 待機の上限（秒）
+
+        Returns:
+            Optional[Frame]: 新しいフレーム（タイムアウト時はNone）
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: not self._running or (self._latest is not None and self._latest.seq > seq),
+                timeout=timeout,
+            )
+            if self._latest is None or self._latest.seq <= seq:
+                return None
+            return self._consume(self._latest)
+
+    def stats(self) -> dict:
+        """取得FPSと最新フレームの経過時間などを返す"""
+        with self._cond:
+            latest = self._latest
+        return {
+            "camera_index": self.camera_index,
+            "fps": self._fps,
+            "frame_age_sec": time.monotonic() - latest.timestamp if latest else None,
+            "frames": self._frames,
+            "dropped_frames": self.dropped_frames,
+            "read_failures": self.read_failures,
+        }
+
+
+# カメラ番号 → 通し番号の発行元（取得スレッドの作り直しをまたいで共有）
+_sequences: Dict[int, "itertools.count"] = {}
+_sequences_lock = threading.Lock()
+
+
+def _sequence_for(camera_index: int):
+    with _sequences_lock:
+        if camera_index not in _sequences:
+            _sequences[camera_index] = itertools.count(1)
+        return _sequences[camera_index]
+
+
+# カメラ番号 → 取得スレッド
+_grabbers: Dict[int, FrameGrabber] = {}
+_grabbers_lock = threading.Lock()
+
+
+def get_grabber(camera_index: int) -> Optional[FrameGrabber]:
+    """
+    カメラ番号に対応する取得スレッドを取得（未起動なら起動）
+
+    Returns:
+        Optional[FrameGrabber]: カメラを開けなかった場合はNone
+    """
+    with _grabbers_lock:
+        grabber = _grabbers.get(camera_index)
+        if grabber is None:
+            grabber = FrameGrabber(camera_index)
+            _grabbers[camera_index] = grabber
+        if not grabber.is_running and not grabber.start():
+            return None
+        return grabber
+
+
+def release_all_grabbers():
+    """全カメラの取得スレッドを停止"""
+    with _grabbers_lock:
+        grabbers = list(_grabbers.values())
+        _grabbers.clear()
+    for grabber in grabbers:
+        grabber.stop()
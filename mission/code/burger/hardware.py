@@ -0,0 +1,65 @@
+"""
+ハードウェア接続モジュール
+アーム・カメラ・ポリシー実行コマンド・音声出力の生成を1か所にまとめ、
+環境変数 BURGER_BACKEND で実機（real）とシミュレーション（sim）を切り替える
+
+    BURGER_BACKEND=sim BURGER_TIME_SCALE=10 python main.py
+
+sim では /dev/ttyACM*・/dev/video*・lerobot-record を使わずに、
+sim_hardware の偽アーム・偽カメラと sim_policy の代替コマンドで状態マシンをそのまま動かす
+"""
+
+import logging
+import os
+import sys
+from typing import List, Sequence
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.environ.get("BURGER_BACKEND", "real")
+
+
+def is_sim() -> bool:
+    return BACKEND == "sim"
+
+
+def make_follower(port: str, follower_id: str):
+    """SO101フォロワー（未接続）を生成"""
+    if is_sim():
+        from sim_hardware import FakeSO101Follower
+        return FakeSO101Follower(port, follower_id)
+
+    from lerobot.robots.so101_follower import SO101Follower, SO101FollowerConfig
+    return SO101Follower(SO101FollowerConfig(port=port, id=follower_id))
+
+
+def make_video_capture(camera_index: int):
+    """カメラ（cv2.VideoCapture と同じインターフェース）を開く"""
+    if is_sim():
+        from sim_hardware import FakeVideoCapture
+        return FakeVideoCapture.for_camera(camera_index)
+
+    import cv2
+    return cv2.VideoCapture(camera_index)
+
+
+def policy_command(cmd: Sequence[str], robot_type: str) -> List[str]:
+    """
+    ポリシーを実行する外部コマンド
+
+    sim では lerobot-record の代わりに、終了要求まで待機するだけの sim_policy を起動する
+    """
+    if not is_sim():
+        return list(cmd)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sim_policy.py")
+    return [sys.executable, script, f"--robot.type={robot_type}"]
+
+
+def say(text: str):
+    """音声で読み上げ（sim ではログ出力のみ）"""
+    if is_sim():
+        logger.info("[say] %s", text)
+        return
+
+    from lerobot.utils.utils import log_say
+    log_say(text)
@@ -0,0 +1,104 @@
+"""
+ヒストグラムモジュール
+ループのジッタや各処理の所要時間を固定バケットで集計する
+"""
+
+import bisect
+import threading
+from typing import Optional, Sequence
+
+# バケットの上限（ミリ秒）
+DEFAULT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """秒単位の値を記録し、ミリ秒のバケットで集計するヒストグラム"""
+
+    def __init__(self, buckets_ms: Optional[Sequence[float]] = None):
+        self.buckets_ms = tuple(buckets_ms or DEFAULT_BUCKETS_MS)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """集計をリセット"""
+        with self._lock:
+            # 最後の要素は最大バケットを超えた値
+            self.counts = [0] * (len(self.buckets_ms) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.min = None
+            self.max = None
+
+    def observe(self, seconds: float):
+        """値を1つ記録"""
+        ms = seconds * 1000.0
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets_ms, ms)] += 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    def merge(self, other: "Histogram"):
+        """同じバケットを持つ別のヒストグラムの集計を加える"""
+        if other.buckets_ms != self.buckets_ms:
+            raise ValueError("cannot merge histograms with different buckets")
+        with other._lock:
+            counts = list(other.counts)
+            count, total, vmin, vmax = other.count, other.total, other.min, other.max
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.count += count
+            self.total += total
+            if vmin is not None and (self.min is None or vmin < self.min):
+                self.min = vmin
+            if vmax is not None and (self.max is None or vmax > self.max):
+                self.max = vmax
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """
+        パーセンタイル値（秒）をバケット上限で近似
+
+        Args:
+            q: 0～100のパーセンタイル
+        """
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            target = self.count * q / 100.0
+            cumulative = 0
+            for i, c in enumerate(self.counts):
+                cumulative += c
+                if cumulative >= target and c > 0:
+                    if i < len(self.buckets_ms):
+                        return min(self.buckets_ms[i] / 1000.0, self.max)
+                    return self.max
+            return self.max
+
+    def to_dict(self) -> dict:
+        """JSONに書き出せる形式で返す"""
+        with self._lock:
+            counts = list(self.counts)
+            count, total, vmin, vmax = self.count, self.total, self.min, self.max
+        return {
+            "count": count,
+            "sum_sec": total,
+            "min_sec": vmin,
+            "max_sec": vmax,
+            "buckets_ms": list(self.buckets_ms),
+            "counts": counts,
+        }
+
+    def summary(self) -> str:
+        """1行の要約文字列"""
+        if self.count == 0:
+            return "n=0"
+        return (f"n={self.count} mean={self.mean * 1000:.2f}ms "
+                f"p50={self.percentile(50) * 1000:.2f}ms p99={self.percentile(99) * 1000:.2f}ms "
+                f"max={self.max * 1000:.2f}ms")
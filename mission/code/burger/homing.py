@@ -0,0 +1,171 @@
+"""
+ホーミングモジュール
+目標姿勢を送って決め打ちの時間だけ待つ代わりに、現在の関節位置から目標まで
+最小躍度の補間で滑らかに動かし、許容誤差以内に収まった時点で戻る
+
+- 既にホームにいる場合は何も送らずにすぐ戻る
+- タイムアウトまでに収まらなければ警告を出して戻る（動作は続行する）
+- 開始から収束までの時間を動作ごとのヒストグラムに、タイムアウトした回数とあわせて記録する
+
+関節の値は lerobot の SO101Follower の既定（use_degrees=False）の正規化単位
+（グリッパー以外は -100〜100、グリッパーは 0〜100）で、度ではない
+許容誤差は負荷がかかった状態でサーボが実際に止まる誤差より大きくないと毎回タイムアウトまで待つため、
+実機の値に合わせて環境変数で調整する
+
+環境変数:
+    BURGER_HOMING_TOLERANCE         : 収束とみなす誤差（既定2.0）
+    BURGER_HOMING_GRIPPER_TOLERANCE : グリッパーの許容誤差（既定5.0）
+    BURGER_HOMING_TIMEOUT           : 収束を待つ上限（秒。既定5.0）
+    BURGER_HOMING_MAX_VELOCITY      : 補間中の最大速度（既定90.0）
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import clock
+from command_stream import CommandStream
+from histogram import Histogram
+from metrics import observe
+from rate_scheduler import FixedRateScheduler
+
+HOMING_FPS = 30.0
+HOMING_MAX_VELOCITY = float(os.environ.get("BURGER_HOMING_MAX_VELOCITY", "90.0"))  # 補間中の最大速度（正規化単位/秒）
+HOMING_TOLERANCE = float(os.environ.get("BURGER_HOMING_TOLERANCE", "2.0"))        # 収束とみなす誤差（正規化単位）
+HOMING_TIMEOUT_SEC = float(os.environ.get("BURGER_HOMING_TIMEOUT", "5.0"))
+HOMING_POLL_SEC = 0.02
+# 関節名 → 許容誤差（物をつかんで止まることがあるグリッパーは広めにする）
+HOMING_TOLERANCES = {"gripper.pos": float(os.environ.get("BURGER_HOMING_GRIPPER_TOLERANCE", "5.0"))}
+
+# 収束時間のバケット（ミリ秒）
+SETTLE_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 5000)
+
+# 動作名 → 収束までの時間
+_settle: Dict[str, Histogram] = {}
+# 動作名 → タイムアウトした回数・タイムアウト時の最大誤差
+_timeouts: Dict[str, int] = {}
+_timeout_errors: Dict[str, float] = {}
+_settle_lock = threading.Lock()
+
+
+@dataclass
+class HomingResult:
+    """1回のホーミングの結果"""
+    label: str
+    converged: bool
+    elapsed_sec: float
+    max_error: float
+    moved: bool
+
+
+def min_jerk_path(start: np.ndarray, goal: np.ndarray, max_velocity: float, fps: float) -> np.ndarray:
+    """
+    start から goal までの最小躍度の補間を fps の周期で求める
+
+    最小躍度曲線の最大速度は 1.875 × 移動量 / 所要時間なので、
+    最も大きく動く関節が max_velocity を超えない所要時間にする
+
+    Returns:
+        np.ndarray: (フレーム数, 関節数)。最後の行は goal
+    """
+    duration = 1.875 * float(np.max(np.abs(goal - start))) / max_velocity
+    num_frames = max(2, int(np.ceil(duration * fps)) + 1)
+    tau = np.linspace(0.0, 1.0, num_frames)
+    s = tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+    return start + s[:, None] * (goal - start)
+
+
+def _read_positions(follower, names) -> np.ndarray:
+    observation = follower.get_observation()
+    return np.array([observation[name] for name in names], dtype=np.float64)
+
+
+def move_to(follower, target: Dict[str, float], label: str = "home",
+            tolerance: float = HOMING_TOLERANCE, timeout: float = HOMING_TIMEOUT_SEC,
+            max_velocity: float = HOMING_MAX_VELOCITY,
+            tolerances: Optional[Dict[str, float]] = None) -> HomingResult:
+    """
+    目標姿勢まで滑らかに動かし、許容誤差以内に収まるまで待つ
+
+    Args:
+        follower: 接続済みのフォロワー
+        target: 関節名 → 目標位置
+        label: 統計の保存キー
+        tolerance: 収束とみなす誤差
+        timeout: 開始からこの秒数で収束しなければ打ち切る
+        max_velocity: 補間中の最大速度
+        tolerances: 関節名 → 許容誤差（Noneの場合は HOMING_TOLERANCES）
+
+    Returns:
+        HomingResult: 収束したか・所要時間・最後の誤差
+    """
+    t0 = clock.now()
+    deadline = t0 + timeout
+    names = tuple(target)
+    goal = np.array([target[name] for name in names], dtype=np.float64)
+    limit = np.array([(HOMING_TOLERANCES if tolerances is None else tolerances).get(name, tolerance)
+                      for name in names])
+
+    present = _read_positions(follower, names)
+    error = np.abs(goal - present)
+    moved = bool(np.any(error > limit))
+    if moved:
+        # 測定した現在位置から補間し、動く関節だけを送る
+        rows = min_jerk_path(present, goal, max_velocity, HOMING_FPS).tolist()
+        stream = CommandStream(follower, names, deadband=0.0, keyframe_interval=None)
+        for idx in FixedRateScheduler(HOMING_FPS).ticks(len(rows)):
+            stream.send(rows[idx])
+            if clock.now() >= deadline:
+                break
+        stream.flush(goal.tolist())
+
+        while True:
+            error = np.abs(goal - _read_positions(follower, names))
+            if np.all(error <= limit) or clock.now() >= deadline:
+                break
+            clock.sleep(HOMING_POLL_SEC)
+
+    elapsed = clock.now() - t0
+    result = HomingResult(label, bool(np.all(error <= limit)), elapsed, float(error.max()), moved)
+    with _settle_lock:
+        histogram = _settle.setdefault(label, Histogram(SETTLE_BUCKETS_MS))
+    histogram.observe(elapsed)
+    observe("home_settle", elapsed)
+    if not result.converged:
+        with _settle_lock:
+            _timeouts[label] = _timeouts.get(label, 0) + 1
+            _timeout_errors[label] = max(_timeout_errors.get(label, 0.0), result.max_error)
+        worst = names[int(np.argmax(error - limit))]
+        print(f"[Homing] {label} did not settle within {timeout:.1f}s "
+              f"(max error {result.max_error:.1f} on {worst})")
+    return result
+
+
+def get_settle_stats() -> Dict[str, Histogram]:
+    """動作名 → ホーミング開始から収束までの時間のヒストグラム"""
+    with _settle_lock:
+        return dict(_settle)
+
+
+def get_timeout_stats() -> Dict[str, dict]:
+    """動作名 → {timeouts: タイムアウトした回数, runs: 回数, max_error: タイムアウト時の最大誤差}"""
+    with _settle_lock:
+        return {label: {"timeouts": _timeouts.get(label, 0), "runs": histogram.count,
+                        "max_error": _timeout_errors.get(label)}
+                for label, histogram in _settle.items()}
+
+
+def settle_report() -> List[str]:
+    """動作ごとの収束時間とタイムアウトの回数を1行ずつ"""
+    timeouts = get_timeout_stats()
+    lines = []
+    for label, settle in get_settle_stats().items():
+        t = timeouts.get(label, {})
+        line = f"[Homing] Settle time ({label}): {settle.summary()}, timeouts {t.get('timeouts', 0)}/{t.get('runs', 0)}"
+        if t.get("max_error") is not None:
+            line += f" (max error {t['max_error']:.1f})"
+        lines.append(line)
+    return lines
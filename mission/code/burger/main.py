@@ -3,17 +3,27 @@
 状態マシンを使用して、各状態間の遷移を管理
 """
 
+import sys
 import time
 from enum import Enum
-from typing import Tuple
+from typing import Optional, Tuple
 from dataclasses import dataclass
 import threading
+from concurrent.futures import TimeoutError as FuturesTimeoutError, wait as futures_wait
 
 # インポート\
-from return_home import return_watching_home, return_working_home
-from detection import detect_person
-from replay_action import execute_watching, execute_apologize, set_action_cancel as set_replay_cancel
-from estimation import execute_smoking, execute_working, set_action_cancel as set_estimation_cancel
+from detection import detect_person, get_gate_stats, get_snapshot_stats
+from detection_schedule import DetectionScheduler
+from replay_action import execute_apologize
+from arm_session import LEFT_ARM, RIGHT_ARM, get_arm_pool
+from motion_api import get_motion_dispatcher
+from startup import warm_up_controller
+from cancellation import CancelToken, get_stop_latency_stats
+from homing import settle_report
+from frame_grabber import release_all_grabbers
+import detection_worker
+import clock
+import metrics
 
 class RightHandState(Enum):
     """右手の状態"""
@@ -43,13 +53,22 @@ class RobotState:
 class BurgerRobotController:
     """バーガーロボット制御の中心部"""
     
-    def __init__(self):
+    def __init__(self, use_detection_worker: bool = False):
+        """
+        Args:
+            use_detection_worker: Trueの場合、人検知を別プロセスのワーカーで実行する
+        """
         self.state = RobotState()
         self.right_hand_idle_start_time = None
         self.idle_threshold_sec = 5  # 3秒でsmoking状態に遷移
         self.person_detected = False
         self.detection_thread = None
         self.detection_running = False
+        # 人検知の関数（ワーカー使用時も同じく bool を返す）
+        self.use_detection_worker = use_detection_worker
+        self._detect_person = detection_worker.detect_person if use_detection_worker else detect_person
+        # 右手の動作と直近の検出結果に合わせて検出間隔を決める
+        self.detection_schedule = DetectionScheduler()
         
         # 右手・左手スレッド用フラグ
         self.right_hand_thread = None
@@ -57,39 +76,89 @@ class BurgerRobotController:
         self.right_hand_running = False
         self.left_hand_running = False
         
+        # シナリオ1の動作をまとめてキャンセルするトークン（シナリオ1に入るたびに作り直す）
+        self.cancel_scope = CancelToken("scenario_1")
+        self.thread_join_timeout_sec = 10.0
+        
+        # アーム接続はコントローラの生存期間中保持する
+        self.arm_pool = get_arm_pool()
+        # 動作はアームごとに順序を保ったまま非同期に実行する（Future を返す）
+        self.motion = get_motion_dispatcher()
+        # ポリシーの常駐ロード（run() で開始し、ポリシーを使う動作の直前に完了を待つ）
+        self._warmup = None
+        # 起動時の準備（検出器・カメラ・軌跡・左手）を待つ上限と、失敗した部品をやり直す回数
+        self.startup_timeout_sec = 120.0
+        self.startup_retries = 1
+        
+    def _wait_warmup(self, scope: Optional[CancelToken] = None) -> bool:
+        """
+        ポリシーの常駐ロードが終わるまで待つ（ロード中に二重にロードしないため）
+
+        ロードの失敗は起動時の表に表示済みで、その場合は動作側で代替コマンドを使うため、ここでは例外にしない
+
+        Args:
+            scope: キャンセルされたら待つのをやめるトークン（Noneの場合は終わるまで待つ）
+
+        Returns:
+            bool: ロードが終わったか（scope がキャンセルされた場合はFalse）
+        """
+        if self._warmup is None:
+            return True
+        if scope is None:
+            futures_wait([self._warmup])
+            return True
+        # 人を検知したら、ロードの途中でもすぐにスレッドを終えられるよう短い間隔で待つ
+        while not self._warmup.done():
+            if scope.wait(0.05):
+                return False
+        return True
+
+    @staticmethod
+    def _report_failure(future):
+        """待たずに投げた動作が失敗した場合に表示"""
+        if not future.cancelled() and future.exception() is not None:
+            print(f"[ERROR] Background motion failed: {future.exception()}")
+
     def update_detection(self) -> bool:
         """
         人検知の情報を更新
         Returns:
             bool: 人が検知されたかどうか
         """
-        self.person_detected = detect_person()
+        self.person_detected = self._detect_person()
         return self.person_detected
     
-    def _background_detection_loop(self):
+    def _background_detection_loop(self, scope: CancelToken):
         """バックグラウンドで人検知を常に更新"""
+        schedule = self.detection_schedule
+        schedule.restart()
+        if self.use_detection_worker:
+            # 見張りに戻る前（scenario 2・3 の間）にワーカーが出した結果では判定しない
+            detection_worker.begin_detection_session()
         while self.detection_running:
-            result = detect_person()
+            schedule.set_activity(self.state.right_hand.value)
+            result = schedule.run(self._detect_person)
             
             # 人が検知された場合、フラグをセットしてプロセスを中断
             if result:
                 print(f"[Detection] Person detected! Cancelling actions.")
                 self.person_detected = True
-                # 実行中のプロセスをキャンセル
-                set_replay_cancel()
-                set_estimation_cancel()
+                # 実行中の動作とコントローラを即座に起こす
+                scope.cancel("person detected")
+                break
             else:
                 self.person_detected = False
             
-            time.sleep(0.1)  # 適度な間隔で更新
+            # smoking中は詰めて、IDLEや人のいない状態が続く間は広げる
+            clock.sleep(schedule.next_interval())
     
-    def _background_right_hand_loop(self):
+    def _background_right_hand_loop(self, scope: CancelToken):
         """右手のバックグラウンドループ"""
         smoking_transitioned = False  # SMOKING状態への遷移が完了したかを記録
         
-        while self.right_hand_running:
+        while self.right_hand_running and not scope.cancelled:
             # 経過時間を計算
-            elapsed = time.time() - self.right_hand_idle_start_time if self.right_hand_idle_start_time else 0
+            elapsed = clock.now() - self.right_hand_idle_start_time if self.right_hand_idle_start_time else 0
             
             # 3秒未満: IDLE状態を継続
             if elapsed < self.idle_threshold_sec:
@@ -105,30 +174,33 @@ class BurgerRobotController:
                 # SMOKING状態に遷移した後、smoking動作を実行
                 if smoking_transitioned:
                     print("[Execute] Smoking action started")
-                    execute_smoking()
+                    if not self._wait_warmup(scope):
+                        break
+                    self.motion.smoking(cancel=scope.child("smoking")).result()
                     print("[Execute] Smoking action completed")
                     # smoking動作が完了後、ループを抜ける
-                    if self.person_detected:
+                    if scope.cancelled:
                         break
             
-            time.sleep(0.05)  # 定期的に状態を更新
+            # 定期的に状態を更新（キャンセル時は即座に終了）
+            if scope.wait(0.05):
+                break
     
-    def _background_left_hand_loop(self):
+    def _background_left_hand_loop(self, scope: CancelToken):
         """左手のバックグラウンドループ"""
-        while self.left_hand_running:
+        while self.left_hand_running and not scope.cancelled:
             # 左手は常にWATCHING状態で見渡す
             self.state.left_hand = LeftHandState.WATCHING
             
-            # watching動作を実行（キャンセルフラグをチェック）
+            # watching動作を実行（キャンセルされたら即座に中断）
+            # 左手に投入済みのホーム移動があれば、その完了後に始まる
             print("[Execute] Watching action started")
-            execute_watching()
+            self.motion.watching(cancel=scope.child("watching")).result()
             print("[Execute] Watching action completed")
             
-            # キャンセルフラグがセットされたら終了
-            if self.person_detected:
+            # キャンセルされたら終了
+            if scope.wait(0.05):
                 break
-            
-            time.sleep(0.05)
     
     def execute_scenario_1_sabori(self) -> Tuple[bool, str]:
         """
@@ -149,56 +221,79 @@ class BurgerRobotController:
         if self.state.left_hand != LeftHandState.WATCHING or self.right_hand_idle_start_time is None:
             self.state.current_scenario = "scenario_1_sabori"
             print(f"\n[Scenario 1: Sabori] {self.state}")
-            # watching_home位置に移動
+            # watching_home位置への移動は待たずに、検知・右手の開始と並行して行う
             print("[Return] Moving to watching home")
-            return_watching_home()
+            self.motion.home_watching().add_done_callback(self._report_failure)
             # 状態を初期化
             self.state.right_hand = RightHandState.IDLE
             self.state.left_hand = LeftHandState.WATCHING
             # タイマーを開始
-            self.right_hand_idle_start_time = time.time()
+            self.right_hand_idle_start_time = clock.now()
+            
+            # このシナリオ用のキャンセルトークンを作り直す
+            self.person_detected = False
+            self.cancel_scope = CancelToken("scenario_1")
+            scope = self.cancel_scope
             
             # バックグラウンドスレッドを開始
             if not self.detection_running:
                 self.detection_running = True
-                self.detection_thread = threading.Thread(target=self._background_detection_loop, daemon=True)
+                self.detection_thread = threading.Thread(target=self._background_detection_loop, args=(scope,), daemon=True)
                 self.detection_thread.start()
             
             if not self.right_hand_running:
                 self.right_hand_running = True
-                self.right_hand_thread = threading.Thread(target=self._background_right_hand_loop, daemon=True)
+                self.right_hand_thread = threading.Thread(target=self._background_right_hand_loop, args=(scope,), daemon=True)
                 self.right_hand_thread.start()
             
             if not self.left_hand_running:
                 self.left_hand_running = True
-                self.left_hand_thread = threading.Thread(target=self._background_left_hand_loop, daemon=True)
+                self.left_hand_thread = threading.Thread(target=self._background_left_hand_loop, args=(scope,), daemon=True)
                 self.left_hand_thread.start()
             
-            time.sleep(0.1)
             return False, "scenario_1_sabori"
         
-        # 人検知時のみ出力
-        
-        if self.person_detected:
+        # 人検知（キャンセル）を待つ。検知されたら待機中でも即座に起きる
+        if self.cancel_scope.wait(0.5):
             # 全スレッドを停止
             self.right_hand_running = False
             self.left_hand_running = False
             self.detection_running = False
             
             # スレッドが完全に停止するまで待機
-            time.sleep(0.5)
+            for thread in (self.detection_thread, self.right_hand_thread, self.left_hand_thread):
+                if thread is not None:
+                    thread.join(timeout=self.thread_join_timeout_sec)
+                    if thread.is_alive():
+                        print(f"[Warning] Thread {thread.name} did not stop within {self.thread_join_timeout_sec}s")
             
-            # 人を検知したら常にWorkingに遷移
+            for label, latency in get_stop_latency_stats().items():
+                print(f"[Cancel] Detection→stop latency ({label}): {latency.summary()}")
+            self.detection_schedule.report()
+            
+            if self.use_detection_worker:
+                worker = detection_worker.get_worker_stats()
+                print(f"[Detection] Worker: {worker['results']} results, {worker['restarts']} restarts, "
+                      f"frame→result {detection_worker.get_worker_latency().summary()}")
+            else:
+                gate = get_gate_stats()
+                print(f"[Detection] Motion gate: ran {gate['runs']}/{gate['checks']} checks "
+                      f"(skip rate {gate['skip_rate']:.0%}), saved ~{gate['cpu_saved_sec']:.1f}s CPU")
+                snapshots = get_snapshot_stats()
+                print(f"[Detection] Snapshots: {snapshots['written']} written, {snapshots['dropped']} dropped, "
+                      f"queue depth {snapshots['queue_depth']}")
+            
+            # 人を検知したら常にWorkingに遷移（working動作は左手のホーム移動の完了後に始まる）
             print("[Return] Moving to working home")
-            return_working_home()
+            self.motion.home_working().add_done_callback(self._report_failure)
             print("\n→ Transition to Scenario 3 (Working)")
             self.right_hand_idle_start_time = None
             return True, "scenario_3_work"
         
         # スレッド実行中、静かにループを継続
-        time.sleep(0.5)
         return False, "scenario_1_sabori"
     
+    @metrics.timed("scenario_2")
     def execute_scenario_2_ayamaru(self) -> Tuple[bool, str]:
         """
         シナリオ2：謝る
@@ -221,14 +316,15 @@ class BurgerRobotController:
         # apologize動作を実行（一回のみ）
         # execute_apologize()
         
-        # watching_home位置に戻る
+        # working_home位置に戻る（working動作は完了後に始まる）
         print("[Return] Moving to working home")
-        return_working_home()
+        self.motion.home_working().add_done_callback(self._report_failure)
         
         # working シナリオに遷移
         print("\n→ Transition to Scenario 3 (Working)")
         return True, "scenario_3_work"
     
+    @metrics.timed("scenario_3")
     def execute_scenario_3_work(self) -> Tuple[bool, str]:
         """
         シナリオ3：働く
@@ -247,12 +343,17 @@ class BurgerRobotController:
         
         # working動作を実行
         print("[Execute] Working action started")
-        execute_working()
+        self._wait_warmup()
+        self.motion.working().result()
         print("[Execute] Working action completed")
         
-        # watching_home位置に戻る
+        # watching_home位置への移動は待たずにシナリオ1へ進む
         print("[Return] Moving to watching home")
-        return_watching_home()
+        self.motion.home_watching().add_done_callback(self._report_failure)
+        # 1サイクル分の接続再利用による節約時間を表示
+        self.arm_pool.report_cycle()
+        for line in settle_report():
+            print(line)
         print("\n→ Transition to Scenario 1 (Sabori)")
         return True, "scenario_1_sabori"
         
@@ -278,6 +379,18 @@ class BurgerRobotController:
             print("Burger Robot Control System Started")
             print("=" * 60)
             
+            # 計測が有効なら段階ごとの所要時間を定期的にファイルへ書き出す
+            if metrics.is_enabled():
+                metrics.start_exporter()
+            
+            # 検出器・カメラ・軌跡・アーム接続・ポリシーを並行して準備し、
+            # シナリオ1に必要なものがそろった時点で始める（ポリシーはシナリオ1の間もロードを続ける）
+            startup = warm_up_controller(self.motion, use_detection_worker=self.use_detection_worker)
+            self._warmup = startup.future("policies")
+            if not startup.wait_critical(timeout=self.startup_timeout_sec, retries=self.startup_retries):
+                # 検出器・カメラ・左手のどれかが使えないままシナリオ1に入らない
+                raise RuntimeError(f"Startup failed: {', '.join(startup.failed())} not ready")
+            
             while max_cycles is None or cycle_count < max_cycles:
                 cycle_count += 1
                 
@@ -303,6 +416,17 @@ class BurgerRobotController:
             print(f"\n[ERROR] An error occurred: {e}")
             raise
         finally:
+            # 実行中の動作を止め、投入済みの動作が終わってからアームの接続を閉じる
+            self.cancel_scope.cancel("controller stopped")
+            for arm in (LEFT_ARM, RIGHT_ARM):
+                try:
+                    self.motion.idle(arm).result(timeout=self.thread_join_timeout_sec)
+                except FuturesTimeoutError:
+                    print(f"[Warning] Motions on {arm.id} did not finish within {self.thread_join_timeout_sec}s")
+            self.arm_pool.close_all()
+            detection_worker.close_detection_worker()
+            release_all_grabbers()
+            metrics.stop_exporter()
             print("\n" + "=" * 60)
             print("Burger Robot Control System Stopped")
             print("=" * 60)
@@ -310,7 +434,17 @@ class BurgerRobotController:
 
 def main():
     """メインエントリーポイント"""
-    controller = BurgerRobotController()
+    # --metrics を指定した場合は段階ごとの所要時間を計測して書き出す
+    if "--metrics" in sys.argv:
+        metrics.enable()
+    
+    # --asyncio を指定した場合はイベントループ版のコントローラを使用
+    if "--asyncio" in sys.argv:
+        from async_controller import AsyncBurgerRobotController
+        controller = AsyncBurgerRobotController()
+    else:
+        # --detection-worker を指定した場合は人検知を別プロセスで実行
+        controller = BurgerRobotController(use_detection_worker="--detection-worker" in sys.argv)
     
     # max_cyclesを指定して実行制限、またはNoneで無制限
     controller.run(max_cycles=None)
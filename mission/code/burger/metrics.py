@@ -0,0 +1,220 @@
+"""
+計測モジュール
+ホットパスの各段階（カメラ取得・切り取り・推論・アーム指令・ホーム移動など）の所要時間を
+段階名ごとのヒストグラムに集計し、JSON または Prometheus テキスト形式のファイルに定期的に書き出す
+
+使い方:
+    from metrics import timed, observe
+
+    with timed("yolo_inference"):
+        results = model(frame)
+
+    @timed("home_watching")
+    def return_watching_home(): ...
+
+    observe("policy_first_action", seconds)
+
+計測は環境変数 BURGER_METRICS=1 または enable() で有効になる
+無効時の timed() はフラグを1回見るだけなので、ホットパスに残しておいてよい
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from histogram import Histogram
+
+_enabled = os.environ.get("BURGER_METRICS", "0") not in ("", "0", "false")
+
+# 段階名 → 所要時間のヒストグラム
+_histograms: Dict[str, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def enable(enabled: bool = True):
+    """計測を有効／無効にする"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _histogram(stage: str) -> Histogram:
+    histogram = _histograms.get(stage)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(stage, Histogram())
+    return histogram
+
+
+def observe(stage: str, seconds: float):
+    """別途計測した所要時間を記録（無効時は何もしない）"""
+    if _enabled:
+        _histogram(stage).observe(seconds)
+
+
+class timed:
+    """
+    段階の所要時間を計測するコンテキストマネージャ兼デコレータ
+
+    有効かどうかは計測の開始時（with 文に入る時・関数を呼ぶ時）に判定するため、
+    import 時に付けたデコレータも後から enable() すれば計測される
+    """
+
+    __slots__ = ("stage", "_t0")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._t0 = None
+
+    def __enter__(self):
+        self._t0 = time.perf_counter() if _enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._t0 is not None:
+            _histogram(self.stage).observe(time.perf_counter() - self._t0)
+        return False
+
+    def __call__(self, fn):
+        stage = self.stage
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _histogram(stage).observe(time.perf_counter() - t0)
+
+        return wrapper
+
+
+def get_histograms() -> Dict[str, Histogram]:
+    """段階名 → ヒストグラム"""
+    with _histograms_lock:
+        return dict(_histograms)
+
+
+def reset():
+    """全段階の集計を破棄"""
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def snapshot() -> dict:
+    """全段階の集計をJSONに書き出せる形式で返す"""
+    return {
+        "timestamp": time.time(),
+        "stages": {stage: h.to_dict() for stage, h in sorted(get_histograms().items())},
+    }
+
+
+def to_prometheus(prefix: str = "burger_stage") -> str:
+    """全段階の集計を Prometheus のテキスト形式（histogram）で返す"""
+    name = f"{prefix}_seconds"
+    lines = [
+        f"# HELP {name} Time spent in each hot-path stage.",
+        f"# TYPE {name} histogram",
+    ]
+    for stage, histogram in sorted(get_histograms().items()):
+        data = histogram.to_dict()
+        cumulative = 0
+        for bound_ms, count in zip(data["buckets_ms"], data["counts"]):
+            cumulative += count
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{bound_ms / 1000.0:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {data["count"]}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {data["sum_sec"]:.6f}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {data["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path: str, fmt: Optional[str] = None):
+    """
+    集計をファイルに書き出す（一時ファイルに書いてから置き換える）
+
+    Args:
+        path: 出力先
+        fmt: "json" または "prom"（Noneの場合は拡張子で判定。.prom / .txt なら Prometheus）
+    """
+    if fmt is None:
+        fmt = "prom" if path.endswith((".prom", ".txt")) else "json"
+    text = to_prometheus() if fmt == "prom" else json.dumps(snapshot(), indent=2)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class MetricsExporter:
+    """集計を一定間隔でファイルに書き出すスレッド"""
+
+    def __init__(self, path: str, interval: float = 10.0, fmt: Optional[str] = None):
+        self.path = path
+        self.interval = interval
+        self.fmt = fmt
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._export_loop, daemon=True)
+        self._thread.start()
+
+    def _export_loop(self):
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            write_metrics(self.path, self.fmt)
+        except OSError as e:
+            print(f"[Metrics] Failed to write {self.path}: {e}")
+
+    def stop(self):
+        """スレッドを止め、最後の集計を書き出す"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+        self._write()
+
+
+_exporter: Optional[MetricsExporter] = None
+
+
+def start_exporter(path: Optional[str] = None, interval: float = 10.0) -> MetricsExporter:
+    """
+    計測を有効にして定期書き出しを開始
+
+    Args:
+        path: 出力先（Noneの場合は環境変数 BURGER_METRICS_PATH、なければ /tmp/burger_metrics.json）
+        interval: 書き出し間隔（秒）
+    """
+    global _exporter
+    enable(True)
+    if _exporter is None:
+        path = path or os.environ.get("BURGER_METRICS_PATH", "/tmp/burger_metrics.json")
+        _exporter = MetricsExporter(path, interval)
+        _exporter.start()
+        print(f"[Metrics] Exporting stage timings to {path} every {interval:.0f}s")
+    return _exporter
+
+
+def stop_exporter():
+    """定期書き出しを止めて最後の集計を書き出す"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        _exporter = None
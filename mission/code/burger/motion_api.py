@@ -0,0 +1,126 @@
+"""
+動作指令モジュール
+ホーム移動・再生・ポリシー実行などの動作を、呼び出し元をブロックせずに Future として実行する
+
+使い方:
+    motion = get_motion_dispatcher()
+    homing = motion.home_watching()          # すぐに戻る
+    ...                                      # その間に検知の開始など
+    homing.result()                          # 必要になった時点で完了を待つ
+
+    # asyncio からは asyncio.wrap_future(homing) で await できる
+
+- 各動作は使うアームを宣言し、同じアームを使う動作は投入した順に1つずつ実行する
+  （前の動作が終わるまで次の動作は開始しないため、同じバスを取り合わない）
+- 別のアームを使う動作・アームを使わない動作（ポリシーのロードなど）は並行して実行する
+- 開始前の Future を cancel() した場合は実行せずに、同じアームの次の動作へ進む
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence
+
+from arm_session import LEFT_ARM, RIGHT_ARM, ArmSpec
+from cancellation import CancelToken
+
+
+class MotionDispatcher:
+    """アームごとに順序と排他を保って動作を実行する"""
+
+    def __init__(self, max_workers: int = 8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="motion")
+        self._lock = threading.Lock()
+        # ポート → そのアームに最後に投入した動作
+        self._tails: Dict[str, Future] = {}
+
+    def submit(self, arms: Sequence[ArmSpec], fn: Callable, *args, **kwargs) -> Future:
+        """
+        動作を投入
+
+        Args:
+            arms: 動作が使うアーム（空の場合はアームを使わない処理として即座に開始）
+            fn: 実行する関数
+
+        Returns:
+            Future: fn の戻り値・例外を受け取る Future
+        """
+        future = Future()
+        with self._lock:
+            ports = sorted({arm.port for arm in arms})
+            pending = [self._tails[p] for p in ports if p in self._tails and not self._tails[p].done()]
+            for port in ports:
+                self._tails[port] = future
+
+        if not pending:
+            self._start(future, fn, args, kwargs)
+            return future
+
+        # 同じアームの前の動作がすべて終わってから開始する
+        remaining = [len(pending)]
+        remaining_lock = threading.Lock()
+
+        def on_done(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                self._start(future, fn, args, kwargs)
+
+        for previous in pending:
+            previous.add_done_callback(on_done)
+        return future
+
+    def _start(self, future: Future, fn, args, kwargs):
+        self._executor.submit(self._run, future, fn, args, kwargs)
+
+    @staticmethod
+    def _run(future: Future, fn, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def idle(self, arm: ArmSpec) -> Future:
+        """アームに投入済みの動作がすべて終わった時点で完了する Future"""
+        return self.submit([arm], lambda: None)
+
+    # よく使う動作（実行する関数は呼び出し時にインポートして循環参照を避ける）
+
+    def home_watching(self) -> Future:
+        from return_home import return_watching_home
+        return self.submit([LEFT_ARM], return_watching_home)
+
+    def home_working(self) -> Future:
+        from return_home import return_working_home
+        return self.submit([LEFT_ARM], return_working_home)
+
+    def watching(self, cancel: Optional[CancelToken] = None, speed: Optional[float] = None) -> Future:
+        from replay_action import execute_watching
+        return self.submit([LEFT_ARM], execute_watching, cancel=cancel, speed=speed)
+
+    def smoking(self, duration: int = 20, cancel: Optional[CancelToken] = None) -> Future:
+        from estimation import execute_smoking
+        return self.submit([RIGHT_ARM], execute_smoking, duration, cancel=cancel)
+
+    def working(self, duration: int = 30, cancel: Optional[CancelToken] = None) -> Future:
+        from estimation import execute_working
+        return self.submit([LEFT_ARM, RIGHT_ARM], execute_working, duration, cancel=cancel)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+# プロセス全体で共有するディスパッチャ
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_motion_dispatcher() -> MotionDispatcher:
+    """共有の動作ディスパッチャを取得"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = MotionDispatcher()
+        return _dispatcher
@@ -0,0 +1,119 @@
+"""
+動きゲートモジュール
+縮小したグレースケール画像を背景モデルと比較し、切り取り領域内に
+動きがあるときだけニューラル検出器を実行する
+
+静止した場面ではYOLOを実行しないことで、再生ループやポリシー実行とのCPU競合を減らす
+安全のため、動きがなくても recheck_interval 秒ごとに必ず検出器を実行する
+"""
+
+import numpy as np
+
+import clock
+
+
+class MotionGate:
+    """背景差分による検出器実行の判定"""
+
+    def __init__(self, size=(64, 48), pixel_threshold: float = 25.0,
+                 energy_threshold: float = 0.02, background_alpha: float = 0.05,
+                 recheck_interval: float = 1.0):
+        """
+        Args:
+            size: 比較用に縮小する画像サイズ (幅, 高さ)
+            pixel_threshold: 変化ありとみなす画素値の差（0～255）
+            energy_threshold: 変化した画素の割合がこれ以上なら検出器を実行
+            background_alpha: 背景モデルの更新率（大きいほど早く追従）
+            recheck_interval: 動きがなくても検出器を実行する間隔（秒）
+        """
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.energy_threshold = energy_threshold
+        self.background_alpha = background_alpha
+        self.recheck_interval = recheck_interval
+
+        # 使い回しバッファ
+        self._gray = None
+        self._small = None
+        self._small_f = np.empty((size[1], size[0]), dtype=np.float32)
+        self._diff = np.empty((size[1], size[0]), dtype=np.float32)
+        self._background = None
+        self._last_run = None
+
+        # 統計情報
+        self.checks = 0
+        self.runs = 0
+        self.forced_runs = 0
+        self.last_energy = 0.0
+        self._inference_time_total = 0.0
+        self._inference_count = 0
+
+    def reset(self):
+        """背景モデルを破棄（次のフレームで必ず検出器を実行）"""
+        self._background = None
+        self._last_run = None
+
+    def motion_energy(self, roi_image: np.ndarray) -> float:
+        """背景モデルとの差分から、変化した画素の割合を求めて背景を更新"""
+        import cv2  # main のインポート時に読み込まないよう、最初の判定で読み込む
+
+        if roi_image.ndim == 3:
+            self._gray = cv2.cvtColor(roi_image, cv2.COLOR_BGR2GRAY, dst=self._gray)
+            gray = self._gray
+        else:
+            gray = roi_image
+        self._small = cv2.resize(gray, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        np.copyto(self._small_f, self._small, casting="unsafe")
+
+        if self._background is None:
+            self._background = self._small_f.copy()
+            return 1.0
+
+        cv2.absdiff(self._small_f, self._background, dst=self._diff)
+        energy = float(np.count_nonzero(self._diff > self.pixel_threshold)) / self._diff.size
+        cv2.accumulateWeighted(self._small_f, self._background, self.background_alpha)
+        return energy
+
+    def should_run(self, roi_image: np.ndarray) -> bool:
+        """
+        検出器を実行すべきか判定
+
+        Args:
+            roi_image: 切り取り領域の画像（回転前のビューでよい）
+        """
+        self.checks += 1
+        now = clock.now()
+        self.last_energy = self.motion_energy(roi_image)
+
+        if self.last_energy >= self.energy_threshold:
+            run = True
+        elif self._last_run is None or now - self._last_run >= self.recheck_interval:
+            run = True
+            self.forced_runs += 1
+        else:
+            run = False
+
+        if run:
+            self.runs += 1
+            self._last_run = now
+        return run
+
+    def record_inference(self, seconds: float):
+        """検出器1回の実行時間を記録（CPU節約量の推定に使う）"""
+        self._inference_time_total += seconds
+        self._inference_count += 1
+
+    def stats(self) -> dict:
+        """ゲートの通過率と推定CPU節約時間を返す"""
+        skips = self.checks - self.runs
+        mean_inference = self._inference_time_total / self._inference_count if self._inference_count else 0.0
+        return {
+            "checks": self.checks,
+            "runs": self.runs,
+            "forced_runs": self.forced_runs,
+            "skips": skips,
+            "skip_rate": skips / self.checks if self.checks else 0.0,
+            "last_energy": self.last_energy,
+            "mean_inference_sec": mean_inference,
+            "cpu_saved_sec": skips * mean_inference,
+        }
@@ -0,0 +1,72 @@
+"""
+人判定モジュール
+YOLOの検出結果から「人がいる」と判定する条件（クラス・信頼度・大きさ）をまとめる
+
+検出（detection）と検出器バックエンドの比較（detector_backends）で同じ判定を使うため、
+どちらにも依存しない独立したモジュールにしている
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+# 人と判定する閾値（既定値）
+MIN_CONFIDENCE = 0.6      # 信頼度の閾値
+MIN_BOX_RATIO = 2 / 3     # バウンディングボックスの縦横が切り取り領域に占める割合
+PERSON_CLASS_ID = 0       # YOLO では person クラスID = 0
+
+
+@dataclass
+class DetectionConfig:
+    """人と判定する条件と推論の入力サイズ"""
+    min_confidence: float = MIN_CONFIDENCE
+    min_box_ratio: float = MIN_BOX_RATIO
+    imgsz: Optional[int] = None  # Noneの場合は切り取り領域の大きさに合わせる
+
+    @classmethod
+    def from_env(cls) -> "DetectionConfig":
+        """BURGER_DETECTION_MIN_CONFIDENCE / BURGER_DETECTION_MIN_BOX_RATIO で閾値を上書き"""
+        return cls(
+            min_confidence=float(os.environ.get("BURGER_DETECTION_MIN_CONFIDENCE", MIN_CONFIDENCE)),
+            min_box_ratio=float(os.environ.get("BURGER_DETECTION_MIN_BOX_RATIO", MIN_BOX_RATIO)),
+        )
+
+
+def predict_kwargs(config: DetectionConfig) -> dict:
+    """推論器の中で person クラス・信頼度の閾値を満たさない候補を捨てるための引数"""
+    return {"classes": [PERSON_CLASS_ID], "conf": config.min_confidence}
+
+
+def box_rows(result, frame_index: int = 0) -> np.ndarray:
+    """検出結果を [x1, y1, x2, y2, conf, cls, frame_index] の (N, 7) 配列にする"""
+    data = result.boxes.data.cpu().numpy()
+    return np.column_stack((data[:, :6], np.full(len(data), frame_index, dtype=data.dtype)))
+
+
+def select_person_boxes(data: np.ndarray, crop_sizes: np.ndarray, config: DetectionConfig) -> np.ndarray:
+    """
+    検出結果の配列から、人と判定するボックスだけを配列演算で抽出
+
+    Args:
+        data: (N, 7) の配列。各行は [x1, y1, x2, y2, confidence, class_id, frame_index]
+        crop_sizes: (フレーム数, 2) の配列。各行は [crop_width, crop_height]
+        config: 人と判定する条件
+
+    Returns:
+        np.ndarray: 条件を満たした行
+    """
+    frame_index = data[:, 6].astype(np.intp)
+    box_width = data[:, 2] - data[:, 0]
+    box_height = data[:, 3] - data[:, 1]
+    min_width = crop_sizes[frame_index, 0] * config.min_box_ratio
+    min_height = crop_sizes[frame_index, 1] * config.min_box_ratio
+
+    mask = (
+        (data[:, 5] == PERSON_CLASS_ID)
+        & (data[:, 4] >= config.min_confidence)
+        & (box_width > min_width)
+        & (box_height > min_height)
+    )
+    return data[mask]
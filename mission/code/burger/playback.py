@@ -0,0 +1,316 @@
+"""
+再生計画モジュール
+記録した action 列を、速度倍率と制御周波数を指定して再生するための軌跡に前もって変換する
+
+0. 記録どおりの時間軸（各区間 1 / (fps × 速度倍率)）で補間して制限内に収まる場合は、
+   平滑化も伸縮もせず記録した動作をそのまま再生する（等速・記録と同じ制御周波数なら記録と完全に一致）
+   制限を超える場合は、記録した動作を全体で一様に遅くしたものと、以下の 1〜4 で伸縮したもののうち
+   短い方を使う
+1. 記録のセンサーノイズで速度・加速度を過大に見積もらないよう、位置を移動平均で平滑化する
+2. 記録の各区間（フレーム間）の所要時間を 1 / (fps × 速度倍率) とし、
+   関節ごとの最大速度・最大加速度を超える箇所は前後の窓ごとまとめて所要時間を延ばす（時間軸の伸縮）
+3. 伸縮後の時間軸上で、制御周波数の時刻に全関節をまとめて線形補間する
+4. 補間後の action 列で制限を確かめ、超える場合は全体の時間軸を延ばして補間し直す
+
+制限を満たすのに必要な区間の所要時間は速度倍率によらず、一様に遅くした場合の再生時間も
+制限に達する速度倍率以上では一定なため、速度倍率を上げて再生時間が延びることはない
+変換は再生前に配列演算で行い、再生ループでは計画済みの行を順に送るだけにする
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from trajectory_store import Trajectory
+
+
+@dataclass(frozen=True)
+class JointLimits:
+    """関節の動作制限"""
+    # 関節の値は lerobot の正規化単位（グリッパー以外は -100〜100、グリッパーは 0〜100）で、度ではない
+    max_velocity: float = 240.0       # 正規化単位/秒
+    max_acceleration: float = 2000.0  # 正規化単位/秒^2
+
+
+DEFAULT_LIMITS = JointLimits()
+
+# 速度・加速度を測る前に位置を平滑化する幅（秒。時間軸を伸縮する場合だけ使う）
+SMOOTHING_SEC = 0.2
+# 制限を超える箇所の前後でまとめて減速する幅（秒）
+SLOWDOWN_WINDOW_SEC = 0.5
+
+
+@dataclass(frozen=True)
+class PlaybackPlan:
+    """制御周波数で再生する計画済みの action 列"""
+    fps: float
+    names: Tuple[str, ...]
+    actions: np.ndarray       # (制御フレーム数, 関節数) float32
+    speed: float              # 指定した速度倍率
+    effective_speed: float    # 動作制限による伸縮後の実際の速度倍率（全体平均）
+    limited_segments: int     # 所要時間を延ばした区間の数
+    source_frames: int        # 元の記録のフレーム数
+
+    @property
+    def num_frames(self) -> int:
+        return self.actions.shape[0]
+
+    @property
+    def duration(self) -> float:
+        return self.num_frames / self.fps
+
+    def action_rows(self) -> List[List[float]]:
+        """再生前にPythonのfloatのリストに一括変換"""
+        return self.actions.tolist()
+
+    def summary(self) -> str:
+        return (f"{self.source_frames} frames -> {self.num_frames} @ {self.fps:g}fps, {self.duration:.2f}s "
+                f"(speed {self.speed:g}x, effective {self.effective_speed:.2f}x, "
+                f"{self.limited_segments} limited segments)")
+
+
+# (repo_id, episode, start, stop, speed, control_fps, 制限) → PlaybackPlan
+_plans: Dict[tuple, PlaybackPlan] = {}
+_plans_lock = threading.Lock()
+
+
+def _limit_arrays(names, limits: Optional[Dict[str, JointLimits]]) -> Tuple[np.ndarray, np.ndarray]:
+    """関節ごとの最大速度・最大加速度の配列"""
+    per_joint = [(limits or {}).get(name, DEFAULT_LIMITS) for name in names]
+    return (np.array([l.max_velocity for l in per_joint], dtype=np.float64),
+            np.array([l.max_acceleration for l in per_joint], dtype=np.float64))
+
+
+def _frames(seconds: float, fps: float) -> int:
+    """秒数を奇数のフレーム数に変換（中心をそろえた窓に使う）"""
+    return max(1, int(round(seconds * fps)) // 2 * 2 + 1)
+
+
+def _pad(x: np.ndarray, half: int, odd: bool) -> np.ndarray:
+    """
+    先頭・末尾を half 個ずつ延長
+
+    odd=True は端点を中心に点対称に折り返す（直線的な動きは延長しても直線のまま、端点も移動平均で変わらない）
+    odd=False は端の値を繰り返す
+    """
+    if odd:
+        head = 2 * x[0] - x[half:0:-1]
+        tail = 2 * x[-1] - x[-2:-half - 2:-1]
+    else:
+        head = np.repeat(x[:1], half, axis=0)
+        tail = np.repeat(x[-1:], half, axis=0)
+    return np.concatenate((head, x, tail))
+
+
+def _window_mean(x: np.ndarray, width: int, odd: bool = False) -> np.ndarray:
+    """中心をそろえた幅 width の移動平均（axis=0）"""
+    half = min(width // 2, len(x) - 1)
+    if half <= 0:
+        return x.copy()
+    padded = _pad(x, half, odd)
+    csum = np.cumsum(padded, axis=0)
+    csum = np.concatenate((np.zeros_like(csum[:1]), csum))
+    return (csum[2 * half + 1:] - csum[:-2 * half - 1]) / (2 * half + 1)
+
+
+def _window_max(x: np.ndarray, width: int) -> np.ndarray:
+    """中心をそろえた幅 width の移動最大値（1次元）"""
+    half = min(width // 2, len(x) - 1)
+    if half <= 0:
+        return x.copy()
+    return np.lib.stride_tricks.sliding_window_view(_pad(x, half, odd=False), 2 * half + 1).max(axis=1)
+
+
+def smooth_positions(actions: np.ndarray, width: int) -> np.ndarray:
+    """
+    位置を関節ごとに移動平均で平滑化（始点・終点の姿勢は変えない）
+
+    Args:
+        actions: (N, 関節数) の位置
+        width: 移動平均の幅（フレーム数）
+    """
+    actions = np.asarray(actions, dtype=np.float64)
+    if len(actions) < 3 or width <= 1:
+        return actions.copy()
+    return _window_mean(actions, width, odd=True)
+
+
+def _spread(per_point: np.ndarray, n: int, width: int) -> np.ndarray:
+    """
+    隣り合う区間の境目ごとの値を両側の区間に割り当て、窓全体に広げる
+
+    移動最大値のあとに移動平均をかけるため、各区間の値は元の値以上になり、窓の端ではなだらかに変わる
+    """
+    per_segment = np.zeros(n)
+    per_segment[:-1] = per_point
+    per_segment[1:] = np.maximum(per_segment[1:], per_point)
+    return _window_mean(_window_max(per_segment, width), width)
+
+
+def _accelerations(delta: np.ndarray, durations: np.ndarray) -> np.ndarray:
+    """隣り合う区間の平均速度の差を、区間の中点どうしの間隔で割った加速度 (N - 2, 関節数)"""
+    velocity = delta / durations[:, None]
+    return np.abs(np.diff(velocity, axis=0)) / ((durations[:-1] + durations[1:]) / 2)[:, None]
+
+
+def warp_segments(actions: np.ndarray, dt: float, max_velocity: np.ndarray, max_acceleration: np.ndarray,
+                  window: int = 1, max_iterations: int = 20) -> np.ndarray:
+    """
+    速度・加速度の制限を満たすよう各区間の所要時間を延ばす
+
+    各区間で制限を満たすのに必要な最短の所要時間（速度倍率によらない）を求め、
+    窓全体に広げてから初期値 dt と比べて長い方を使う
+    所要時間が変わる箇所で残った超過は、その前後の窓をまとめて延ばして解消する
+
+    Args:
+        actions: (N, 関節数) の位置（平滑化済み）
+        dt: 区間の所要時間の初期値（秒）
+        max_velocity: 関節ごとの最大速度
+        max_acceleration: 関節ごとの最大加速度
+        window: まとめて減速する幅（区間数）
+
+    Returns:
+        np.ndarray: (N - 1,) の各区間の所要時間
+    """
+    delta = np.diff(np.asarray(actions, dtype=np.float64), axis=0)
+    n = len(delta)
+    if n == 0:
+        return np.zeros(0)
+
+    # 速度制限：区間の移動量を最大速度で割った時間より短くはできない
+    required = np.max(np.abs(delta) / max_velocity, axis=1)
+    if n >= 2:
+        # 加速度制限：前後の区間が同じ所要時間 d のとき、加速度は 速度差の移動量 / d^2
+        accel_required = np.sqrt(np.max(np.abs(np.diff(delta, axis=0)) / max_acceleration, axis=1))
+        required = np.maximum(required, _spread(accel_required, n, window))
+    durations = np.maximum(dt, _window_mean(_window_max(required, window), window))
+
+    for _ in range(max_iterations if n >= 2 else 0):
+        excess = np.max(_accelerations(delta, durations) / max_acceleration, axis=1)
+        if not (excess > 1.0 + 1e-6).any():
+            break
+        # k 倍に延ばすと加速度は約 1/k^2
+        durations *= np.maximum(1.0, _spread(np.sqrt(np.maximum(excess, 1.0)), n, window))
+    return durations
+
+
+def resample(actions: np.ndarray, times: np.ndarray, fps: float) -> np.ndarray:
+    """
+    時刻 times の action 列を、fps の等間隔の時刻で全関節まとめて線形補間
+
+    Args:
+        actions: (N, 関節数) の位置
+        times: (N,) の単調増加する時刻（先頭は0）
+        fps: 出力の周波数（周期は 1 / fps 以下になる）
+    """
+    if len(actions) < 2:
+        return np.array(actions, dtype=np.float32)
+    # 最後の姿勢で必ず終わるよう、全体を制御周期の整数倍に切り上げて等間隔に取る
+    # （端数の短い周期を最後に残すと、そこで速度・加速度が跳ね上がる）
+    samples = np.linspace(0.0, times[-1], max(1, int(np.ceil(times[-1] * fps - 1e-9))) + 1)
+    idx = np.clip(np.searchsorted(times, samples, side="right") - 1, 0, len(times) - 2)
+    span = times[idx + 1] - times[idx]
+    weight = np.divide(samples - times[idx], span, out=np.zeros_like(samples), where=span > 0)
+    out = actions[idx] + weight[:, None] * (actions[idx + 1] - actions[idx])
+    # 最後の行は補間の丸め誤差なしで記録の終点に合わせる
+    out[-1] = actions[-1]
+    return np.ascontiguousarray(out, dtype=np.float32)
+
+
+def limit_excess(actions: np.ndarray, fps: float, max_velocity: np.ndarray,
+                 max_acceleration: np.ndarray) -> Tuple[float, float]:
+    """
+    fps で送る action 列の、最大速度・最大加速度に対する超過の割合（1以下なら制限内）
+
+    Returns:
+        Tuple[float, float]: (速度の超過割合, 加速度の超過割合)
+    """
+    actions = np.asarray(actions, dtype=np.float64)
+    velocity = np.abs(np.diff(actions, axis=0)) * fps
+    accel = np.abs(np.diff(actions, n=2, axis=0)) * fps * fps
+    return (float(np.max(velocity / max_velocity, initial=0.0)),
+            float(np.max(accel / max_acceleration, initial=0.0)))
+
+
+def _resample_within_limits(actions: np.ndarray, times: np.ndarray, fps: float, max_velocity: np.ndarray,
+                            max_acceleration: np.ndarray, max_iterations: int = 10) -> Tuple[np.ndarray, float]:
+    """
+    補間した action 列が制限を超える場合は、時間軸全体を延ばして補間し直す
+
+    Returns:
+        Tuple[np.ndarray, float]: (補間した action 列, 時間軸を延ばした倍率。延ばさなければ1.0)
+    """
+    resampled = resample(actions, times, fps)
+    total = 1.0
+    for _ in range(max_iterations):
+        velocity_excess, accel_excess = limit_excess(resampled, fps, max_velocity, max_acceleration)
+        stretch = max(velocity_excess, np.sqrt(accel_excess))
+        if stretch <= 1.0 + 1e-6:
+            break
+        total *= stretch * 1.001
+        resampled = resample(actions, times * total, fps)
+    return resampled, total
+
+
+def plan_playback(trajectory: Trajectory, speed: float = 1.0, control_fps: Optional[float] = None,
+                  start: int = 0, stop: Optional[int] = None,
+                  limits: Optional[Dict[str, JointLimits]] = None) -> PlaybackPlan:
+    """
+    軌跡の再生計画を作成（同じ条件の計画はプロセス内でキャッシュ）
+
+    Args:
+        trajectory: 記録した軌跡
+        speed: 速度倍率（2.0 で記録の半分の時間で再生）
+        control_fps: 再生ループの周波数（Noneの場合は記録のfps）
+        start, stop: 再生するフレームの範囲
+        limits: 関節名 → 動作制限（含まれない関節は DEFAULT_LIMITS）
+    """
+    if speed <= 0:
+        raise ValueError(f"speed must be positive, got {speed}")
+    control_fps = float(control_fps or trajectory.fps)
+    stop = trajectory.num_frames if stop is None else min(stop, trajectory.num_frames)
+    key = (trajectory.repo_id, trajectory.episode, start, stop, float(speed), control_fps,
+           tuple(sorted((limits or {}).items())))
+    with _plans_lock:
+        plan = _plans.get(key)
+    if plan is not None:
+        return plan
+
+    t0 = time.perf_counter()
+    recorded = trajectory.actions[start:stop]
+    max_velocity, max_acceleration = _limit_arrays(trajectory.names, limits)
+    nominal_dt = 1.0 / (trajectory.fps * speed)
+    durations = np.full(max(len(recorded) - 1, 0), nominal_dt)
+    resampled, stretch = _resample_within_limits(recorded, np.arange(len(recorded)) * nominal_dt, control_fps,
+                                                 max_velocity, max_acceleration)
+    if stretch > 1.0:
+        # 記録どおりでは制限を超える。平滑化して超える箇所の前後だけ伸縮した方が短ければそちらを使う
+        durations = durations * stretch
+        actions = smooth_positions(recorded, _frames(SMOOTHING_SEC, trajectory.fps))
+        warped = warp_segments(actions, nominal_dt, max_velocity, max_acceleration,
+                               window=_frames(SLOWDOWN_WINDOW_SEC, trajectory.fps))
+        warped_times = np.concatenate(([0.0], np.cumsum(warped)))
+        warped_resampled, warped_stretch = _resample_within_limits(actions, warped_times, control_fps,
+                                                                   max_velocity, max_acceleration)
+        if len(warped_resampled) < len(resampled):
+            resampled, durations = warped_resampled, warped * warped_stretch
+
+    nominal_duration = nominal_dt * len(durations)
+    plan = PlaybackPlan(
+        fps=control_fps,
+        names=trajectory.names,
+        actions=resampled,
+        speed=float(speed),
+        effective_speed=(speed * nominal_duration * control_fps / (len(resampled) - 1)
+                         if len(resampled) > 1 else float(speed)),
+        limited_segments=int(np.count_nonzero(durations > nominal_dt * (1 + 1e-6))),
+        source_frames=len(recorded),
+    )
+    with _plans_lock:
+        _plans[key] = plan
+    print(f"[Playback] Planned {trajectory.repo_id} ep{trajectory.episode}: {plan.summary()} "
+          f"in {(time.perf_counter() - t0) * 1000:.1f}ms")
+    return plan
@@ -0,0 +1,207 @@
+"""
+ポリシー実行モジュール
+ACTポリシーをプロセス内に常駐させ、観測→行動ループを直接回す
+
+lerobot-record をサブプロセスとして毎回起動すると、torchのインポート・
+チェックポイントのロード・データセット書き込みの初期化が毎回発生するため、
+ポリシーはコントローラ起動時に一度だけロードして使い回す
+
+ロボット（アームとカメラ）は呼び出し側が渡す。smoking の右手はアームセッションプールに
+接続したまま保持して使い回し、左手のポートも使う working の双腕ロボットだけは
+左手のセッションを明け渡したうえで実行ごとに spec.make_robot() で生成して接続する
+データセットや動画は書き出さない（デバッグ用に ring_recorder で間引いた記録だけを残せる）
+テスト時は run() に偽のロボットを渡し、記録済みの観測フレームで動作を確認できる
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import clock
+from rate_scheduler import FixedRateScheduler
+from cancellation import CancelToken
+from metrics import observe, timed
+from ring_recorder import RingRecorder
+
+# アームとカメラは全ポリシーで共有しているため、同時に1つだけ実行する
+_robot_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class PolicySpec:
+    """常駐させるポリシーの設定"""
+    name: str
+    policy_path: str
+    task: str
+    make_robot: Callable[[], object]
+    fps: int = 30
+
+
+class PolicyRunner:
+    """ロード済みのポリシーで観測→行動ループを回す"""
+
+    def __init__(self, spec: PolicySpec, device: Optional[str] = None,
+                 recorder: Optional[RingRecorder] = None):
+        """
+        Args:
+            spec: ポリシーの設定
+            device: 推論デバイス（Noneの場合はGPUがあればcuda、なければcpu）
+            recorder: 間引き記録（Noneの場合は環境変数の設定に従う。未設定なら記録しない）
+        """
+        self.spec = spec
+        self.device = device
+        self.recorder = recorder if recorder is not None else RingRecorder.from_env()
+        self.policy = None
+        self.preprocessor = None
+        self.postprocessor = None
+        self.last_run = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.policy is not None
+
+    def load(self):
+        """ポリシーと前処理・後処理をロード（初回のみ）"""
+        if self.policy is not None:
+            return
+
+        import torch
+        from lerobot.policies.act.modeling_act import ACTPolicy
+        from lerobot.policies.factory import make_pre_post_processors
+
+        t0 = time.perf_counter()
+        if self.device is None:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        policy = ACTPolicy.from_pretrained(self.spec.policy_path)
+        policy.config.device = self.device
+        policy.to(self.device)
+        policy.eval()
+
+        self.preprocessor, self.postprocessor = make_pre_post_processors(
+            policy_cfg=policy.config,
+            pretrained_path=self.spec.policy_path,
+            preprocessor_overrides={"device_processor": {"device": self.device}},
+        )
+        self.policy = policy
+        observe("policy_load", time.perf_counter() - t0)
+        print(f"[Policy] Loaded {self.spec.name} ({self.spec.policy_path}) on {self.device} "
+              f"in {time.perf_counter() - t0:.2f}s")
+
+    def _make_step(self, robot) -> Callable[[dict], dict]:
+        """ロボットの特徴量定義から、観測→action辞書の変換関数を作る"""
+        import torch
+        from lerobot.datasets.utils import build_dataset_frame, hw_to_dataset_features
+        from lerobot.utils.control_utils import predict_action
+
+        features = {
+            **hw_to_dataset_features(robot.observation_features, "observation"),
+            **hw_to_dataset_features(robot.action_features, "action"),
+        }
+        action_names = features["action"]["names"]
+        device = torch.device(self.device)
+        policy = self.policy
+
+        def step(observation: dict) -> dict:
+            frame = build_dataset_frame(features, observation, prefix="observation")
+            values = predict_action(
+                observation=frame,
+                policy=policy,
+                device=device,
+                preprocessor=self.preprocessor,
+                postprocessor=self.postprocessor,
+                use_amp=policy.config.use_amp,
+                task=self.spec.task,
+                robot_type=robot.robot_type,
+            )
+            return {name: float(values[i]) for i, name in enumerate(action_names)}
+
+        return step
+
+    def run(self, duration: float, cancel: CancelToken,
+            robot=None, step: Optional[Callable[[dict], dict]] = None) -> dict:
+        """
+        `duration` 秒間、またはキャンセルされるまでポリシーを実行
+
+        Args:
+            duration: 実行時間（秒）
+            cancel: キャンセルトークン（キャンセル時は次の周期を待たずに停止）
+            robot: 使用するロボット（Noneの場合は spec.make_robot() で生成して接続）
+            step: 観測→action変換（Noneの場合はロード済みポリシーを使用）
+
+        Returns:
+            dict: 実行統計（ステップ数、経過時間、最初のaction送信までの時間など）
+        """
+        owns_robot = robot is None
+        with _robot_lock:
+            t0 = time.perf_counter()
+            if owns_robot:
+                robot = self.spec.make_robot()
+                with timed("policy_robot_connect"):
+                    robot.connect()
+
+            first_action_sec = None
+            steps = 0
+            cancelled = False
+            scheduler = FixedRateScheduler(self.spec.fps, overrun_policy="skip")
+            try:
+                if step is None:
+                    self.load()
+                    self.policy.reset()
+                    self.preprocessor.reset()
+                    self.postprocessor.reset()
+                    step = self._make_step(robot)
+
+                deadline = clock.now() + duration
+                for _ in scheduler.ticks(cancel=cancel):
+                    if clock.now() >= deadline:
+                        break
+
+                    with timed("policy_observation"):
+                        observation = robot.get_observation()
+                    with timed("policy_inference"):
+                        action = step(observation)
+                    if cancel.cancelled:
+                        # 推論中にキャンセルされた場合は指令を送らない
+                        break
+                    with timed("send_action"):
+                        robot.send_action(action)
+                    if self.recorder is not None:
+                        self.recorder.maybe_record(steps, observation, action)
+                    steps += 1
+                    if first_action_sec is None:
+                        first_action_sec = time.perf_counter() - t0
+                        observe("first_action", first_action_sec)
+
+                if cancel.cancelled:
+                    print(f"[Policy] {self.spec.name} cancelled by detection")
+                    cancelled = True
+                    cancel.record_stop(self.spec.name)
+            finally:
+                if owns_robot:
+                    robot.disconnect()
+
+        # 記録はロボットを解放してから書き出す（制御ループ中はディスクに触れない）
+        # デバッグ用の記録なので、書き出しに失敗しても動作は成功として扱う
+        record_path = None
+        if self.recorder is not None:
+            try:
+                record_path = self.recorder.dump_run(self.spec.name)
+            except Exception as e:
+                self.recorder.clear()
+                print(f"[Policy] {self.spec.name}: could not write sampled record: {e}")
+        self.last_run = {
+            "name": self.spec.name,
+            "steps": steps,
+            "cancelled": cancelled,
+            "elapsed_sec": time.perf_counter() - t0,
+            "first_action_sec": first_action_sec,
+            "loop": scheduler.last_stats.to_dict(),
+            "record_path": record_path,
+        }
+        print(f"[Policy] {self.spec.name}: {steps} steps, first action after "
+              f"{(first_action_sec or 0):.2f}s, {scheduler.last_stats.summary()}")
+        if record_path:
+            print(f"[Policy] {self.spec.name}: sampled record written to {record_path}")
+        return self.last_run
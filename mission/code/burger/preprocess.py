@@ -0,0 +1,148 @@
+"""
+前処理モジュール
+カメラ画像の回転・切り取り・色変換・リサイズを、必要な領域だけに対して行う
+
+従来の処理（全体を反時計回り90度回転 → 左側2/3、上側2/3を切り取り）と同じ結果を、
+回転前のセンサ座標で切り取り領域を求め、その領域だけを回転することで得る
+出力は呼び出し間で使い回すバッファに書き込むため、毎回の確保は発生しない
+
+回転後の座標 (r, c) とセンサ座標の対応（H, W はセンサ画像の高さと幅）:
+    反時計回り90度: rotated[r, c] = frame[c, W - 1 - r]
+    時計回り90度:   rotated[r, c] = frame[H - 1 - c, r]
+    180度:          rotated[r, c] = frame[H - 1 - r, W - 1 - c]
+したがって回転後の領域 rows [r0, r1) × cols [c0, c1) は、反時計回りの場合
+    frame[c0:c1, W - r1:W - r0] を反時計回り90度回転したものに等しい
+（他の回転も同様に sensor_roi() でセンサ座標の領域に変換する）
+"""
+
+from fractions import Fraction
+from typing import Optional, Tuple
+
+import numpy as np
+
+# 回転後の画像に対する切り取り領域（x0, y0, x1, y1 を幅・高さに対する割合で指定）
+# 既定値は左側2/3、上側2/3
+DEFAULT_ROI = (Fraction(0), Fraction(0), Fraction(2, 3), Fraction(2, 3))
+
+# 回転の指定（cv2.ROTATE_* と同じ値。インポート時に cv2 を読み込まないよう値で持つ）
+ROTATE_90_CLOCKWISE = 0
+ROTATE_180 = 1
+ROTATE_90_COUNTERCLOCKWISE = 2
+ROTATIONS = (None, ROTATE_90_CLOCKWISE, ROTATE_180, ROTATE_90_COUNTERCLOCKWISE)
+
+
+def _copy(src: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+    """回転しない場合の切り取り（cv2.rotate と同じく dst が合えばそこに書き込む）"""
+    if dst is None or dst.shape != src.shape or dst.dtype != src.dtype:
+        return src.copy()
+    np.copyto(dst, src)
+    return dst
+
+
+class RoiPreprocessor:
+    """切り取り →（回転）→（色変換）→（リサイズ）を事前確保バッファ上で行う"""
+
+    def __init__(self, roi: Tuple = DEFAULT_ROI, color_code: Optional[int] = None,
+                 input_size: Optional[Tuple[int, int]] = None, slots: int = 1,
+                 rotation: Optional[int] = ROTATE_90_COUNTERCLOCKWISE):
+        """
+        Args:
+            roi: 回転後の画像に対する切り取り領域 (x0, y0, x1, y1)。
+                 int(幅 × 割合) で画素位置を求めるため、従来の int(width * 2 / 3) と
+                 一致させるには Fraction で指定する
+            color_code: cv2.cvtColor の変換コード（Noneの場合は変換しない）
+            input_size: モデル入力サイズ (幅, 高さ)（Noneの場合はリサイズしない）
+            slots: 出力バッファの面数。直前の出力を保持したまま次を処理する場合は2以上にする
+            rotation: 回転（ROTATIONS のいずれか。Noneの場合は回転しない）
+        """
+        if rotation not in ROTATIONS:
+            raise ValueError(f"Unsupported rotation: {rotation!r}")
+        self.roi = tuple(Fraction(v) for v in roi)
+        self.color_code = color_code
+        self.input_size = input_size
+        self.slots = max(1, slots)
+        self.rotation = rotation
+        self._slot = 0
+        # (slot, 段階名) → バッファ
+        self._buffers = {}
+
+    def roi_pixels(self, frame_shape) -> Tuple[int, int, int, int]:
+        """
+        回転後の画像における切り取り領域を画素で返す
+
+        Returns:
+            Tuple[int, int, int, int]: (c0, r0, c1, r1) = (x0, y0, x1, y1)
+        """
+        if self.rotation in (ROTATE_90_CLOCKWISE, ROTATE_90_COUNTERCLOCKWISE):
+            # 90度回転では幅と高さが入れ替わる
+            rotated_width, rotated_height = frame_shape[0], frame_shape[1]
+        else:
+            rotated_width, rotated_height = frame_shape[1], frame_shape[0]
+        x0, y0, x1, y1 = self.roi
+        return (int(rotated_width * x0), int(rotated_height * y0),
+                int(rotated_width * x1), int(rotated_height * y1))
+
+    def sensor_roi(self, frame: np.ndarray) -> np.ndarray:
+        """回転後の切り取り領域に対応するセンサ画像上の領域（ビュー、コピーなし）"""
+        c0, r0, c1, r1 = self.roi_pixels(frame.shape)
+        height, width = frame.shape[:2]
+        if self.rotation == ROTATE_90_COUNTERCLOCKWISE:
+            return frame[c0:c1, width - r1:width - r0]
+        if self.rotation == ROTATE_90_CLOCKWISE:
+            return frame[height - c1:height - c0, r0:r1]
+        if self.rotation == ROTATE_180:
+            return frame[height - r1:height - r0, width - c1:width - c0]
+        return frame[r0:r1, c0:c1]
+
+    def ensure_slots(self, count: int):
+        """出力バッファの面数を少なくとも `count` にする（一度に count 枚を処理して保持する場合）"""
+        if self.slots < count:
+            self.slots = count
+
+    def _apply(self, stage: str, fn, src: np.ndarray, *args, **kwargs) -> np.ndarray:
+        """
+        段階ごとのバッファに出力を書き込む
+
+        OpenCVは dst の形状・型が合っていればそのまま書き込み、合わない場合
+        （初回や入力サイズ変更時）だけ新しく確保するので、その配列を次回用に保持する
+        """
+        key = (self._slot, stage)
+        buf = self._buffers.get(key)
+        out = fn(src, *args, dst=buf, **kwargs)
+        if out is not buf:
+            self._buffers[key] = out
+        return out
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        """
+        フレームを前処理してバッファに書き込む
+
+        戻り値のバッファは slots 回後の呼び出しで上書きされるため、
+        保持する場合は呼び出し側でコピーすること
+
+        Returns:
+            np.ndarray: 前処理済みの画像
+
+        Raises:
+            ValueError: フレームが小さく、切り取り領域が空になる場合
+        """
+        import cv2  # main のインポート時に読み込まないよう、最初の前処理で読み込む
+
+        self._slot = (self._slot + 1) % self.slots
+
+        roi = self.sensor_roi(frame)
+        if roi.size == 0:
+            # cv2.rotate は空の入力に None を返すため、ここで止める
+            raise ValueError(f"ROI {self.roi_pixels(frame.shape)} is empty for frame shape {frame.shape}")
+        if self.rotation is None:
+            out = self._apply("rotate", _copy, roi)
+        else:
+            out = self._apply("rotate", cv2.rotate, roi, self.rotation)
+
+        if self.color_code is not None:
+            out = self._apply("color", cv2.cvtColor, out, self.color_code)
+
+        if self.input_size is not None:
+            out = self._apply("resize", cv2.resize, out, self.input_size, interpolation=cv2.INTER_LINEAR)
+
+        return out
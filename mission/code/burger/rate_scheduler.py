@@ -0,0 +1,145 @@
+"""
+固定レートスケジューラ
+絶対デッドライン（開始時刻 + k × 周期）でループを回し、遅れが累積しないようにする
+
+使い方:
+    scheduler = FixedRateScheduler(fps=30, overrun_policy="catch_up")
+    for idx in scheduler.ticks(num_frames, cancel=token):
+        follower.send_action(actions[idx])
+    print(scheduler.last_stats.summary())
+
+cancel にキャンセルトークンを渡すと、デッドライン待ちの途中でもキャンセル時に即座に終了する
+
+オーバーラン時の方針:
+    catch_up: 遅れたフレームを待たずに連続実行し、予定時刻に追いつく（全フレーム実行）
+    skip:     1周期以上遅れた場合は遅れた分のフレームを飛ばす（時刻を優先）
+    stretch:  遅れた分だけ以降の予定時刻を後ろにずらす（フレームを優先、全体が伸びる）
+"""
+
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+import clock
+from histogram import Histogram
+
+OVERRUN_POLICIES = ("catch_up", "skip", "stretch")
+
+# ジッタ・オーバーラン用のバケット（ミリ秒）
+_LOOP_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 33, 50, 100, 250, 500)
+
+
+@dataclass
+class LoopStats:
+    """1回のループ実行の統計"""
+    fps: float
+    overrun_policy: str
+    frames: int = 0
+    skipped_frames: int = 0
+    overruns: int = 0
+    elapsed_sec: float = 0.0
+    # 最後に実行したフレームの、記録上の時刻に対する遅れ
+    drift_sec: float = 0.0
+    jitter: Histogram = field(default_factory=lambda: Histogram(_LOOP_BUCKETS_MS))
+    overrun: Histogram = field(default_factory=lambda: Histogram(_LOOP_BUCKETS_MS))
+
+    def to_dict(self) -> dict:
+        return {
+            "fps": self.fps,
+            "overrun_policy": self.overrun_policy,
+            "frames": self.frames,
+            "skipped_frames": self.skipped_frames,
+            "overruns": self.overruns,
+            "elapsed_sec": self.elapsed_sec,
+            "drift_sec": self.drift_sec,
+            "jitter": self.jitter.to_dict(),
+            "overrun": self.overrun.to_dict(),
+        }
+
+    def summary(self) -> str:
+        return (f"frames={self.frames} skipped={self.skipped_frames} overruns={self.overruns} "
+                f"drift={self.drift_sec * 1000:.1f}ms jitter[{self.jitter.summary()}]")
+
+
+class FixedRateScheduler:
+    """絶対デッドラインで一定周期のループを回すスケジューラ"""
+
+    def __init__(self, fps: float, overrun_policy: str = "catch_up", spin_sec: float = 0.001):
+        """
+        Args:
+            fps: ループ周波数
+            overrun_policy: catch_up / skip / stretch
+            spin_sec: デッドライン直前にsleepせずビジーウェイトする時間
+        """
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError(f"Unknown overrun policy: {overrun_policy}")
+        self.fps = float(fps)
+        self.period = 1.0 / self.fps
+        self.overrun_policy = overrun_policy
+        self.spin_sec = spin_sec
+        self.last_stats: Optional[LoopStats] = None
+
+    def _sleep_until(self, deadline: float, cancel=None):
+        """デッドラインまで待機（直前はビジーウェイトで精度を確保）"""
+        remaining = deadline - clock.now()
+        if remaining > self.spin_sec:
+            if cancel is not None:
+                if cancel.wait(remaining - self.spin_sec):
+                    return
+            else:
+                clock.sleep(remaining - self.spin_sec)
+        while clock.now() < deadline:
+            pass
+
+    def ticks(self, num_frames: Optional[int] = None, cancel=None) -> Iterator[int]:
+        """
+        各フレームのデッドラインでフレーム番号を返すイテレータ
+
+        Args:
+            num_frames: フレーム数（Noneの場合は無制限）
+            cancel: キャンセルトークン（キャンセルされた時点で終了）
+
+        ループを途中で抜けた場合も、その時点までの統計が last_stats に残る
+        """
+        stats = LoopStats(self.fps, self.overrun_policy)
+        self.last_stats = stats
+        period = self.period
+
+        start = clock.now()
+        base = start
+        idx = 0
+        try:
+            while num_frames is None or idx < num_frames:
+                if cancel is not None and cancel.cancelled:
+                    break
+                deadline = base + idx * period
+                now = clock.now()
+                late = now - deadline
+
+                if late > 0 and idx > 0:
+                    # 前フレームの処理が周期を超えた
+                    stats.overruns += 1
+                    stats.overrun.observe(late)
+                    if self.overrun_policy == "skip" and late >= period:
+                        skip = int(late // period)
+                        idx += skip
+                        stats.skipped_frames += skip
+                        if num_frames is not None and idx >= num_frames:
+                            break
+                        deadline = base + idx * period
+                    elif self.overrun_policy == "stretch":
+                        base += late
+                        deadline = now
+                else:
+                    self._sleep_until(deadline, cancel)
+                    if cancel is not None and cancel.cancelled:
+                        break
+
+                woke = clock.now()
+                stats.jitter.observe(max(0.0, woke - deadline))
+                # 記録上の時刻（開始 + idx × 周期）に対する遅れ
+                stats.drift_sec = woke - (start + idx * period)
+                stats.frames += 1
+                yield idx
+                idx += 1
+        finally:
+            stats.elapsed_sec = clock.now() - start
@@ -1,133 +1,165 @@
-import time
-import threading
-
-from lerobot.datasets.lerobot_dataset import LeRobotDataset
-from lerobot.robots.so101_follower import SO101FollowerConfig, SO101Follower  
-from lerobot.utils.robot_utils import busy_wait
-from lerobot.utils.utils import log_say
-from return_home import return_watching_home, return_working_home
-
-# グローバルキャンセルフラグと保護用ロック
-_action_cancel_flag = False
-_cancel_lock = threading.Lock()
-
-
-def set_action_cancel():
-    """動作をキャンセルするフラグをセット"""
-    global _action_cancel_flag
-    with _cancel_lock:
-        _action_cancel_flag = True
-        print("[Action] Cancel flag set")
-
-
-def reset_action_cancel():
-    """キャンセルフラグをリセット"""
-    global _action_cancel_flag
-    with _cancel_lock:
-        _action_cancel_flag = False
-
-
-def is_action_cancelled():
-    """キャンセルフラグがセットされているかチェック"""
-    global _action_cancel_flag
-    with _cancel_lock:
-        return _action_cancel_flag
+import os
+from typing import Optional
+
+from hardware import say
+from return_home import WORKING_HOME
+from homing import move_to
+from arm_session import LEFT_ARM, get_arm_pool
+from trajectory_store import load_trajectory
+from playback import plan_playback
+from command_stream import CommandStream
+from rate_scheduler import FixedRateScheduler
+from cancellation import CancelToken
+from metrics import timed
+
+# 再生する記録エピソード（repo_id, episode）
+WATCHING_TRAJECTORY = ("Mozgi512/record_watching_2", 4)
+APOLOGIZE_TRAJECTORY = ("Mozgi512/record_apologizing_1", 4)
+
+# 再生ループのオーバーラン方針（catch_up / skip / stretch）
+REPLAY_OVERRUN_POLICY = "catch_up"
+
+# 再生の速度倍率（作業以外の動作を短くしてサイクルを詰める）と制御周波数（Noneの場合は記録のfps）
+WATCHING_SPEED = float(os.environ.get("BURGER_WATCHING_SPEED", "1.0"))
+APOLOGIZE_SPEED = float(os.environ.get("BURGER_APOLOGIZE_SPEED", "1.0"))
+REPLAY_CONTROL_FPS = float(os.environ["BURGER_REPLAY_FPS"]) if os.environ.get("BURGER_REPLAY_FPS") else None
+
+# 前回送った値からこれ以上動いた関節だけを送る（正規化単位。0 なら変化した関節はすべて送る）
+REPLAY_DEADBAND = float(os.environ.get("BURGER_REPLAY_DEADBAND", "0.3"))
+
+# 動作名 → 直近の再生ループの統計
+_last_loop_stats = {}
+# 動作名 → 直近の再生の送信量（command_stream.StreamStats）
+_last_stream_stats = {}
+
+
+def _watching_plan(speed: Optional[float] = None):
+    trajectory = load_trajectory(*WATCHING_TRAJECTORY)
+    return plan_playback(trajectory, speed or WATCHING_SPEED, REPLAY_CONTROL_FPS)
+
+
+def _apologize_plan(speed: Optional[float] = None):
+    # 記録の最初の1/5だけを再生する
+    trajectory = load_trajectory(*APOLOGIZE_TRAJECTORY)
+    return plan_playback(trajectory, speed or APOLOGIZE_SPEED, REPLAY_CONTROL_FPS,
+                         stop=trajectory.num_frames // 5)
+
+
+def preload_trajectories():
+    """再生用の軌跡を事前にデコード・キャッシュし、既定の速度の再生計画を作っておく"""
+    _watching_plan()
+    _apologize_plan()
+
+
+def get_last_loop_stats(name: str = None):
+    """
+    直近の再生ループの統計（rate_scheduler.LoopStats）を取得
+
+    Args:
+        name: "watching" / "apologize"（Noneの場合は全動作の辞書）
+    """
+    if name is None:
+        return dict(_last_loop_stats)
+    return _last_loop_stats.get(name)
+
+
+def get_last_stream_stats(name: str = None):
+    """
+    直近の再生の送信量・省いた書き込み・追従誤差（command_stream.StreamStats）を取得
+
+    Args:
+        name: "watching" / "apologize"（Noneの場合は全動作の辞書）
+    """
+    if name is None:
+        return dict(_last_stream_stats)
+    return _last_stream_stats.get(name)
+
+
+def _play_trajectory(follower, plan, name: str, label: str, cancel: CancelToken):
+    """
+    再生計画を計画の制御周波数で再生（キャンセルされたら次の周期を待たずに中断）
+
+    Args:
+        follower: 送信先のフォロワー
+        plan: 再生計画（playback.PlaybackPlan）
+        name: 統計の保存キー
+        label: ログ表示用の動作名
+        cancel: キャンセルトークン
+    """
+    rows = plan.action_rows()
+    # 動いていない関節は送らず、1秒ごとに全関節を送り直す
+    stream = CommandStream(follower, plan.names, deadband=REPLAY_DEADBAND, keyframe_interval=int(plan.fps))
+
+    scheduler = FixedRateScheduler(plan.fps, overrun_policy=REPLAY_OVERRUN_POLICY)
+    try:
+        for idx in scheduler.ticks(len(rows), cancel=cancel):
+            with timed("send_action"):
+                stream.send(rows[idx])
+
+        if cancel.cancelled:
+            print(f"[Action] {label} cancelled by detection")
+            # 検出から最後の再生指令までの時間を記録
+            cancel.record_stop(name)
+        elif rows:
+            # 不感帯で省いた分を送り、最後の姿勢に正確に合わせる
+            stream.flush(rows[-1])
+    finally:
+        _last_loop_stats[name] = scheduler.last_stats
+        _last_stream_stats[name] = stream.stats
+        print(f"[Action] {label} loop: {scheduler.last_stats.summary()}")
+        print(f"[Action] {label} stream: {stream.stats.summary()}")
 
 
-def execute_watching():
-    """watching動作を実行"""
-    reset_action_cancel()
+def execute_watching(cancel: Optional[CancelToken] = None, speed: Optional[float] = None):
+    """
+    watching動作を実行
     
-    left_follower_config = SO101FollowerConfig(  
-        port="/dev/ttyACM2",  
-        id="den_follower_arm"  
-    )  
-
-    left_follower = SO101Follower(left_follower_config)  
-    left_follower.connect()  
+    Args:
+        cancel: キャンセルトークン（Noneの場合はキャンセルされない）
+        speed: 速度倍率（Noneの場合は WATCHING_SPEED）
+    """
+    cancel = cancel or CancelToken("watching")
+    plan = _watching_plan(speed)
+    
+    # 接続済みの左手をセッションプールから取得（接続は保持したまま）
+    with get_arm_pool().handle(LEFT_ARM) as left_follower:
+        _replay_watching(left_follower, plan, cancel)
 
-    dataset = LeRobotDataset("Mozgi512/record_watching_2", episodes=[4])
-    actions = dataset.hf_dataset.select_columns("action")
 
-    log_say("replay watching")
+def _replay_watching(left_follower, plan, cancel):
+    """watching動作の再生本体"""
+    say("replay watching")
     try:
-        for idx in range(dataset.num_frames):
-            # キャンセルフラグをチェック
-            if is_action_cancelled():
-                print("[Action] Watching cancelled by detection")
-                break
-            
-            t0 = time.perf_counter()
-
-            action = {
-                name: float(actions[idx]["action"][i]) for i, name in enumerate(dataset.features["action"]["names"])
-            }
-            left_follower.send_action(action)
-
-            # 待機時間を計算
-            sleep_time = 1.0 / dataset.fps - (time.perf_counter() - t0)
-            # 待機時間が正の値の場合のみsleepを実行
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+        with timed("replay_watching"):
+            _play_trajectory(left_follower, plan, "watching", "Watching", cancel)
     finally:
-        # 動作完了後、watching_homeに戻る（安全のため）
-        watching_home = {  
-            "shoulder_pan.pos": 0,  
-            "shoulder_lift.pos": -70,  
-            "elbow_flex.pos": 60,  
-            "wrist_flex.pos": 30.0,  
-            "wrist_roll.pos": 0.0,  
-            "gripper.pos": 20  
-        }
-        left_follower.send_action(watching_home)
-        time.sleep(3.0)  # ホームポジションに戻るまで少し待機
-        left_follower.disconnect()
-
-
-def execute_apologize():
-    """apologize動作を実行"""
-    reset_action_cancel()
-    
-    left_follower_config = SO101FollowerConfig(  
-        port="/dev/ttyACM2",  
-        id="den_follower_arm"  
-    )  
+        # 動作完了後、ホームポジションに戻る（安全のため。キャンセル時も到達するまで待つ）
+        with timed("home_after_replay"):
+            move_to(left_follower, WORKING_HOME, "home_after_replay")
+
 
-    left_follower = SO101Follower(left_follower_config)  
-    left_follower.connect()  
+def execute_apologize(cancel: Optional[CancelToken] = None, speed: Optional[float] = None):
+    """
+    apologize動作を実行
+    
+    Args:
+        cancel: キャンセルトークン（Noneの場合はキャンセルされない）
+        speed: 速度倍率（Noneの場合は APOLOGIZE_SPEED）
+    """
+    cancel = cancel or CancelToken("apologize")
+    plan = _apologize_plan(speed)
+    
+    with get_arm_pool().handle(LEFT_ARM) as left_follower:
+        _replay_apologize(left_follower, plan, cancel)
 
-    dataset = LeRobotDataset("Mozgi512/record_apologizing_1", episodes=[4])
-    actions = dataset.hf_dataset.select_columns("action")
 
-    log_say("replay apologizing")
+def _replay_apologize(left_follower, plan, cancel):
+    """apologize動作の再生本体"""
+    say("replay apologizing")
     try:
-        for idx in range(dataset.num_frames//5):
-            # キャンセルフラグをチェック
-            if is_action_cancelled():
-                print("[Action] Apologizing cancelled by detection")
-                break
-            
-            t0 = time.perf_counter()
-
-            action = {
-                name: float(actions[idx]["action"][i]) for i, name in enumerate(dataset.features["action"]["names"])
-            }
-            left_follower.send_action(action)
-
-            elapsed = time.perf_counter() - t0
-            sleep_time = 1.0 / dataset.fps - elapsed
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+        with timed("replay_apologize"):
+            _play_trajectory(left_follower, plan, "apologize", "Apologizing", cancel)
     finally:
-        # 動作完了後、watching_homeに戻る（安全のため）
-        watching_home = {  
-            "shoulder_pan.pos": 0,  
-            "shoulder_lift.pos": -70,  
-            "elbow_flex.pos": 60,  
-            "wrist_flex.pos": 30.0,  
-            "wrist_roll.pos": 0.0,  
-            "gripper.pos": 20  
-        }
-        left_follower.send_action(watching_home)
-        time.sleep(1.0)  # ホームポジションに戻るまで少し待機
-        left_follower.disconnect()
\ No newline at end of file
+        # 動作完了後、ホームポジションに戻る（安全のため。キャンセル時も到達するまで待つ）
+        with timed("home_after_replay"):
+            move_to(left_follower, WORKING_HOME, "home_after_replay")
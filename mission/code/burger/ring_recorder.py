@@ -0,0 +1,115 @@
+"""
+リングバッファ記録モジュール
+ポリシー実行中の観測・actionを N ステップごとに間引いてメモリ上のリングバッファに残す（デバッグ用）
+
+lerobot-record のようにエピソード全体をデータセット・動画として書き出すことはせず、
+直近 capacity 件だけを保持し、必要なときに dump() で npz に書き出す
+
+環境変数:
+    BURGER_POLICY_RECORD_EVERY    : 記録する間隔（ステップ数。0 または未指定なら記録しない）
+    BURGER_POLICY_RECORD_CAPACITY : 保持する件数（既定300）
+    BURGER_POLICY_RECORD_IMAGES   : 1 ならカメラ画像も縦横1/4に縮小して保持する
+    BURGER_POLICY_RECORD_DIR      : 実行ごとの書き出し先（既定 /tmp/burger_policy_records）
+"""
+
+import collections
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_RECORD_DIR = "/tmp/burger_policy_records"
+
+
+class RingRecorder:
+    """観測・actionを間引いて直近の分だけ保持する"""
+
+    def __init__(self, capacity: int = 300, every: int = 10, keep_images: bool = False,
+                 image_stride: int = 4, output_dir: Optional[str] = None):
+        """
+        Args:
+            capacity: 保持する件数（古いものから捨てる）
+            every: 記録する間隔（ステップ数）
+            keep_images: Trueの場合はカメラ画像も保持する
+            image_stride: 画像を保持するときの間引き（縦横とも）
+            output_dir: dump_run() の書き出し先
+        """
+        self.capacity = capacity
+        self.every = max(1, every)
+        self.keep_images = keep_images
+        self.image_stride = image_stride
+        self.output_dir = output_dir or DEFAULT_RECORD_DIR
+        self._entries = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["RingRecorder"]:
+        """環境変数の設定から作成（記録しない設定ならNone）"""
+        every = int(os.environ.get("BURGER_POLICY_RECORD_EVERY", "0"))
+        if every <= 0:
+            return None
+        return cls(
+            capacity=int(os.environ.get("BURGER_POLICY_RECORD_CAPACITY", "300")),
+            every=every,
+            keep_images=os.environ.get("BURGER_POLICY_RECORD_IMAGES") == "1",
+            output_dir=os.environ.get("BURGER_POLICY_RECORD_DIR"),
+        )
+
+    def maybe_record(self, step: int, observation: dict, action: dict) -> bool:
+        """step が記録間隔に当たる場合だけ記録（画像以外はfloatに、画像は間引いてコピー）"""
+        if step % self.every:
+            return False
+        state, images = {}, {}
+        for key, value in observation.items():
+            if isinstance(value, np.ndarray) and value.ndim >= 2:
+                if self.keep_images:
+                    images[key] = value[::self.image_stride, ::self.image_stride].copy()
+            else:
+                state[key] = float(value)
+        entry = (time.time(), step, state, dict(action), images)
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def dump(self, path: str) -> Optional[str]:
+        """保持している分を npz に書き出す（空なら何もしない）"""
+        with self._lock:
+            entries = list(self._entries)
+        if not entries:
+            return None
+
+        state_keys = sorted(entries[0][2])
+        action_keys = sorted(entries[0][3])
+        arrays = {
+            "time": np.array([e[0] for e in entries]),
+            "step": np.array([e[1] for e in entries]),
+            "state": np.array([[e[2].get(k, np.nan) for k in state_keys] for e in entries], dtype=np.float32),
+            "state_names": np.array(state_keys),
+            "action": np.array([[e[3].get(k, np.nan) for k in action_keys] for e in entries], dtype=np.float32),
+            "action_names": np.array(action_keys),
+        }
+        for key in sorted(entries[0][4]):
+            arrays[f"image.{key}"] = np.stack([e[4][key] for e in entries if key in e[4]])
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    def dump_run(self, name: str) -> Optional[str]:
+        """1回の実行分を output_dir/<name>.npz に書き出し、バッファを空にする"""
+        path = self.dump(os.path.join(self.output_dir, f"{name}.npz"))
+        self.clear()
+        return path
@@ -0,0 +1,243 @@
+"""
+シミュレーション用ハードウェア
+実機なしで状態マシン・再生ループ・検出を動かすための偽アームと偽カメラ
+
+- FakeSO101Follower: 関節が最大角速度で目標位置へ動くモデルと、シリアルバスの転送時間を模擬する
+- FakeVideoCapture: 動画ファイル・画像列を指定FPSで繰り返し再生する（指定がなければ合成画像）
+- synthetic_trajectory: 記録データが手元にない場合の代わりの軌跡
+
+待機はすべて clock を通すため、BURGER_TIME_SCALE を上げると実時間より速く動く
+"""
+
+import glob
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import clock
+
+MOTORS = ("shoulder_pan", "shoulder_lift", "elbow_flex", "wrist_flex", "wrist_roll", "gripper")
+
+
+class FakeSO101Follower:
+    """SO101Follower と同じ使い方ができる偽アーム"""
+
+    robot_type = "so101_follower"
+
+    def __init__(self, port: str, follower_id: str, max_speed_deg_s: float = 120.0,
+                 baudrate: int = 1_000_000, transaction_overhead_sec: float = 0.0005,
+                 connect_sec: float = 0.3):
+        """
+        Args:
+            port: 実機のポート名（表示用）
+            follower_id: アームID
+            max_speed_deg_s: 関節の最大速度（正規化単位/秒）
+            baudrate: バスのボーレート（転送時間の計算に使う）
+            transaction_overhead_sec: 1回の送受信ごとの固定遅延
+            connect_sec: 接続にかかる時間
+        """
+        self.port = port
+        self.id = follower_id
+        self.max_speed_deg_s = max_speed_deg_s
+        self.baudrate = baudrate
+        self.transaction_overhead_sec = transaction_overhead_sec
+        self.connect_sec = connect_sec
+
+        self._lock = threading.Lock()
+        self._connected = False
+        self._present = np.zeros(len(MOTORS), dtype=np.float64)
+        self._goal = self._present.copy()
+        self._last_update = clock.now()
+
+        # 統計情報
+        self.writes = 0
+        self.reads = 0
+        self.bytes_written = 0
+
+    @property
+    def action_features(self) -> Dict[str, type]:
+        return {f"{motor}.pos": float for motor in MOTORS}
+
+    @property
+    def observation_features(self) -> Dict[str, type]:
+        return {f"{motor}.pos": float for motor in MOTORS}
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def connect(self, calibrate: bool = True):
+        clock.sleep(self.connect_sec)
+        with self._lock:
+            self._last_update = clock.now()
+            self._connected = True
+
+    def disconnect(self):
+        self._connected = False
+
+    def _bus_delay(self, num_bytes: int):
+        """1バイト = 10ビットとしてバスの転送時間だけ待機"""
+        clock.sleep(self.transaction_overhead_sec + num_bytes * 10 / self.baudrate)
+
+    def _advance(self):
+        """前回からの経過時間分、各関節を目標位置へ動かす（ロック保持中に呼ぶ）"""
+        t = clock.now()
+        max_step = self.max_speed_deg_s * (t - self._last_update)
+        self._last_update = t
+        self._present += np.clip(self._goal - self._present, -max_step, max_step)
+
+    def send_action(self, action: Dict[str, float]) -> Dict[str, float]:
+        """目標位置を書き込む（含まれない関節は前回の目標のまま）"""
+        if not self._connected:
+            raise ConnectionError(f"{self.id} is not connected")
+
+        # Sync Write: ヘッダ等8バイト + 関節ごとに ID 1バイト・位置 2バイト
+        num_bytes = 8 + 3 * len(action)
+        self._bus_delay(num_bytes)
+        with self._lock:
+            self._advance()
+            for key, value in action.items():
+                self._goal[MOTORS.index(key.removesuffix(".pos"))] = value
+            self.writes += 1
+            self.bytes_written += num_bytes
+        return action
+
+    def get_observation(self) -> Dict[str, float]:
+        """現在位置を読み出す"""
+        if not self._connected:
+            raise ConnectionError(f"{self.id} is not connected")
+
+        # Sync Read: 要求パケット + 関節ごとの応答パケット
+        self._bus_delay(8 + len(MOTORS) + 8 * len(MOTORS))
+        with self._lock:
+            self._advance()
+            self.reads += 1
+            return {f"{motor}.pos": float(v) for motor, v in zip(MOTORS, self._present)}
+
+
+class FakeVideoCapture:
+    """cv2.VideoCapture と同じ使い方ができる、記録映像を指定FPSで流す偽カメラ"""
+
+    def __init__(self, source: Optional[str] = None, fps: float = 30.0,
+                 size: Tuple[int, int] = (640, 480), loop: bool = True):
+        """
+        Args:
+            source: 動画ファイル・画像ファイルのディレクトリ・glob パターン（Noneの場合は合成画像）
+            fps: 再生FPS
+            size: 合成画像のサイズ (幅, 高さ)
+            loop: 最後まで再生したら先頭に戻る
+        """
+        self.source = source
+        self.fps = fps
+        self.size = size
+        self.loop = loop
+
+        self._video = None
+        self._images = []
+        self._index = 0
+        self._opened = True
+        self._next_frame_at = None
+
+        if source is None:
+            pass
+        elif os.path.isdir(source) or any(c in source for c in "*?["):
+            pattern = os.path.join(source, "*") if os.path.isdir(source) else source
+            self._images = sorted(p for p in glob.glob(pattern)
+                                  if p.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+            self._opened = bool(self._images)
+        else:
+            self._video = cv2.VideoCapture(source)
+            self._opened = self._video.isOpened()
+
+    @classmethod
+    def for_camera(cls, camera_index: int) -> "FakeVideoCapture":
+        """
+        カメラ番号に対応する偽カメラ
+
+        映像は BURGER_SIM_VIDEO_<番号>、なければ BURGER_SIM_VIDEO、
+        FPSは BURGER_SIM_FPS（既定30）で指定する
+        """
+        source = os.environ.get(f"BURGER_SIM_VIDEO_{camera_index}") or os.environ.get("BURGER_SIM_VIDEO")
+        fps = float(os.environ.get("BURGER_SIM_FPS", "30"))
+        return cls(source, fps)
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def set(self, prop_id: int, value: float) -> bool:
+        return True
+
+    def get(self, prop_id: int) -> float:
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.size[0])
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.size[1])
+        return 0.0
+
+    def _next_image(self) -> Optional[np.ndarray]:
+        if self._video is not None:
+            ret, image = self._video.read()
+            if not ret and self.loop:
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, image = self._video.read()
+            return image if ret else None
+
+        if self._images:
+            if self._index >= len(self._images):
+                if not self.loop:
+                    return None
+                self._index = 0
+            image = cv2.imread(self._images[self._index])
+            self._index += 1
+            return image
+
+        # 合成画像：ほぼ静止した背景（動きゲートで推論が省略される場面）
+        width, height = self.size
+        image = np.full((height, width, 3), 96, dtype=np.uint8)
+        cv2.putText(image, f"sim {self._index}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+        self._index += 1
+        return image
+
+    def read(self):
+        """次のフレームの時刻まで待ってから返す"""
+        if not self._opened:
+            return False, None
+
+        t = clock.now()
+        if self._next_frame_at is None:
+            self._next_frame_at = t
+        clock.sleep(self._next_frame_at - t)
+        # 遅れている場合は遅れを取り戻そうとせず、今から1周期後を次の時刻にする
+        self._next_frame_at = max(self._next_frame_at, t) + 1.0 / self.fps
+
+        image = self._next_image()
+        return image is not None, image
+
+    def release(self):
+        self._opened = False
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+
+def synthetic_trajectory(fps: float = 30.0, seconds: float = 10.0) -> Tuple[np.ndarray, Tuple[str, ...], float]:
+    """
+    記録データの代わりに、首振り動作に似た滑らかな軌跡を作る
+
+    Returns:
+        Tuple[np.ndarray, Tuple[str, ...], float]: (action列, 関節名, fps)
+    """
+    t = np.arange(int(fps * seconds), dtype=np.float32) / fps
+    sweep = np.sin(2 * np.pi * t / seconds)
+    actions = np.zeros((len(t), len(MOTORS)), dtype=np.float32)
+    actions[:, 0] = -70 + 40 * sweep   # shoulder_pan
+    actions[:, 1] = -50                # shoulder_lift
+    actions[:, 3] = 30 + 10 * sweep    # wrist_flex
+    actions[:, 5] = 20                 # gripper
+    names = tuple(f"{motor}.pos" for motor in MOTORS)
+    return actions, names, fps
@@ -0,0 +1,28 @@
+"""
+lerobot-record の代替コマンド（シミュレーション用）
+起動してキャリブレーションのENTERを読み捨て、SIGTERMを受けるまで待機する
+
+estimation._run_command_for_seconds からは lerobot-record と同じように起動・終了される
+"""
+
+import signal
+import sys
+import threading
+
+
+def main():
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    robot_type = next((a.split("=", 1)[1] for a in sys.argv[1:] if a.startswith("--robot.type=")), "unknown")
+    print(f"[SimPolicy] Started ({robot_type})", flush=True)
+    # 呼び出し側が送るENTERを読み捨てる
+    sys.stdin.readline()
+
+    stop.wait()
+    print("[SimPolicy] Stopped", flush=True)
+
+
+if __name__ == "__main__":
+    main()
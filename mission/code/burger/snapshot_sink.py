@@ -0,0 +1,171 @@
+"""
+スナップショット保存モジュール
+人検知時の画像描画・JPEGエンコード・書き込みを専用スレッドで行う
+
+- 検知スレッドは上限付きキューに積むだけで、キューが満杯の場合は保存を諦めて先に進む
+- ファイル名はマイクロ秒と通し番号を含むため、同じ秒に複数回保存しても重複しない
+- 保存枚数と経過時間の上限を超えた古いファイルは削除する
+"""
+
+import datetime
+import glob
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from metrics import timed
+
+
+class SnapshotSink:
+    """検知画像をバックグラウンドで保存する"""
+
+    def __init__(self, directory: str = "/tmp", prefix: str = "person_detected_",
+                 max_queue: int = 4, max_files: int = 200, max_age_sec: float = 24 * 3600):
+        """
+        Args:
+            directory: 保存先ディレクトリ
+            prefix: ファイル名の接頭辞（保持上限の判定にも使う）
+            max_queue: 保存待ちキューの上限（超えた分は破棄）
+            max_files: 保存しておく最大枚数
+            max_age_sec: これより古いファイルは削除（秒）
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.max_files = max_files
+        self.max_age_sec = max_age_sec
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._seq = 0
+        self._thread = None
+        self._running = False
+        # 保存済みファイル（古い順）
+        self._files = deque()
+
+        # 統計情報
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.pruned = 0
+        self.errors = 0
+
+    def start(self):
+        """保存スレッドを開始（既存ファイルも保持上限の対象にする）"""
+        if self._running:
+            return
+        existing = glob.glob(os.path.join(self.directory, self.prefix + "*.jpg"))
+        existing.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        self._files = deque(existing)
+        self._running = True
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 2.0):
+        """キューに残った分を書き出してからスレッドを停止"""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def _next_path(self) -> str:
+        self._seq += 1
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return os.path.join(self.directory, f"{self.prefix}{timestamp}_{self._seq:04d}.jpg")
+
+    def submit(self, image, result=None) -> Optional[str]:
+        """
+        画像の保存を依頼（ブロックしない）
+
+        Args:
+            image: BGR画像。呼び出し側のバッファが再利用される場合があるため、キューに積む時にコピーする
+            result: ultralyticsの推論結果（指定した場合は検出枠を描画して保存）
+
+        Returns:
+            Optional[str]: 保存予定のパス（キューが満杯で破棄した場合はNone）
+        """
+        self.start()
+        self.submitted += 1
+        # 満杯ならコピーもせずに破棄する
+        if self._queue.full():
+            self.dropped += 1
+            return None
+
+        path = self._next_path()
+        try:
+            self._queue.put_nowait((path, image.copy(), result))
+        except queue.Full:
+            self.dropped += 1
+            return None
+        return path
+
+    def _write_loop(self):
+        """キューから取り出して描画・エンコード・書き込み"""
+        import cv2
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            path, image, result = item
+            try:
+                with timed("snapshot_write"):
+                    if result is not None:
+                        image = result.plot(img=image)
+                    if not cv2.imwrite(path, image):
+                        raise OSError(f"cv2.imwrite failed: {path}")
+                self.written += 1
+                self._files.append(path)
+                self._prune()
+            except Exception as e:
+                self.errors += 1
+                print(f"[Snapshot] Failed to save {path}: {e}")
+
+    def _prune(self):
+        """保存枚数・経過時間の上限を超えた古いファイルを削除"""
+        now = time.time()
+        while self._files:
+            oldest = self._files[0]
+            try:
+                too_old = now - os.path.getmtime(oldest) > self.max_age_sec
+            except OSError:
+                # 既に削除されている
+                self._files.popleft()
+                continue
+            if len(self._files) <= self.max_files and not too_old:
+                break
+            self._files.popleft()
+            try:
+                os.remove(oldest)
+                self.pruned += 1
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """キューの深さ・破棄数などを返す"""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "pruned": self.pruned,
+            "errors": self.errors,
+            "files": len(self._files),
+        }
+
+
+# 検知画像用の共有シンク
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_snapshot_sink() -> SnapshotSink:
+    """共有スナップショットシンクを取得（初回に起動）"""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = SnapshotSink()
+            _sink.start()
+        return _sink
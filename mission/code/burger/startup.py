@@ -0,0 +1,215 @@
+"""
+起動モジュール
+コントローラの開始時に、検出器・カメラ・軌跡・アーム接続・ポリシーの準備を並行して行い、
+シナリオ1に必要なもの（クリティカルパス）がそろった時点で制御を始める
+
+重いライブラリ（ultralytics・lerobot・torch）は各部品の準備の中で初めてインポートされるため、
+main のインポート自体は軽いまま、インポートとロードも並行して進む
+
+    startup = warm_up_controller(motion)
+    startup.wait_critical(retries=1)   # 検出器・カメラ・軌跡・左手の接続を待つ（失敗した部品は再試行）
+    startup.future("policies")         # ポリシーはシナリオ1の間にロードを続ける
+
+部品ごとの開始・完了時刻は表にして表示する
+"""
+
+import threading
+import time
+from concurrent.futures import Future, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from arm_session import LEFT_ARM, RIGHT_ARM, ArmSpec, get_arm_pool
+from metrics import observe
+
+
+@dataclass
+class ComponentTiming:
+    """1つの部品の準備の結果"""
+    name: str
+    critical: bool
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    ok: Optional[bool] = None
+    error: Optional[str] = None
+    attempt: int = 1
+
+
+class StartupOrchestrator:
+    """部品の準備を並行して実行し、所要時間を記録する"""
+
+    def __init__(self, motion):
+        """
+        Args:
+            motion: アームごとの排他を行う動作ディスパッチャ（motion_api.MotionDispatcher）
+        """
+        self.motion = motion
+        self._components: Dict[str, tuple] = {}
+        self._futures: Dict[str, Future] = {}
+        self.timings: Dict[str, ComponentTiming] = {}
+        self._t0 = None
+        self._lock = threading.Lock()
+        # クリティカルパスの表を表示済みか・全部品の表を表示済みか
+        self._reported_critical = False
+        self._reported_all = False
+
+    def add(self, name: str, fn: Callable[[], object], critical: bool = True,
+            arms: Sequence[ArmSpec] = ()) -> "StartupOrchestrator":
+        """
+        準備する部品を追加
+
+        Args:
+            name: 部品名（表示と future() のキー）
+            fn: 準備処理。False を返した場合は失敗とみなす
+            critical: Trueの場合、シナリオ1の開始前に完了を待つ
+            arms: 準備で使うアーム（同じアームの動作とは順番に実行される）
+        """
+        self._components[name] = (fn, critical, tuple(arms))
+        return self
+
+    def _run(self, timing: ComponentTiming, fn):
+        timing.started_at = time.perf_counter() - self._t0
+        try:
+            result = fn()
+            timing.ok = result is not False
+            if not timing.ok:
+                timing.error = "not ready"
+            return result
+        except Exception as e:
+            timing.ok = False
+            timing.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            timing.finished_at = time.perf_counter() - self._t0
+            observe(f"startup_{timing.name}", timing.finished_at - timing.started_at)
+
+    def _submit(self, name: str, attempt: int = 1):
+        fn, critical, arms = self._components[name]
+        timing = ComponentTiming(name, critical, attempt=attempt)
+        self.timings[name] = timing
+        future = self.motion.submit(arms, self._run, timing, fn)
+        future.add_done_callback(self._on_done)
+        self._futures[name] = future
+
+    def start(self) -> "StartupOrchestrator":
+        """すべての部品の準備を同時に開始"""
+        self._t0 = time.perf_counter()
+        for name in self._components:
+            self._submit(name)
+        return self
+
+    def failed(self, critical_only: bool = True) -> List[str]:
+        """準備に失敗した（または終わっていない）部品名"""
+        return [name for name, t in self.timings.items()
+                if (t.critical or not critical_only) and not (self._futures[name].done() and t.ok)]
+
+    def future(self, name: str) -> Future:
+        """部品の準備の Future"""
+        return self._futures[name]
+
+    def wait_critical(self, timeout: Optional[float] = None, retries: int = 0) -> bool:
+        """
+        クリティカルな部品の準備が終わるまで待ち、表に表示する
+
+        失敗した部品は retries 回まで準備をやり直す（時間切れで終わっていない部品はやり直さない）
+
+        Args:
+            timeout: 1回の待機の上限（秒）
+            retries: 失敗した部品をやり直す回数
+
+        Returns:
+            bool: クリティカルな部品がすべて準備できたか（Falseの場合、呼び出し側は制御を始めない）
+        """
+        for attempt in range(retries + 1):
+            critical = [self._futures[t.name] for t in self.timings.values() if t.critical]
+            wait(critical, timeout=timeout)
+            retry = [name for name in self.failed() if self._futures[name].done()]
+            if attempt == retries or not retry:
+                break
+            print(f"[Startup] Retrying {', '.join(retry)} (attempt {attempt + 2}/{retries + 1})")
+            for name in retry:
+                self._submit(name, attempt + 2)
+        ready_at = time.perf_counter() - self._t0
+        observe("startup_critical_path", ready_at)
+        ok = not self.failed()
+        with self._lock:
+            self._reported_critical = True
+            # 全部品がそろっていれば表は1回だけ表示する
+            self._reported_all = all(f.done() for f in self._futures.values())
+        self.report(f"critical path {'ready' if ok else 'incomplete'} after {ready_at:.2f}s")
+        return ok
+
+    def _on_done(self, _):
+        with self._lock:
+            if (not self._reported_critical or self._reported_all
+                    or not all(f.done() for f in self._futures.values())):
+                return
+            self._reported_all = True
+        if any(not t.critical for t in self.timings.values()):
+            total = max(t.finished_at or 0.0 for t in self.timings.values())
+            self.report(f"all components finished after {total:.2f}s")
+
+    def report(self, title: str):
+        """部品ごとの開始・完了時刻の表を表示"""
+        print(f"[Startup] {title}")
+        print(f"[Startup]   {'component':<12} {'critical':<8} {'start':>7} {'ready':>7} {'took':>7}  status")
+        for t in sorted(self.timings.values(), key=lambda t: (t.finished_at is None, t.finished_at or 0.0)):
+            if t.finished_at is None:
+                status, ready, took = "loading", "-", "-"
+            else:
+                status = "ok" if t.ok else f"FAILED ({t.error})"
+                if t.attempt > 1:
+                    status += f" [attempt {t.attempt}]"
+                ready = f"{t.finished_at:6.2f}s"
+                took = f"{t.finished_at - t.started_at:6.2f}s"
+            start = f"{t.started_at:6.2f}s" if t.started_at is not None else "-"
+            print(f"[Startup]   {t.name:<12} {'yes' if t.critical else 'no':<8} {start:>7} {ready:>7} {took:>7}  {status}")
+
+
+def _connect_left_arm():
+    with get_arm_pool().handle(LEFT_ARM):
+        pass
+
+
+def _connect_right_arm():
+    # estimation のインポートで右手の接続方法（smoking のロボット）がプールに登録される
+    import estimation
+    with get_arm_pool().handle(RIGHT_ARM):
+        pass
+
+
+def warm_up_controller(motion, camera_index: int = 4, use_detection_worker: bool = False) -> StartupOrchestrator:
+    """
+    コントローラの部品を並行して準備する
+
+    クリティカル: 検出器（カメラ起動・モデルのロード・1回分の推論）、再生用の軌跡、左手の接続
+    クリティカルでない: ポリシーのロード・右手の接続（smoking は IDLE の後なので、その間に終わればよい）
+    """
+    def detector():
+        if use_detection_worker:
+            import detection_worker
+            return detection_worker.get_detection_worker(camera_index).wait_ready()
+        import detection
+        return detection.warm_up(camera_index)
+
+    def camera():
+        from frame_grabber import get_grabber
+        grabber = get_grabber(camera_index)
+        return grabber is not None and grabber.wait_newer(0, timeout=5.0) is not None
+
+    def trajectories():
+        from replay_action import preload_trajectories
+        preload_trajectories()
+
+    def policies():
+        from estimation import warm_policies
+        warm_policies()
+
+    startup = StartupOrchestrator(motion)
+    startup.add("camera", camera)
+    startup.add("detector", detector)
+    startup.add("trajectories", trajectories)
+    startup.add("left_arm", _connect_left_arm, arms=[LEFT_ARM])
+    startup.add("policies", policies, critical=False)
+    startup.add("right_arm", _connect_right_arm, critical=False, arms=[RIGHT_ARM])
+    return startup.start()
@@ -0,0 +1,10 @@
+"""
+テスト共通設定
+burger のモジュールをインポートできるようにし、実機ではなくシミュレーション（BURGER_BACKEND=sim）で動かす
+"""
+
+import os
+import sys
+
+os.environ.setdefault("BURGER_BACKEND", "sim")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
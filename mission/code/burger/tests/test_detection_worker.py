@@ -0,0 +1,80 @@
+"""detection_worker の結果の読み取りと監視スレッドのテスト（ワーカープロセスは起動しない）"""
+
+import threading
+import time
+
+import pytest
+
+from detection_worker import _REC_FRAME_SEQ, DetectionWorker, ResultChannel
+
+
+@pytest.fixture
+def worker():
+    worker = DetectionWorker(restart_delay=0.0)
+    worker._channel = ResultChannel.create(capacity=64)
+    yield worker
+    worker._channel.close()
+
+
+def test_begin_session_skips_results_from_before(worker):
+    channel = worker._channel
+    stale = time.monotonic() - 5.0
+    # scenario 2・3 の間に、誰も読まないまま人を検出した結果が溜まる
+    for seq in range(1, 11):
+        channel.publish(seq, stale, detected=True, inference_sec=0.05, gated=False)
+
+    worker.begin_session()
+    assert len(worker.poll()) == 0
+
+    channel.publish(11, time.monotonic(), detected=False, inference_sec=0.05, gated=False)
+    records = worker.poll()
+    assert records[:, _REC_FRAME_SEQ].tolist() == [11.0]
+    assert worker.detections == 0
+    # 古い結果は遅延の統計にも入らない
+    assert worker.latency.count == 1
+    assert worker.latency.max < 1.0
+
+
+class _HungProcess:
+    """停止を待つ間ブロックするワーカープロセスの代わり"""
+
+    def __init__(self):
+        self.joining = threading.Event()
+        self.exited = threading.Event()
+        self.exitcode = None
+
+    def is_alive(self):
+        return not self.exited.is_set()
+
+    def join(self, timeout=None):
+        self.joining.set()
+        self.exited.wait(timeout)
+
+    def terminate(self):
+        self.exited.set()
+
+    kill = terminate
+
+
+def test_restart_does_not_hold_lock_while_stopping(worker, monkeypatch):
+    process = _HungProcess()
+    spawned = []
+    monkeypatch.setattr(worker, "_check_worker", lambda: "no heartbeat")
+    monkeypatch.setattr(worker, "_spawn", lambda: spawned.append(True))
+    worker._process = process
+    worker._running = True
+
+    supervisor = threading.Thread(target=worker._supervise_loop, daemon=True)
+    supervisor.start()
+    assert process.joining.wait(2.0)
+
+    # 停止を待っている間も close() がロックを取れる
+    assert worker._lock.acquire(timeout=0.1)
+    worker._running = False
+    worker._lock.release()
+
+    process.exited.set()
+    supervisor.join(2.0)
+    assert not supervisor.is_alive()
+    # 停止中に close された場合は作り直さない
+    assert spawned == []
@@ -0,0 +1,69 @@
+"""playback の再生計画のテスト"""
+
+import numpy as np
+import pytest
+
+from playback import JointLimits, _limit_arrays, limit_excess, plan_playback
+from sim_hardware import synthetic_trajectory
+from trajectory_store import Trajectory
+
+NAMES = synthetic_trajectory(fps=30.0, seconds=1.0)[1]
+SPEEDS = [0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 2.5, 3.0, 4.0, 6.0, 8.0]
+
+
+def _trajectory(noise: float, repo_id: str) -> Trajectory:
+    actions, names, fps = synthetic_trajectory(fps=30.0, seconds=10.0)
+    rng = np.random.default_rng(0)
+    actions = actions + rng.normal(0.0, noise, actions.shape).astype(np.float32)
+    return Trajectory(repo_id, 0, fps, names, actions)
+
+
+@pytest.mark.parametrize("noise", [0.0, 0.3, 1.0])
+def test_duration_never_grows_with_speed(noise):
+    trajectory = _trajectory(noise, f"test/monotonic_{noise}")
+    durations = [plan_playback(trajectory, speed, control_fps=30).duration for speed in SPEEDS]
+    assert all(later <= earlier for earlier, later in zip(durations, durations[1:])), durations
+    if noise <= 0.3:
+        # 記録程度のノイズなら、2倍速は等速より十分短い
+        assert durations[SPEEDS.index(2.0)] < 0.6 * durations[SPEEDS.index(1.0)]
+
+
+@pytest.mark.parametrize("noise", [0.0, 0.3])
+@pytest.mark.parametrize("control_fps", [30, 60])
+def test_limits_hold_on_planned_actions(noise, control_fps):
+    trajectory = _trajectory(noise, f"test/limits_{noise}")
+    limits = {"shoulder_pan.pos": JointLimits(max_velocity=60.0, max_acceleration=300.0)}
+    max_velocity, max_acceleration = _limit_arrays(trajectory.names, limits)
+    for speed in SPEEDS:
+        plan = plan_playback(trajectory, speed, control_fps=control_fps, limits=limits)
+        velocity_excess, accel_excess = limit_excess(plan.actions, plan.fps, max_velocity, max_acceleration)
+        assert velocity_excess <= 1.0 + 1e-3, (speed, velocity_excess)
+        assert accel_excess <= 1.0 + 1e-3, (speed, accel_excess)
+
+
+def test_plan_keeps_start_and_end_pose():
+    trajectory = _trajectory(0.3, "test/endpoints")
+    plan = plan_playback(trajectory, 3.0, control_fps=30)
+    np.testing.assert_allclose(plan.actions[0], trajectory.actions[0], atol=1e-4)
+    np.testing.assert_allclose(plan.actions[-1], trajectory.actions[-1], atol=1e-4)
+
+
+@pytest.mark.parametrize("noise, limits", [
+    (0.0, None),
+    (0.3, {name: JointLimits(max_acceleration=20000.0) for name in NAMES}),
+])
+def test_recorded_speed_replays_recording_unchanged(noise, limits):
+    # 等速・記録と同じ制御周波数で制限内なら、平滑化も伸縮もせず記録どおりに再生する
+    trajectory = _trajectory(noise, f"test/unchanged_{noise}")
+    plan = plan_playback(trajectory, 1.0, limits=limits)
+    assert plan.limited_segments == 0
+    np.testing.assert_array_equal(plan.actions, trajectory.actions)
+
+
+def test_noise_beyond_limits_is_smoothed_not_replayed_raw():
+    # 記録のノイズだけで加速度の制限を超える場合は、平滑化して制限内に収める
+    trajectory = _trajectory(0.3, "test/noisy_default_limits")
+    plan = plan_playback(trajectory, 1.0)
+    max_velocity, max_acceleration = _limit_arrays(trajectory.names, None)
+    assert max(limit_excess(trajectory.actions, trajectory.fps, max_velocity, max_acceleration)) > 1.0
+    assert max(limit_excess(plan.actions, plan.fps, max_velocity, max_acceleration)) <= 1.0 + 1e-3
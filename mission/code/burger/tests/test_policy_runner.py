@@ -0,0 +1,116 @@
+"""policy_runner のテスト（偽のロボットと記録済みの観測フレームで実行）"""
+
+import numpy as np
+
+from cancellation import CancelToken
+from policy_runner import PolicyRunner, PolicySpec
+from ring_recorder import RingRecorder
+from sim_hardware import synthetic_trajectory
+
+
+class RecordedRobot:
+    """記録済みの観測フレームを順に返し、送られた action を記録する偽のロボット"""
+
+    robot_type = "so101_follower"
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = 0
+        self.sent = []
+        self.connects = 0
+        self.disconnects = 0
+
+    def connect(self):
+        self.connects += 1
+
+    def disconnect(self):
+        self.disconnects += 1
+
+    def get_observation(self) -> dict:
+        frame = self.frames[min(self.index, len(self.frames) - 1)]
+        self.index += 1
+        return frame
+
+    def send_action(self, action: dict):
+        self.sent.append(action)
+
+
+def _recorded_frames(count: int = 60):
+    actions, names, _ = synthetic_trajectory(fps=30.0, seconds=count / 30.0)
+    image = np.zeros((48, 64, 3), dtype=np.uint8)
+    return [{**{name: float(v) for name, v in zip(names, row)}, "top": image} for row in actions]
+
+
+def _follow(observation: dict) -> dict:
+    """観測した関節位置から少しずらした action を返す（ポリシーの代わり）"""
+    return {key: value + 1.0 for key, value in observation.items() if key.endswith(".pos")}
+
+
+def _runner(make_robot=None) -> PolicyRunner:
+    return PolicyRunner(PolicySpec("test", "none", "Test", make_robot, fps=30))
+
+
+def test_runs_recorded_frames_on_given_robot():
+    frames = _recorded_frames()
+    robot = RecordedRobot(frames)
+    stats = _runner().run(0.5, CancelToken("test"), robot=robot, step=_follow)
+
+    assert stats["steps"] == len(robot.sent) > 0
+    assert not stats["cancelled"]
+    # 観測したフレームの順に action を送る
+    for frame, action in zip(frames, robot.sent):
+        assert action["shoulder_pan.pos"] == frame["shoulder_pan.pos"] + 1.0
+    # 渡されたロボットは接続・切断しない（呼び出し側が使い回す）
+    assert robot.connects == 0 and robot.disconnects == 0
+
+
+def test_creates_and_releases_robot_per_run():
+    robots = []
+
+    def make_robot():
+        robots.append(RecordedRobot(_recorded_frames()))
+        return robots[-1]
+
+    runner = _runner(make_robot)
+    runner.run(0.2, CancelToken("test"), step=_follow)
+    runner.run(0.2, CancelToken("test"), step=_follow)
+    assert [(r.connects, r.disconnects) for r in robots] == [(1, 1), (1, 1)]
+
+
+def test_cancel_stops_without_sending_after_cancel():
+    robot = RecordedRobot(_recorded_frames())
+    cancel = CancelToken("test")
+
+    def step(observation):
+        if robot.index == 5:
+            cancel.cancel("person detected")
+        return _follow(observation)
+
+    stats = _runner().run(10.0, cancel, robot=robot, step=step)
+    assert stats["cancelled"]
+    assert stats["steps"] == len(robot.sent) == 4
+    assert stats["elapsed_sec"] < 2.0
+
+
+def test_sampled_record_is_written_after_run(tmp_path):
+    recorder = RingRecorder(capacity=5, every=2, keep_images=True, output_dir=str(tmp_path))
+    robot = RecordedRobot(_recorded_frames())
+    runner = PolicyRunner(PolicySpec("test", "none", "Test", None, fps=30), recorder=recorder)
+    stats = runner.run(0.5, CancelToken("test"), robot=robot, step=_follow)
+
+    data = np.load(stats["record_path"])
+    assert len(data["step"]) == min(5, (stats["steps"] + 1) // 2)
+    assert data["image.top"].shape[1:] == (12, 16, 3)
+    assert len(recorder) == 0
+
+
+def test_record_write_failure_does_not_fail_the_run(tmp_path):
+    blocker = tmp_path / "not_a_directory"
+    blocker.write_text("")
+    recorder = RingRecorder(capacity=5, every=1, output_dir=str(blocker))
+    robot = RecordedRobot(_recorded_frames())
+    runner = PolicyRunner(PolicySpec("test", "none", "Test", None, fps=30), recorder=recorder)
+    stats = runner.run(0.2, CancelToken("test"), robot=robot, step=_follow)
+
+    assert stats["steps"] > 0
+    assert stats["record_path"] is None
@@ -0,0 +1,94 @@
+"""preprocess の切り取り・回転が従来の全体回転 → 切り取りと一致することのテスト"""
+
+from fractions import Fraction
+
+import cv2
+import numpy as np
+import pytest
+
+import preprocess
+from preprocess import DEFAULT_ROI, ROTATIONS, RoiPreprocessor
+
+# 奇数・偶数を混ぜた (高さ, 幅)。ROI の境界で int() の切り捨てが効くサイズを含める
+FRAME_SHAPES = [(480, 640), (481, 641), (479, 637), (3, 5), (7, 4), (5, 3)]
+ROIS = [
+    DEFAULT_ROI,
+    (Fraction(0), Fraction(0), Fraction(1), Fraction(1)),
+    (Fraction(1, 3), Fraction(1, 4), Fraction(5, 6), Fraction(3, 5)),
+    (Fraction(1, 2), Fraction(1, 2), Fraction(1), Fraction(1)),
+]
+
+
+def _baseline(frame: np.ndarray, rotation, roi) -> np.ndarray:
+    """従来の処理：全体を回転してから、回転後の幅・高さに割合を掛けて切り取る"""
+    rotated = frame if rotation is None else cv2.rotate(frame, rotation)
+    height, width = rotated.shape[:2]
+    x0, y0, x1, y1 = roi
+    return rotated[int(height * y0):int(height * y1), int(width * x0):int(width * x1)]
+
+
+def test_rotation_codes_match_cv2():
+    assert preprocess.ROTATE_90_CLOCKWISE == cv2.ROTATE_90_CLOCKWISE
+    assert preprocess.ROTATE_180 == cv2.ROTATE_180
+    assert preprocess.ROTATE_90_COUNTERCLOCKWISE == cv2.ROTATE_90_COUNTERCLOCKWISE
+
+
+def test_default_roi_matches_legacy_two_thirds():
+    # 従来は int(width * 2 / 3) で求めていた
+    rng = np.random.default_rng(0)
+    for shape in FRAME_SHAPES:
+        frame = rng.integers(0, 256, shape + (3,), dtype=np.uint8)
+        rotated = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        height, width = rotated.shape[:2]
+        expected = rotated[0:int(height * 2 / 3), 0:int(width * 2 / 3)]
+        assert np.array_equal(RoiPreprocessor().process(frame), expected), shape
+
+
+@pytest.mark.parametrize("rotation", ROTATIONS)
+@pytest.mark.parametrize("shape", FRAME_SHAPES)
+def test_process_is_bit_exact_with_full_frame_rotation(rotation, shape):
+    rng = np.random.default_rng(hash((rotation, shape)) % 2**32)
+    frame = rng.integers(0, 256, shape + (3,), dtype=np.uint8)
+    for roi in ROIS:
+        pre = RoiPreprocessor(roi, rotation=rotation)
+        expected = _baseline(frame, rotation, roi)
+        out = pre.process(frame)
+        assert out.shape == expected.shape, (roi, out.shape, expected.shape)
+        assert np.array_equal(out, expected), roi
+        # 2回目はバッファを使い回す
+        assert np.array_equal(pre.process(frame), expected), roi
+
+
+@pytest.mark.parametrize("rotation", ROTATIONS)
+def test_color_and_resize_match_baseline(rotation):
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 256, (481, 641, 3), dtype=np.uint8)
+    pre = RoiPreprocessor(DEFAULT_ROI, color_code=cv2.COLOR_BGR2RGB, input_size=(97, 61), rotation=rotation)
+    crop = _baseline(frame, rotation, DEFAULT_ROI)
+    expected = cv2.resize(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), (97, 61), interpolation=cv2.INTER_LINEAR)
+    assert np.array_equal(pre.process(frame), expected)
+
+
+def test_ensure_slots_keeps_earlier_outputs():
+    rng = np.random.default_rng(2)
+    frames = [rng.integers(0, 256, (479, 637, 3), dtype=np.uint8) for _ in range(3)]
+    pre = RoiPreprocessor()
+    pre.ensure_slots(len(frames))
+    outs = [pre.process(frame) for frame in frames]
+    for frame, out in zip(frames, outs):
+        assert np.array_equal(out, _baseline(frame, cv2.ROTATE_90_COUNTERCLOCKWISE, DEFAULT_ROI))
+    # 面数は減らさない
+    pre.ensure_slots(1)
+    assert pre.slots == len(frames)
+
+
+def test_unknown_rotation_is_rejected():
+    with pytest.raises(ValueError):
+        RoiPreprocessor(rotation=45)
+
+
+def test_empty_roi_is_rejected():
+    # 1行しかないフレームでは回転後の幅が int(1 * 2 / 3) = 0 になる
+    frame = np.zeros((1, 9, 3), dtype=np.uint8)
+    with pytest.raises(ValueError):
+        RoiPreprocessor().process(frame)
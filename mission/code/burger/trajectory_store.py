@@ -0,0 +1,153 @@
+"""
+軌跡ストアモジュール
+記録済みエピソードのactionを一度だけデコードし、float32の連続配列として
+ディスクにキャッシュする（2回目以降はメモリマップで即座にロード）
+
+キャッシュは repo_id とエピソード番号をキーに CACHE_DIR 以下に保存:
+    <repo_id の / を __ に置換>_ep<episode>.npy   : (フレーム数, 関節数) float32
+    <repo_id の / を __ に置換>_ep<episode>.json  : 関節名とfps
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from hardware import is_sim
+
+CACHE_DIR = os.path.expanduser("~/.cache/burger/trajectories")
+
+# プロセス内のロード済み軌跡（repo_id, episode）→ Trajectory
+_loaded: Dict[Tuple[str, int], "Trajectory"] = {}
+_loaded_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Trajectory:
+    """デコード済みの1エピソード分のaction列"""
+    repo_id: str
+    episode: int
+    fps: float
+    names: Tuple[str, ...]
+    actions: np.ndarray  # (num_frames, num_joints) float32
+
+    @property
+    def num_frames(self) -> int:
+        return self.actions.shape[0]
+
+    def joint_index(self, name: str) -> int:
+        """関節名から列番号を取得"""
+        return self.names.index(name)
+
+    def action_rows(self, start: int = 0, stop: Optional[int] = None) -> List[List[float]]:
+        """
+        指定範囲のaction列をPythonのfloatのリストに一括変換
+
+        ループ内でフレームごとに配列要素を変換するのを避けるため、再生前に呼ぶ
+        """
+        return self.actions[start:stop].tolist()
+
+
+def _cache_paths(repo_id: str, episode: int) -> Tuple[str, str]:
+    stem = f"{repo_id.replace('/', '__')}_ep{episode}"
+    return os.path.join(CACHE_DIR, stem + ".npy"), os.path.join(CACHE_DIR, stem + ".json")
+
+
+def _decode_episode(repo_id: str, episode: int) -> Tuple[np.ndarray, Tuple[str, ...], float]:
+    """LeRobotDatasetからエピソードのaction列をデコード"""
+    from lerobot.datasets.lerobot_dataset import LeRobotDataset
+
+    dataset = LeRobotDataset(repo_id, episodes=[episode])
+    names = tuple(dataset.features["action"]["names"])
+    column = dataset.hf_dataset.select_columns("action").with_format("numpy")["action"]
+    actions = np.ascontiguousarray(np.stack(column[:dataset.num_frames]), dtype=np.float32)
+    return actions, names, float(dataset.fps)
+
+
+def _write_cache(repo_id: str, episode: int, actions: np.ndarray, names, fps: float):
+    """キャッシュを書き込む（一時ファイル経由で置き換え）"""
+    npy_path, meta_path = _cache_paths(repo_id, episode)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    tmp_npy = npy_path + f".{os.getpid()}.tmp"
+    with open(tmp_npy, "wb") as f:
+        np.save(f, actions)
+    os.replace(tmp_npy, npy_path)
+
+    tmp_meta = meta_path + f".{os.getpid()}.tmp"
+    with open(tmp_meta, "w") as f:
+        json.dump({"repo_id": repo_id, "episode": episode, "fps": fps, "names": list(names)}, f)
+    os.replace(tmp_meta, meta_path)
+
+
+def _read_cache(repo_id: str, episode: int) -> Optional[Trajectory]:
+    """キャッシュがあればメモリマップで開く"""
+    npy_path, meta_path = _cache_paths(repo_id, episode)
+    if not (os.path.exists(npy_path) and os.path.exists(meta_path)):
+        return None
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        actions = np.load(npy_path, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        print(f"[Trajectory] Broken cache for {repo_id} ep{episode}: {e}")
+        return None
+
+    return Trajectory(repo_id, episode, float(meta["fps"]), tuple(meta["names"]), actions)
+
+
+def load_trajectory(repo_id: str, episode: int, refresh: bool = False) -> Trajectory:
+    """
+    エピソードのaction列を取得
+
+    プロセス内でロード済みならそれを返し、なければディスクキャッシュ、
+    それもなければデータセットからデコードしてキャッシュする
+
+    Args:
+        repo_id: データセットのリポジトリID
+        episode: エピソード番号
+        refresh: Trueの場合はキャッシュを無視してデコードし直す
+    """
+    key = (repo_id, episode)
+    with _loaded_lock:
+        if not refresh and key in _loaded:
+            return _loaded[key]
+
+        t0 = time.perf_counter()
+        trajectory = None if refresh else _read_cache(repo_id, episode)
+        source = "cache"
+
+        if trajectory is None:
+            try:
+                actions, names, fps = _decode_episode(repo_id, episode)
+            except Exception as e:
+                if not is_sim():
+                    raise
+                # シミュレーションではデータセットが手元になければ代わりの軌跡を使う（キャッシュしない）
+                from sim_hardware import synthetic_trajectory
+                print(f"[Trajectory] Using synthetic trajectory for {repo_id} ep{episode}: {e}")
+                actions, names, fps = synthetic_trajectory()
+                trajectory = Trajectory(repo_id, episode, fps, names, actions)
+                source = "synthetic"
+
+        if trajectory is None:
+            try:
+                _write_cache(repo_id, episode, actions, names, fps)
+            except OSError as e:
+                print(f"[Trajectory] Could not write cache: {e}")
+            trajectory = _read_cache(repo_id, episode)
+            if trajectory is None:
+                # キャッシュに書けない環境ではメモリ上の配列をそのまま使う
+                trajectory = Trajectory(repo_id, episode, fps, names, actions)
+            source = "dataset"
+
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        print(f"[Trajectory] Loaded {repo_id} ep{episode} from {source}: "
+              f"{trajectory.num_frames} frames in {elapsed_ms:.1f}ms")
+        _loaded[key] = trajectory
+        return trajectory